@@ -3,6 +3,10 @@ ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Long-lived streaming endpoints (the stock/stop-list Server-Sent Events in
+``menu.views.stock_events_view``) need this entry point: under WSGI the async
+stream would be consumed synchronously and never flushed.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 """
@@ -0,0 +1,117 @@
+import json
+import time
+
+from django.db import connection
+
+
+class QueryRecorder:
+    # Считает запросы к базе и время их выполнения через execute_wrapper
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
+
+
+def percentile(values, fraction):
+    # Ближайший ранг по отсортированному списку
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, round(fraction * len(values)) - 1))
+    return values[index]
+
+
+def run_scenario(client, method, path, body, requests, warmup) -> dict:
+    """
+    Выполняет запрос warmup + requests раз и возвращает задержки, пропускную способность
+    и число запросов к базе на один HTTP-запрос. Прогрев в статистику не входит.
+    """
+    for n in range(warmup):
+        _request(client, method, path, body, n)
+
+    latencies, queries, db_seconds, errors = [], [], 0.0, 0
+    started = time.perf_counter()
+
+    for n in range(warmup, warmup + requests):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            start = time.perf_counter()
+            response = _request(client, method, path, body, n)
+            latencies.append(time.perf_counter() - start)
+
+        if response.status_code >= 400:
+            errors += 1
+        queries.append(recorder.count)
+        db_seconds += recorder.seconds
+
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+
+    return {
+        'requests': requests,
+        'errors': errors,
+        'rps': requests / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'queries_avg': sum(queries) / len(queries) if queries else 0.0,
+        'queries_max': max(queries, default=0),
+        'db_ms_avg': db_seconds / requests * 1000 if requests else 0.0,
+    }
+
+
+def _request(client, method, path, body, n):
+    data = body(n) if body else None
+    if method == 'get':
+        return client.get(path(n))
+    return getattr(client, method)(path(n), data, format='json')
+
+
+COLUMNS = [('requests', 'req', '{:d}'), ('errors', 'err', '{:d}'), ('rps', 'req/s', '{:.1f}'),
+           ('p50_ms', 'p50 ms', '{:.2f}'), ('p95_ms', 'p95 ms', '{:.2f}'), ('p99_ms', 'p99 ms', '{:.2f}'),
+           ('queries_avg', 'queries', '{:.1f}'), ('queries_max', 'max q', '{:d}'), ('db_ms_avg', 'db ms', '{:.2f}')]
+
+
+def format_report(results: dict, baseline: dict = None) -> str:
+    """
+    Таблица результатов. С baseline добавляются изменения p95 и числа запросов
+    относительно сохраненного прогона.
+    """
+    header = ['scenario'] + [title for _, title, _ in COLUMNS]
+    if baseline:
+        header += ['p95 diff', 'queries diff']
+
+    rows = []
+    for name, result in results.items():
+        row = [name] + [fmt.format(result[key]) for key, _, fmt in COLUMNS]
+        if baseline:
+            previous = baseline.get(name)
+            if previous:
+                change = (result['p95_ms'] - previous['p95_ms']) / previous['p95_ms'] * 100 if previous['p95_ms'] else 0
+                row += [f'{change:+.0f}%', f'{result["queries_avg"] - previous["queries_avg"]:+.1f}']
+            else:
+                row += ['new', 'new']
+        rows.append(row)
+
+    widths = [max(len(str(cell)) for cell in column) for column in zip(header, *rows)]
+    lines = ['  '.join(cell.ljust(width) if i == 0 else cell.rjust(width)
+                       for i, (cell, width) in enumerate(zip(line, widths)))
+             for line in [header] + rows]
+    lines.insert(1, '-' * len(lines[0]))
+    return '\n'.join(lines)
+
+
+def save_results(path, results: dict, meta: dict):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump({'meta': meta, 'results': results}, file, ensure_ascii=False, indent=2)
+
+
+def load_results(path) -> dict:
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)['results']
@@ -0,0 +1,42 @@
+def _product(ids, n):
+    return ids['product_ids'][n % len(ids['product_ids'])]
+
+
+def get_scenarios(ids) -> list:
+    """
+    Запросы замера: (имя, метод, путь(n), тело(n)), где n — номер повтора.
+    Покрывают list/retrieve всех viewset из роутеров и основные записи.
+    """
+    restaurant_id = ids['restaurant_id']
+
+    return [
+        ('users.list', 'get', lambda n: '/api/users/user/', None),
+        ('users.retrieve', 'get', lambda n: f'/api/users/user/{ids["user_id"]}/', None),
+
+        ('organizations.list', 'get', lambda n: '/api/organization/organization/', None),
+        ('organizations.retrieve', 'get', lambda n: f'/api/organization/organization/{ids["organization_id"]}/', None),
+        ('organizations.partial_update', 'patch',
+         lambda n: f'/api/organization/organization/{ids["organization_id"]}/', lambda n: {'name': f'org-bench-{n}'}),
+        ('chains.list', 'get', lambda n: '/api/organization/chain/', None),
+        ('chains.retrieve', 'get', lambda n: f'/api/organization/chain/{ids["chain_id"]}/', None),
+        ('restaurants.list', 'get', lambda n: '/api/organization/restaurant/', None),
+        ('restaurants.list.sparse', 'get', lambda n: '/api/organization/restaurant/?fields=id,name', None),
+        ('restaurants.retrieve', 'get', lambda n: f'/api/organization/restaurant/{restaurant_id}/', None),
+        ('restaurants.partial_update', 'patch',
+         lambda n: f'/api/organization/restaurant/{restaurant_id}/', lambda n: {'name': f'restaurant-bench-{n}'}),
+
+        ('products.list', 'get', lambda n: '/api/menu/products/', None),
+        ('products.list.search', 'get', lambda n: '/api/menu/products/?search=product-1', None),
+        ('products.retrieve', 'get', lambda n: f'/api/menu/products/{_product(ids, n)}/', None),
+        ('products.menu', 'get', lambda n: f'/api/menu/products/menu/{restaurant_id}/', None),
+        ('categories.list', 'get', lambda n: '/api/menu/category/', None),
+        ('categories.retrieve', 'get', lambda n: f'/api/menu/category/{ids["category_id"]}/', None),
+        ('categories.create', 'post',
+         lambda n: '/api/menu/category/', lambda n: {'name': f'category-bench-{n}', 'restaurant': [restaurant_id]}),
+        ('kitchens.list', 'get', lambda n: '/api/menu/kitchen/', None),
+        ('kitchens.retrieve', 'get', lambda n: f'/api/menu/kitchen/{ids["kitchen_id"]}/', None),
+        ('orders.checkout', 'post', lambda n: '/api/menu/order/checkout/', lambda n: {
+            'restaurant_id': restaurant_id,
+            'items': [{'product_id': _product(ids, n), 'quantity': 1}, {'product_id': _product(ids, n + 1), 'quantity': 2}],
+        }),
+    ]
@@ -0,0 +1,126 @@
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from core.codes import assign_codes
+from core.models import User
+from menu.models import Category, Ingredient, Kitchen, Product, Recipe
+from organization.models import Chain, Organization, Restaurant
+
+
+DEFAULT_SCALE = {
+    'organizations': 10,
+    'chains': 3,
+    'restaurants': 5,
+    'users': 2000,
+    'categories': 8,
+    'kitchens': 3,
+    'ingredients': 30,
+    'products': 100,
+}
+
+PASSWORD = 'benchmark'
+# Остаток продуктов, которого хватает на любое число заказов в замерах
+STOCK = 10 ** 9
+
+
+def _through(field, rows):
+    model = field.through
+    model.objects.bulk_create([model(**row) for row in rows], batch_size=5000)
+
+
+@transaction.atomic
+def seed(organizations, chains, restaurants, users, categories, kitchens, ingredients, products) -> dict:
+    """
+    Заполняет базу синтетическим деревом Organization -> Chain -> Restaurant
+    с меню, рецептами и пользователями. chains, restaurants, categories, kitchens,
+    ingredients и products задаются на одного родителя, users — всего.
+    Все записи создаются bulk-запросами, поэтому сигналы не срабатывают.
+    Возвращает id объектов, которые использует сценарий замера.
+    """
+    orgs = Organization.objects.bulk_create([Organization(name=f'org-{i}') for i in range(organizations)])
+    chain_objs = Chain.objects.bulk_create([
+        Chain(name=f'chain-{org.pk}-{i}', organization=org) for org in orgs for i in range(chains)
+    ])
+    restaurant_objs = Restaurant.objects.bulk_create([
+        Restaurant(name=f'restaurant-{chain.pk}-{i}', chain=chain) for chain in chain_objs for i in range(restaurants)
+    ])
+
+    password = make_password(PASSWORD)
+    user_objs = [
+        User(username=f'user-{i}', email=f'user-{i}@bench.local', password=password)
+        for i in range(max(users, organizations))
+    ]
+    assign_codes(user_objs)
+    user_objs = User.objects.bulk_create(user_objs, batch_size=5000)
+
+    # Первые пользователи — авторы организаций, остальные распределяются по ресторанам
+    _through(Organization.authors, [
+        {'organization_id': org.pk, 'user_id': user.pk} for org, user in zip(orgs, user_objs)
+    ])
+    memberships = [(user, restaurant_objs[i % len(restaurant_objs)]) for i, user in enumerate(user_objs)]
+    _through(User.restaurants, [
+        {'user_id': user.pk, 'restaurant_id': restaurant.pk} for user, restaurant in memberships
+    ])
+    _through(User.chains, [
+        {'user_id': user.pk, 'chain_id': restaurant.chain_id} for user, restaurant in memberships
+    ])
+    _through(User.organizations, [
+        {'user_id': user.pk, 'organization_id': restaurant.chain.organization_id} for user, restaurant in memberships
+    ])
+
+    category_objs, kitchen_objs, ingredient_objs, product_objs = [], [], [], []
+    for restaurant in restaurant_objs:
+        category_objs += [Category(name=f'category-{restaurant.pk}-{i}') for i in range(categories)]
+        kitchen_objs += [Kitchen(name=f'kitchen-{restaurant.pk}-{i}') for i in range(kitchens)]
+        ingredient_objs += [Ingredient(name=f'ingredient-{restaurant.pk}-{i}', count=STOCK, restaurant=restaurant)
+                            for i in range(ingredients)]
+
+    Category.objects.bulk_create(category_objs, batch_size=5000)
+    Kitchen.objects.bulk_create(kitchen_objs, batch_size=5000)
+    Ingredient.objects.bulk_create(ingredient_objs, batch_size=5000)
+
+    for index, restaurant in enumerate(restaurant_objs):
+        restaurant_categories = category_objs[index * categories:(index + 1) * categories]
+        restaurant_kitchens = kitchen_objs[index * kitchens:(index + 1) * kitchens]
+        product_objs += [
+            Product(name=f'product-{restaurant.pk}-{i}', description=f'Product {i}', price=100 + i, count=STOCK,
+                    category=restaurant_categories[i % categories], kitchen=restaurant_kitchens[i % kitchens])
+            for i in range(products)
+        ]
+    Product.objects.bulk_create(product_objs, batch_size=5000)
+
+    _through(Category.restaurant, [
+        {'category_id': category.pk, 'restaurant_id': restaurant_objs[i // categories].pk}
+        for i, category in enumerate(category_objs)
+    ])
+    _through(Kitchen.restaurant, [
+        {'kitchen_id': kitchen.pk, 'restaurant_id': restaurant_objs[i // kitchens].pk}
+        for i, kitchen in enumerate(kitchen_objs)
+    ])
+    _through(Product.restaurant, [
+        {'product_id': product.pk, 'restaurant_id': restaurant_objs[i // products].pk}
+        for i, product in enumerate(product_objs)
+    ])
+
+    # Рецепт на каждый продукт из трех ингредиентов его ресторана
+    recipe_objs = Recipe.objects.bulk_create([Recipe(product=product, quantity=1, measure='g')
+                                              for product in product_objs], batch_size=5000)
+    links = []
+    for i, recipe in enumerate(recipe_objs):
+        restaurant_index = i // products
+        for offset in range(min(3, ingredients)):
+            ingredient = ingredient_objs[restaurant_index * ingredients + (i + offset) % ingredients]
+            links.append({'recipe_id': recipe.pk, 'ingredient_id': ingredient.pk})
+    _through(Recipe.ingredient, links)
+
+    restaurant = restaurant_objs[0]
+    return {
+        'author_id': user_objs[0].pk,
+        'user_id': user_objs[-1].pk,
+        'organization_id': orgs[0].pk,
+        'chain_id': chain_objs[0].pk,
+        'restaurant_id': restaurant.pk,
+        'category_id': category_objs[0].pk,
+        'kitchen_id': kitchen_objs[0].pk,
+        'product_ids': [product.pk for product in product_objs[:products]],
+    }
@@ -1,6 +1,7 @@
 from __future__ import absolute_import, unicode_literals
 import os
 from celery import Celery
+from celery.signals import worker_process_init
 
 # Устанавливаем настройки Django для использования Celery
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
@@ -12,3 +13,16 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 
 # Автоматическое обнаружение задач в приложениях
 app.autodiscover_tasks()
+
+# Метрики задач и очередей для Prometheus
+from . import task_metrics  # noqa: E402,F401
+
+
+@worker_process_init.connect
+def close_database_pools(**kwargs):
+    # Пул psycopg с фоновыми потоками не переживает fork, каждый процесс воркера открывает свой
+    from django.db import connections
+
+    for connection in connections.all(initialized_only=True):
+        if hasattr(connection, 'close_pool'):
+            connection.close_pool()
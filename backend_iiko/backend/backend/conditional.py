@@ -0,0 +1,40 @@
+import hashlib
+import math
+
+from django.utils.cache import get_conditional_response, patch_cache_control, quote_etag
+from django.utils.http import http_date
+
+from core.authentication import get_membership_version
+
+
+def _etag(request, version: int) -> str:
+    # Ответ зависит от пути, параметров запроса и того, кто его делает
+    user = request.user
+    scope = ''
+    if user.is_authenticated:
+        membership = getattr(user, 'membership_version', None) or get_membership_version(user.pk)
+        scope = f'{user.pk}:{membership}'
+    key = f'{version}|{request.get_full_path()}|{scope}'
+    return quote_etag(hashlib.md5(key.encode()).hexdigest())
+
+
+def conditional_response(request, version: int, build):
+    """
+    Отвечает 304 Not Modified, если клиент прислал актуальный If-None-Match, иначе вызывает
+    build() для построения ответа. version — время изменения в наносекундах; ETag строится
+    из нее, пути с параметрами и пользователя, поэтому проверка не обращается к базе.
+    Проверки доступа и существования объекта, которые build() не выполняет сам, должны
+    быть сделаны до вызова. Last-Modified — version, округленная вверх до секунды, только
+    для сведения: If-Modified-Since не проверяется, с точностью до секунды он пропускал бы
+    изменения внутри одной секунды и не различает пользователей.
+    """
+    etag = _etag(request, version)
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = build()
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(math.ceil(version / 10 ** 9))
+    patch_cache_control(response, no_cache=True, private=True)
+    return response
@@ -8,16 +8,51 @@ DB_HOST = os.environ.get("DB_HOST")
 DB_NAME = os.environ.get("DB_NAME")
 DB_USER = os.environ.get("DB_USER")
 DB_PASS = os.environ.get("DB_PASS")
+DB_PORT = os.environ.get("DB_PORT")
+
+# Соединения с базой: persistent, pgbouncer, pool или off
+DB_POOL_MODE = os.environ.get("DB_POOL_MODE", "persistent")
+DB_CONN_MAX_AGE = int(os.environ.get("DB_CONN_MAX_AGE", 600))
+DB_POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN_SIZE", 2))
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", 10))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 10))
 
 # Redis
 REDIS_URL = os.environ.get("REDIS_URL")
 
+# Доступ к /metrics: токен для заголовка Authorization: Bearer и/или адреса и сети,
+# с которых можно читать метрики без токена
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.environ.get("METRICS_ALLOWED_IPS", "127.0.0.1,::1").split(",")
+                       if ip.strip()]
+
+# Порт метрик Prometheus воркера Celery, 0 отключает
+CELERY_METRICS_PORT = int(os.environ.get("CELERY_METRICS_PORT", 9808))
+
 # Email
 EMAIL_USER = os.environ.get("EMAIL_HOST_USER")
 EMAIL_PASSWORD = os.environ.get("EMAIL_HOST_PASSWORD")
 EM_PORT = os.environ.get("EMAIL_PORT")
 EM_HOST = os.environ.get("EMAIL_HOST")
+EM_BACKEND = os.environ.get("EMAIL_BACKEND", "django.core.mail.backends.smtp.EmailBackend")
+# Для локального SMTP без TLS: EMAIL_USE_TLS=false
+EM_USE_TLS = os.environ.get("EMAIL_USE_TLS", "true").lower() == "true"
 
 # Django
 FRONTEND_URL = os.environ.get("FRONTEND_URL")
 DJANGO_SECRET_KEY = os.environ.get("DJANGO_SECRET_KEY")
+# development или production
+DJANGO_ENV = os.environ.get("DJANGO_ENV", "development")
+DJANGO_ALLOWED_HOSTS = [host.strip() for host in os.environ.get("DJANGO_ALLOWED_HOSTS", "").split(",") if host.strip()]
+
+# API
+API_PAGE_SIZE = int(os.environ.get("API_PAGE_SIZE", 50))
+API_MAX_PAGE_SIZE = int(os.environ.get("API_MAX_PAGE_SIZE", 200))
+# Лимиты в формате DRF (20/min): попыток входа с одного IP, на один username и на один код,
+# обновлений токена одним пользователем
+API_LOGIN_RATE = os.environ.get("API_LOGIN_RATE", "20/min")
+API_LOGIN_USERNAME_RATE = os.environ.get("API_LOGIN_USERNAME_RATE", "10/min")
+API_LOGIN_CODE_RATE = os.environ.get("API_LOGIN_CODE_RATE", "5/min")
+API_REFRESH_RATE = os.environ.get("API_REFRESH_RATE", "30/min")
+# Доверенных прокси перед приложением, 0 — IP клиента берется из соединения
+API_NUM_PROXIES = int(os.environ.get("API_NUM_PROXIES", 0))
@@ -0,0 +1,227 @@
+import hmac
+import ipaddress
+import os
+import time
+from collections import Counter as Tally
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+
+# С пулом соединение Django берется из пула, новые соединения считает сам пул (iiko_db_pool_connections_num)
+DB_CONNECTIONS_CREATED = Counter(
+    'iiko_db_connections_created', 'Новые соединения с базой, открытые процессом без пула', ['alias'])
+
+# Текущее состояние пула psycopg и накопительные счетчики из ConnectionPool.get_stats()
+POOL_GAUGES = {
+    'pool_min': 'Минимальный размер пула',
+    'pool_max': 'Максимальный размер пула',
+    'pool_size': 'Соединений в пуле, включая выданные',
+    'pool_available': 'Свободных соединений в пуле',
+    'requests_waiting': 'Запросов, ожидающих соединение',
+}
+POOL_COUNTERS = {
+    'requests_num': 'Запросов соединения из пула',
+    'requests_queued': 'Запросов, которым пришлось ждать соединение',
+    'requests_wait_ms': 'Суммарное ожидание соединения, мс',
+    'requests_errors': 'Запросов, не дождавшихся соединения',
+    'connections_num': 'Соединений, открытых пулом',
+    'connections_errors': 'Неудачных попыток открыть соединение',
+    'connections_lost': 'Соединений, потерянных при проверке',
+    'returns_bad': 'Соединений, возвращенных в пул в плохом состоянии',
+}
+
+
+# Метрики запросов к API, view — имя viewset и действия, например CategoryViewSet.list
+REQUEST_DURATION = Histogram(
+    'iiko_http_request_duration_seconds', 'Время обработки запроса', ['view', 'method', 'status'])
+REQUEST_DB_QUERIES = Histogram(
+    'iiko_http_request_db_queries', 'Запросов к базе на один запрос к API', ['view'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, float('inf')))
+REQUEST_DB_DURATION = Histogram(
+    'iiko_http_request_db_duration_seconds', 'Суммарное время запросов к базе на один запрос к API', ['view'])
+RESPONSE_SIZE = Histogram(
+    'iiko_http_response_size_bytes', 'Размер тела ответа, потоковые ответы не учитываются', ['view'],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, float('inf')))
+CACHE_LOOKUPS = Counter(
+    'iiko_cache_lookups', 'Чтения кэша при обработке запросов', ['view', 'cache', 'result'])
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.cache = Tally()
+
+
+# Статистика текущего запроса. ContextVar передается из асинхронного middleware
+# в поток, где sync_to_async выполняет синхронные представления DRF.
+_request_stats = ContextVar('iiko_request_stats', default=None)
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_seconds += time.perf_counter() - start
+
+
+def record_cache_lookup(name, hit: bool):
+    """Учитывает попадание или промах кэша name в статистике текущего запроса."""
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.cache[name, 'hit' if hit else 'miss'] += 1
+
+
+def view_name(request) -> str:
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+
+    # Для viewset DRF сохраняет класс и соответствие методов действиям в функции представления
+    view = match.func
+    cls = getattr(view, 'cls', None)
+    if cls is None:
+        return getattr(view, '__name__', match.view_name)
+
+    actions = getattr(view, 'actions', None) or {}
+    action = actions.get(request.method.lower(), request.method.lower())
+    return f'{cls.__name__}.{action}'
+
+
+def _observe(request, response, stats: RequestStats, seconds):
+    view = view_name(request)
+
+    REQUEST_DURATION.labels(view, request.method, response.status_code).observe(seconds)
+    REQUEST_DB_QUERIES.labels(view).observe(stats.queries)
+    REQUEST_DB_DURATION.labels(view).observe(stats.db_seconds)
+    if not response.streaming:
+        RESPONSE_SIZE.labels(view).observe(len(response.content))
+    for (cache, result), count in stats.cache.items():
+        CACHE_LOOKUPS.labels(view, cache, result).inc(count)
+
+
+class MetricsMiddleware:
+    """
+    Записывает для каждого запроса время обработки, число и время запросов к базе,
+    чтения кэша и размер ответа. Работает и под WSGI, и под ASGI, чтобы не переводить
+    SSE-поток остатков в синхронный режим.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self._acall(request)
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+
+        _observe(request, response, stats, time.perf_counter() - start)
+        return response
+
+    async def _acall(self, request):
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+
+        _observe(request, response, stats, time.perf_counter() - start)
+        return response
+
+
+def _instrument_connection(sender, connection, **kwargs):
+    if getattr(connection, 'pool', None) is None:
+        DB_CONNECTIONS_CREATED.labels(connection.alias).inc()
+
+    # Обертка остается на объекте соединения Django и при переподключении не дублируется
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _record_query)
+
+
+class DatabasePoolCollector:
+    """Отдает статистику пулов соединений psycopg при каждом чтении /metrics."""
+
+    def collect(self):
+        gauges = {name: GaugeMetricFamily(f'iiko_db_pool_{name.removeprefix("pool_")}', doc, labels=['alias'])
+                  for name, doc in POOL_GAUGES.items()}
+        counters = {name: CounterMetricFamily(f'iiko_db_pool_{name}', doc, labels=['alias'])
+                    for name, doc in POOL_COUNTERS.items()}
+
+        for alias in connections:
+            pool = getattr(connections[alias], 'pool', None)
+            if pool is None:
+                continue
+
+            stats = pool.get_stats()
+            for name, metric in gauges.items():
+                metric.add_metric([alias], stats.get(name, 0))
+            for name, metric in counters.items():
+                metric.add_metric([alias], stats.get(name, 0))
+
+        yield from gauges.values()
+        yield from counters.values()
+
+
+connection_created.connect(_instrument_connection, dispatch_uid='iiko_db_connections_created')
+REGISTRY.register(DatabasePoolCollector())
+
+
+def _metrics_allowed(request) -> bool:
+    # Токен из METRICS_TOKEN или адрес соединения из METRICS_ALLOWED_IPS (адреса и сети).
+    # X-Forwarded-For не учитывается: сборщик метрик обращается к backend напрямую
+    if settings.METRICS_TOKEN:
+        header = request.headers.get('Authorization', '')
+        if hmac.compare_digest(header.encode(), f'Bearer {settings.METRICS_TOKEN}'.encode()):
+            return True
+
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network, strict=False) for network in settings.METRICS_ALLOWED_IPS)
+
+
+def metrics_view(request):
+    """
+    Метрики Prometheus. Доступны только с токеном METRICS_TOKEN или с адресов
+    METRICS_ALLOWED_IPS, остальным отвечает 403.
+    """
+    if not _metrics_allowed(request):
+        return HttpResponseForbidden()
+
+    # С PROMETHEUS_MULTIPROC_DIR счетчики и гистограммы всех воркеров gunicorn
+    # складываются из файлов, статистика пула — только отвечающего процесса
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(DatabasePoolCollector())
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
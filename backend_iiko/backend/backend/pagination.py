@@ -0,0 +1,10 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class IdCursorPagination(CursorPagination):
+    # Keyset-пагинация по id: глубокие страницы не требуют OFFSET.
+    # Для ?search= порядок и курсор задает TrigramSearchFilter.get_ordering: по рангу, затем id
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+    max_page_size = settings.API_MAX_PAGE_SIZE
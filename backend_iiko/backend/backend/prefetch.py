@@ -0,0 +1,64 @@
+from django.db.models import Prefetch
+from rest_framework.relations import ManyRelatedField
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+
+def _plan(serializer, model, prefix=''):
+    """
+    Обходит вложенные сериализаторы и возвращает пути для select_related
+    и объекты Prefetch для prefetch_related относительно model.
+    Вложенный сериализатор с many=True превращается в Prefetch с собственным
+    оптимизированным queryset, одиночный — в select_related,
+    список первичных ключей (ManyRelatedField) — в обычный prefetch.
+    """
+    select, prefetch = [], []
+
+    for field in serializer.fields.values():
+        if field.source == '*' or '.' in field.source:
+            continue
+
+        if isinstance(field, ManyRelatedField):
+            prefetch.append(f'{prefix}{field.source}')
+            continue
+
+        if not isinstance(field, BaseSerializer):
+            continue
+
+        related_model = model._meta.get_field(field.source).related_model
+        lookup = f'{prefix}{field.source}'
+
+        if isinstance(field, ListSerializer):
+            queryset = optimize_queryset(related_model.objects.all(), field.child)
+            prefetch.append(Prefetch(lookup, queryset=queryset))
+        else:
+            select.append(lookup)
+            nested_select, nested_prefetch = _plan(field, related_model, prefix=f'{lookup}__')
+            select.extend(nested_select)
+            prefetch.extend(nested_prefetch)
+
+    return select, prefetch
+
+
+def optimize_queryset(queryset, serializer):
+    """
+    Добавляет в queryset select_related/prefetch_related по вложенности сериализатора,
+    чтобы список выполнялся за постоянное число запросов.
+    serializer может быть классом или экземпляром.
+    """
+    if isinstance(serializer, type):
+        serializer = serializer()
+
+    select, prefetch = _plan(serializer, queryset.model)
+
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+
+    return queryset
+
+
+def refetch(instance, serializer):
+    # Перечитывает объект одним оптимизированным запросом перед сериализацией ответа
+    queryset = type(instance)._default_manager.filter(pk=instance.pk)
+    return optimize_queryset(queryset, serializer).get()
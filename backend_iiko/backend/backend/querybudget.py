@@ -0,0 +1,161 @@
+"""
+Бюджеты запросов к базе для endpoint-ов роутеров DRF.
+
+Тест приложения подмешивает QueryBudgetMixin к APITestCase, указывает router
+из urls.py и объявляет budgets: {(имя маршрута, метод): Budget(...)}. Каждый маршрут
+роутера, который реализует viewset, обязан иметь бюджет, поэтому новый endpoint
+нельзя добавить без него.
+Запросы выполняются на данных из backend.benchmark.seed с несколькими объектами
+на каждом уровне, так что N+1 в сериализаторах сразу превышает бюджет.
+"""
+import re
+from collections import Counter
+from dataclasses import dataclass
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils.http import urlencode
+
+from backend.benchmark.seed import seed
+from backend.celery import app as celery_app
+from core.authentication import access_token_for
+from core.models import User
+
+
+@dataclass(frozen=True)
+class Budget:
+    """
+    Допустимое число запросов и сам запрос. kwargs, data и params — значения
+    или функции от теста (доступны self.ids и self.prepared). prepare выполняется
+    до замера, его результат сохраняется в self.prepared.
+    """
+    queries: int
+    kwargs: object = None
+    data: object = None
+    params: object = None
+    prepare: object = None
+    format: str = 'json'
+    status: int = None
+    anonymous: bool = False
+
+
+def router_endpoints(router) -> list:
+    """Пары (имя маршрута, метод) для всех действий роутера, которые реализует viewset."""
+    endpoints = []
+    for prefix, viewset, basename in router.registry:
+        for route in router.get_routes(viewset):
+            name = route.name.format(basename=basename)
+            for method, action in route.mapping.items():
+                if hasattr(viewset, action) and method in viewset.http_method_names:
+                    endpoints.append((name, method))
+    return endpoints
+
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+def format_queries(queries) -> str:
+    """Все запросы по порядку и повторяющиеся шаблоны запросов — обычно это N+1."""
+    lines = [f'{number}. {query["sql"]}' for number, query in enumerate(queries, 1)]
+
+    repeated = Counter(_LITERALS.sub('?', query['sql']) for query in queries)
+    duplicates = [f'{count}x {sql}' for sql, count in repeated.most_common() if count > 1]
+    if duplicates:
+        lines += ['', 'Repeated queries:'] + duplicates
+    return '\n'.join(lines)
+
+
+def _resolve(value, test):
+    return value(test) if callable(value) else value
+
+
+class QueryBudgetMixin:
+    """
+    Проверяет бюджеты запросов для всех маршрутов router. Каждый запрос выполняется
+    с пустым кэшем в отдельной точке сохранения, которая затем откатывается,
+    поэтому удаление и изменение объектов не влияют на следующие endpoint-ы.
+    Кэш — в памяти процесса, без Redis. Задачи Celery выполняются сразу,
+    их запросы входят в бюджет.
+    """
+    router = None
+    budgets = {}
+    scale = {
+        'organizations': 2,
+        'chains': 2,
+        'restaurants': 2,
+        'users': 12,
+        'categories': 3,
+        'kitchens': 2,
+        'ingredients': 4,
+        'products': 5,
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        cls.enterClassContext(override_settings(
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                'LOCATION': 'querybudget'}},
+            REDIS_URL=None,
+            PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+        ))
+        always_eager = celery_app.conf.task_always_eager
+        celery_app.conf.task_always_eager = True
+        cls.addClassCleanup(setattr, celery_app.conf, 'task_always_eager', always_eager)
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ids = seed(**cls.scale)
+        cls.author = User.objects.get(pk=cls.ids['author_id'])
+
+    def setUp(self):
+        super().setUp()
+        self.prepared = None
+
+    def test_every_route_has_budget(self):
+        endpoints = set(router_endpoints(self.router))
+        missing = sorted(endpoints - self.budgets.keys())
+        unknown = sorted(self.budgets.keys() - endpoints)
+
+        self.assertFalse(missing, f'Routes without a query budget: {missing}')
+        self.assertFalse(unknown, f'Budgets for unknown routes: {unknown}')
+
+    def test_query_budgets(self):
+        for name, method in router_endpoints(self.router):
+            budget = self.budgets.get((name, method))
+            if budget is None:
+                continue
+
+            with self.subTest(endpoint=f'{method.upper()} {name}'), transaction.atomic():
+                self.assert_budget(name, method, budget)
+                transaction.set_rollback(True)
+
+    def assert_budget(self, name, method, budget: Budget):
+        cache.clear()
+        self.client.credentials()
+        if not budget.anonymous:
+            self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access_token_for(self.author)}')
+        if budget.prepare:
+            self.prepared = budget.prepare(self)
+
+        path = reverse(name, kwargs=_resolve(budget.kwargs, self))
+        params = _resolve(budget.params, self)
+        if params:
+            path += '?' + urlencode(params)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(path, _resolve(budget.data, self), format=budget.format)
+            if response.streaming:
+                b''.join(response.streaming_content)
+
+        if budget.status is not None:
+            self.assertEqual(response.status_code, budget.status, getattr(response, 'data', None))
+        else:
+            self.assertLess(response.status_code, 400, getattr(response, 'data', None))
+
+        self.assertLessEqual(
+            len(queries), budget.queries,
+            f'{method.upper()} {path} made {len(queries)} queries, budget is {budget.queries}:\n'
+            f'{format_queries(queries.captured_queries)}')
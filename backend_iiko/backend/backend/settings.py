@@ -13,9 +13,15 @@ https://docs.djangoproject.com/en/4.1/ref/settings/
 from pathlib import Path
 from datetime import timedelta
 
-from .config import (DB_HOST, DB_NAME, DB_USER, DB_PASS,
-                     EMAIL_USER, EMAIL_PASSWORD, EM_PORT, EM_HOST,
-                     REDIS_URL, DJANGO_SECRET_KEY)
+from django.core.exceptions import ImproperlyConfigured
+
+from .config import (DB_HOST, DB_NAME, DB_USER, DB_PASS, DB_PORT,
+                     DB_POOL_MODE, DB_CONN_MAX_AGE, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_TIMEOUT,
+                     EMAIL_USER, EMAIL_PASSWORD, EM_PORT, EM_HOST, EM_BACKEND, EM_USE_TLS,
+                     REDIS_URL, CELERY_METRICS_PORT, DJANGO_SECRET_KEY, DJANGO_ENV, DJANGO_ALLOWED_HOSTS,
+                     METRICS_TOKEN, METRICS_ALLOWED_IPS,
+                     API_PAGE_SIZE, API_MAX_PAGE_SIZE, API_NUM_PROXIES,
+                     API_LOGIN_RATE, API_LOGIN_USERNAME_RATE, API_LOGIN_CODE_RATE, API_REFRESH_RATE)
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -28,9 +34,12 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = DJANGO_SECRET_KEY
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# В production (DJANGO_ENV=production) отключены DEBUG и браузерный UI DRF
+PRODUCTION = DJANGO_ENV == 'production'
+
+DEBUG = not PRODUCTION
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = DJANGO_ALLOWED_HOSTS
 
 
 # Application definition
@@ -57,6 +66,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'backend.metrics.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -109,9 +119,41 @@ DATABASES = {
         'NAME': DB_NAME,
         'USER': DB_USER,
         'PASSWORD': DB_PASS,
+        'PORT': DB_PORT or '',
     }
 }
 
+# Режимы соединений с базой (DB_POOL_MODE):
+# persistent — соединение живет DB_CONN_MAX_AGE секунд и переиспользуется запросами и задачами Celery
+#              одного потока, перед переиспользованием проверяется (CONN_HEALTH_CHECKS);
+# pgbouncer  — то же, но для PgBouncer в режиме transaction pooling: серверные курсоры
+#              (QuerySet.iterator) отключены, так как не переживают смену серверного соединения;
+# pool       — встроенный пул psycopg 3 (Django 5.1+), на процесс не больше DB_POOL_MAX_SIZE соединений,
+#              требует пакетов psycopg и psycopg-pool вместо psycopg2;
+# off        — новое соединение на каждый запрос.
+if DB_POOL_MODE in ('persistent', 'pgbouncer'):
+    DATABASES['default']['CONN_MAX_AGE'] = DB_CONN_MAX_AGE
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+    DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = DB_POOL_MODE == 'pgbouncer'
+elif DB_POOL_MODE == 'pool':
+    try:
+        import psycopg_pool  # noqa: F401
+    except ImportError:
+        raise ImproperlyConfigured('DB_POOL_MODE=pool requires psycopg and psycopg-pool to be installed')
+
+    # Django сам передает в пул ConnectionPool.check_connection, если включен CONN_HEALTH_CHECKS
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': DB_POOL_MIN_SIZE,
+            'max_size': DB_POOL_MAX_SIZE,
+            'timeout': DB_POOL_TIMEOUT,
+        },
+    }
+elif DB_POOL_MODE != 'off':
+    raise ImproperlyConfigured(f'Unknown DB_POOL_MODE: {DB_POOL_MODE}')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -148,12 +190,33 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/4.1/howto/static-files/
 
 STATIC_URL = 'static/'
+# Без DEBUG статику отдает не Django: manage.py collectstatic и раздача STATIC_ROOT прокси-сервером
+STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Кэш (Redis), без REDIS_URL используется память процесса
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'iiko',
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 # Брокер сообщений (Redis)
 CELERY_BROKER_URL = REDIS_URL
 
@@ -164,11 +227,30 @@ CELERY_RESULT_BACKEND = 'django-db'
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 
+# Периодические задачи (celery beat)
+CELERY_BEAT_SCHEDULE = {
+    'rollup-stock-movements': {
+        'task': 'menu.tasks.rollup_stock_movements',
+        'schedule': 60.0,
+    },
+    # Повторы писем после ошибок отправки и письма, задача для которых не была поставлена
+    'send-queued-emails': {
+        'task': 'core.tasks.send_queued_emails',
+        'schedule': 60.0,
+    },
+    'purge-failed-emails': {
+        'task': 'core.tasks.purge_failed_emails',
+        'schedule': 60.0 * 60,
+    },
+}
+
 # Настройки почты
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Письма отправляются пачками через очередь core.mail. Для локальной проверки без SMTP:
+# django.core.mail.backends.console.EmailBackend или locmem
+EMAIL_BACKEND = EM_BACKEND
 EMAIL_HOST = EM_HOST
 EMAIL_PORT = EM_PORT
-EMAIL_USE_TLS = True
+EMAIL_USE_TLS = EM_USE_TLS
 EMAIL_HOST_USER = EMAIL_USER
 EMAIL_HOST_PASSWORD = EMAIL_PASSWORD
 
@@ -177,13 +259,26 @@ AUTH_USER_MODEL = 'core.User'
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
+    ] + ([] if PRODUCTION else [
         'rest_framework.renderers.BrowsableAPIRenderer',  # Включает интерактивный UI
-    ],
+    ]),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.StatelessJWTAuthentication',  # Пользователь из claims токена, без запроса к базе
     ),
+    # Лимиты попыток входа в скользящем окне (core.throttling), проверяются до запросов к базе.
+    # login и refresh_token — на IP, login_username и login_code — на значение из запроса
+    'DEFAULT_THROTTLE_RATES': {
+        'login': API_LOGIN_RATE,
+        'login_username': API_LOGIN_USERNAME_RATE,
+        'login_code': API_LOGIN_CODE_RATE,
+        'refresh_token': API_REFRESH_RATE,
+    },
+    # Число прокси перед приложением: IP клиента берется из X-Forwarded-For только за ними
+    'NUM_PROXIES': API_NUM_PROXIES,
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
+    'DEFAULT_PAGINATION_CLASS': 'backend.pagination.IdCursorPagination',
+    'PAGE_SIZE': API_PAGE_SIZE,
 }
 
 SIMPLE_JWT = {
@@ -0,0 +1,88 @@
+from drf_spectacular.utils import OpenApiParameter
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+SPARSE_FIELDS_PARAMETERS = [
+    OpenApiParameter(name=FIELDS_PARAM, type=str, location=OpenApiParameter.QUERY,
+                     description='Поля ответа через запятую, вложенные через точку: id,name,chain.name'),
+    OpenApiParameter(name=EXPAND_PARAM, type=str, location=OpenApiParameter.QUERY,
+                     description='Вложенные объекты, которые нужно развернуть: chain,chain.organization. '
+                                 'Если параметр передан, остальные вложенные объекты возвращаются как id'),
+]
+
+
+def _parse(value) -> dict:
+    # 'id,chain.name,chain.organization' -> {'id': {}, 'chain': {'name': {}, 'organization': {}}}
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for name in filter(None, path.strip().split('.')):
+            node = node.setdefault(name, {})
+    return tree
+
+
+def _descend(tree, path) -> dict:
+    for name in path:
+        if not tree:
+            return {}
+        tree = tree.get(name, {})
+    return tree
+
+
+def _path(serializer) -> list:
+    # Путь от корневого сериализатора, ListSerializer пропускается, у его child нет имени
+    path = []
+    while serializer.parent is not None:
+        if serializer.field_name:
+            path.append(serializer.field_name)
+        serializer = serializer.parent
+    return path[::-1]
+
+
+def _collapse(field):
+    # Неразвернутый вложенный объект заменяется его первичным ключом
+    return PrimaryKeyRelatedField(many=isinstance(field, ListSerializer), read_only=True,
+                                  source=field._kwargs.get('source'))
+
+
+class SparseFieldsMixin:
+    """
+    Позволяет клиенту запросить только нужные поля через ?fields= и
+    развернуть только нужные вложенные объекты через ?expand=.
+    Отрезанные поля убираются из сериализатора до обхода планировщиком prefetch,
+    поэтому для них не выполняются ни JOIN, ни prefetch-запросы.
+    Без этих параметров и для небезопасных методов поведение не меняется.
+    Миксин нужен на каждом уровне вложенности, который должен поддерживать отбор полей.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS:
+            return fields
+
+        params = request.query_params
+        if FIELDS_PARAM not in params and EXPAND_PARAM not in params:
+            return fields
+
+        path = _path(self)
+        only = _descend(_parse(params.get(FIELDS_PARAM, '')), path)
+        if only:
+            fields = {name: field for name, field in fields.items() if name in only}
+
+        if EXPAND_PARAM in params:
+            expand = _descend(_parse(params[EXPAND_PARAM]), path)
+            # Запрос вложенных полей через fields тоже разворачивает объект
+            fields = {
+                name: field if not isinstance(field, BaseSerializer) or name in expand or only.get(name)
+                else _collapse(field)
+                for name, field in fields.items()
+            }
+
+        return fields
@@ -0,0 +1,151 @@
+"""
+Метрики задач Celery для Prometheus.
+
+Обработчики сигналов подключаются ко всем задачам приложения, включая новые shared_task.
+Время в очереди считается по заголовку enqueued_at, который добавляется при отправке задачи.
+Воркер отдает метрики на CELERY_METRICS_PORT. Задачи выполняются в дочерних процессах prefork,
+поэтому для воркера нужен PROMETHEUS_MULTIPROC_DIR, иначе видны только метрики главного процесса.
+"""
+import logging
+import os
+import shutil
+import time
+from datetime import datetime
+
+from celery.signals import (before_task_publish, task_failure, task_postrun, task_prerun, task_retry,
+                            worker_init, worker_process_shutdown)
+from prometheus_client import (REGISTRY, CollectorRegistry, Counter, Histogram, multiprocess,
+                               start_http_server)
+from kombu.exceptions import KombuError
+from kombu.transport import redis as redis_transport
+from prometheus_client.core import GaugeMetricFamily
+
+
+logger = logging.getLogger(__name__)
+
+
+ENQUEUED_AT_HEADER = 'enqueued_at'
+
+TASK_PUBLISHED = Counter('iiko_celery_task_published', 'Отправленные в очередь задачи', ['task'])
+TASK_QUEUE_LATENCY = Histogram(
+    'iiko_celery_task_queue_latency_seconds', 'Время от отправки задачи до начала выполнения', ['task'],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, float('inf')))
+TASK_RUNTIME = Histogram(
+    'iiko_celery_task_runtime_seconds', 'Время выполнения задачи', ['task', 'state'],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, float('inf')))
+TASK_RETRIES = Counter('iiko_celery_task_retries', 'Повторные попытки задач', ['task'])
+TASK_FAILURES = Counter('iiko_celery_task_failures', 'Задачи, завершившиеся ошибкой', ['task', 'exception'])
+
+# Время начала выполнения по task_id, задачи процесса выполняются последовательно
+_started = {}
+
+
+@before_task_publish.connect
+def _mark_enqueued(sender=None, headers=None, **kwargs):
+    if headers is None:
+        return
+    headers.setdefault(ENQUEUED_AT_HEADER, time.time())
+    TASK_PUBLISHED.labels(sender).inc()
+
+
+@task_prerun.connect
+def _task_started(task_id=None, task=None, **kwargs):
+    _started[task_id] = time.perf_counter()
+
+    enqueued_at = getattr(task.request, ENQUEUED_AT_HEADER, None)
+    if enqueued_at is None:
+        return
+
+    # Для задач с eta или countdown ожидание считается от назначенного времени
+    eta = task.request.eta
+    if eta:
+        enqueued_at = max(enqueued_at, datetime.fromisoformat(eta).timestamp())
+    TASK_QUEUE_LATENCY.labels(task.name).observe(max(0.0, time.time() - enqueued_at))
+
+
+@task_postrun.connect
+def _task_finished(task_id=None, task=None, state=None, **kwargs):
+    started = _started.pop(task_id, None)
+    if started is not None:
+        TASK_RUNTIME.labels(task.name, state or 'UNKNOWN').observe(time.perf_counter() - started)
+
+
+@task_retry.connect
+def _task_retried(sender=None, **kwargs):
+    TASK_RETRIES.labels(sender.name).inc()
+
+
+@task_failure.connect
+def _task_failed(sender=None, exception=None, **kwargs):
+    TASK_FAILURES.labels(sender.name, type(exception).__name__).inc()
+
+
+class QueueLengthCollector:
+    """
+    Длина очередей задач в Redis при каждом чтении метрик. Если брокер недоступен,
+    длины очередей не отдаются, а iiko_celery_queue_scrape_error равен 1:
+    остальные метрики воркера читаются как обычно.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def queue_keys(self, queue) -> set:
+        # Транспорт Redis хранит задачи с разным приоритетом в отдельных списках:
+        # очередь для шага 0 и очередь + sep + шаг для остальных (параметры priority_steps и sep)
+        options = self.app.conf.broker_transport_options or {}
+        sep = options.get('sep', redis_transport.Channel.sep)
+        steps = options.get('priority_steps', redis_transport.PRIORITY_STEPS)
+        return {f'{queue}{sep}{step}' if step else queue for step in steps}
+
+    def collect(self):
+        metric = GaugeMetricFamily('iiko_celery_queue_length', 'Задач, ожидающих в очереди', labels=['queue'])
+        error = GaugeMetricFamily('iiko_celery_queue_scrape_error', '1, если длину очередей не удалось прочитать')
+
+        with self.app.connection_for_read() as connection:
+            try:
+                client = getattr(connection.default_channel, 'client', None)
+                if client is None:
+                    return
+                lengths = {queue: sum(client.llen(key) for key in self.queue_keys(queue))
+                           for queue in self.app.amqp.queues}
+            except (KombuError, *connection.connection_errors, *connection.channel_errors) as e:
+                logger.warning('Failed to read Celery queue lengths: %r', e)
+                error.add_metric([], 1)
+                yield error
+                return
+
+        for queue, length in lengths.items():
+            metric.add_metric([queue], length)
+        error.add_metric([], 0)
+        yield metric
+        yield error
+
+
+def start_metrics_server(app, port):
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    registry.register(QueueLengthCollector(app))
+    start_http_server(port, registry=registry)
+
+
+@worker_init.connect
+def _start_worker_metrics(sender=None, **kwargs):
+    from django.conf import settings
+
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+
+    if settings.CELERY_METRICS_PORT:
+        start_metrics_server(sender.app, settings.CELERY_METRICS_PORT)
+
+
+@worker_process_shutdown.connect
+def _mark_process_dead(pid=None, **kwargs):
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        multiprocess.mark_process_dead(pid or os.getpid())
@@ -0,0 +1,39 @@
+"""
+Общая основа API-тестов приложений.
+
+Тест объявляет scale — размеры дерева backend.benchmark.seed на одного родителя,
+данные создаются один раз на класс, id объектов доступны в self.ids. Перед каждым
+тестом кэш очищается, а клиент входит под автором первой организации.
+"""
+from django.core.cache import cache
+from rest_framework.test import APITestCase
+
+from backend.benchmark.seed import seed
+from core.authentication import access_token_for
+from core.models import User
+
+
+class SeededAPITestCase(APITestCase):
+    scale = {
+        'organizations': 1,
+        'chains': 1,
+        'restaurants': 1,
+        'users': 1,
+        'categories': 1,
+        'kitchens': 1,
+        'ingredients': 1,
+        'products': 1,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ids = seed(**cls.scale)
+        cls.author = User.objects.get(pk=cls.ids['author_id'])
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.login(self.author)
+
+    def login(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access_token_for(user)}')
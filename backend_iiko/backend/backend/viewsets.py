@@ -2,8 +2,17 @@ from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
+from .prefetch import optimize_queryset
 
-class MyModelViewSet(ModelViewSet):
+
+class OptimizedQuerysetMixin:
+    # Строит select_related/prefetch_related по вложенности сериализатора текущего действия.
+    # Сериализатор создается с контекстом запроса, поэтому отрезанные ?fields=/?expand= связи не загружаются
+    def get_queryset(self):
+        return optimize_queryset(super().get_queryset(), self.get_serializer())
+
+
+class MyModelViewSet(OptimizedQuerysetMixin, ModelViewSet):
     def response_serializer(self, *args, **kwargs):
         return self.serializer_class(*args, **kwargs).data
 
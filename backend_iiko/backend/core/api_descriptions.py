@@ -45,17 +45,18 @@ user = {
     },
     "login_user": {
         "summary": "Авторизация пользователя",
-        "description": "Авторизация пользователя по username и паролю",
+        "description": "Авторизация пользователя по username и паролю. include_user=false — ответ только с токенами",
         "request": "LoginSerializer"
     },
     "login_user_with_code": {
         "summary": "Авторизация пользователя по коду",
-        "description": "Авторизация пользователя по коду",
+        "description": "Авторизация пользователя по коду. include_user=false — ответ только с токенами",
         "request": "LoginWithCodeSerializer"
     },
     "refresh_token": {
         "summary": "Обновление access и refresh токенов",
-        "description": "Обновление access и refresh токенов",
+        "description": "Обновление access и refresh токенов без запросов к базе, профиль пользователя берется из кэша. "
+                       "include_user=false — ответ только с токенами",
         "request": "RefreshTokenSerializer"
     },
     "confirm_password_change": {
@@ -0,0 +1,178 @@
+import time
+
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import User
+
+
+# Дополнительные claims токена: активность пользователя, версия его членства
+# и профиля и точное время выдачи (iat — в целых секундах)
+ACTIVE_CLAIM = 'active'
+MEMBERSHIP_CLAIM = 'mv'
+ISSUED_CLAIM = 'ins'
+
+MEMBERSHIP_VERSION_KEY = 'auth:membership:{}'
+REVOKED_KEY = 'auth:revoked:{}'
+
+
+def get_membership_version(user_id) -> int:
+    """
+    Версия членства пользователя в организациях, сетях и ресторанах и его профиля —
+    время последнего изменения в наносекундах. Хранится только в кэше, по ней
+    кэшируются данные, зависящие от пользователя и его членства (core.profiles).
+    """
+    key = MEMBERSHIP_VERSION_KEY.format(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_membership_versions(user_ids):
+    version = time.time_ns()
+    cache.set_many({MEMBERSHIP_VERSION_KEY.format(user_id): version for user_id in user_ids}, timeout=None)
+
+
+def revoke_tokens(user_id):
+    """
+    Отзывает все токены пользователя, выданные до этого момента. Ключ живет
+    столько же, сколько refresh-токен, после этого старые токены истекают сами.
+    Версия членства удаляется: без нее access-токены и refresh проверяют активность
+    пользователя по базе, даже если ключ отзыва вытеснен из кэша.
+    """
+    timeout = int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds())
+    cache.set(REVOKED_KEY.format(user_id), time.time_ns(), timeout=timeout)
+    cache.delete(MEMBERSHIP_VERSION_KEY.format(user_id))
+
+
+def _revoked(token, revoked_at) -> bool:
+    if revoked_at is None:
+        return False
+    # У токенов без точного времени выдачи отозвана вся секунда отзыва
+    issued_at = token.get(ISSUED_CLAIM, token.get('iat', 0) * 10 ** 9)
+    return issued_at <= revoked_at
+
+
+def is_current(token) -> bool:
+    """
+    Access-токен не отозван и выдан для текущей версии членства. Одно чтение кэша.
+    Если версии нет в кэше (вытеснена, удалена при отзыве или кэш свой у каждого процесса),
+    активность пользователя проверяется одним запросом к базе, и версией становится
+    версия из токена: без версии нельзя отличить устаревший токен от актуального.
+    """
+    user_id = token[api_settings.USER_ID_CLAIM]
+    revoked_key, version_key = REVOKED_KEY.format(user_id), MEMBERSHIP_VERSION_KEY.format(user_id)
+    values = cache.get_many([revoked_key, version_key])
+    if _revoked(token, values.get(revoked_key)) or MEMBERSHIP_CLAIM not in token:
+        return False
+
+    version = values.get(version_key)
+    if version is None:
+        if not User.objects.filter(pk=user_id, is_active=True).exists():
+            return False
+        cache.add(version_key, token[MEMBERSHIP_CLAIM], timeout=None)
+        version = cache.get(version_key)
+    return token[MEMBERSHIP_CLAIM] == version
+
+
+def _set_claims(token, is_active, version):
+    token[ACTIVE_CLAIM] = is_active
+    token[MEMBERSHIP_CLAIM] = version
+    token[ISSUED_CLAIM] = time.time_ns()
+    return token
+
+
+class UserRefreshToken(RefreshToken):
+    """Refresh-токен, access-токены которого проверяются без запроса к базе."""
+
+    @classmethod
+    def for_user(cls, user):
+        return _set_claims(super().for_user(user), user.is_active, get_membership_version(user.pk))
+
+
+def access_token_for(user):
+    return UserRefreshToken.for_user(user).access_token
+
+
+def refresh_access_token(refresh, extra_keys=()):
+    """
+    Новый access-токен по refresh-токену за одно чтение кэша: ключ отзыва, версия
+    членства и extra_keys, их значения возвращаются вместе с токеном. Деактивация
+    и удаление отзывают токены и удаляют версию, поэтому пока версия в кэше,
+    неотозванный токен принадлежит активному пользователю. Без версии (или у токенов,
+    выданных до появления claims) активность проверяется по базе.
+    """
+    user_id = refresh[api_settings.USER_ID_CLAIM]
+    revoked_key, version_key = REVOKED_KEY.format(user_id), MEMBERSHIP_VERSION_KEY.format(user_id)
+    values = cache.get_many([revoked_key, version_key, *extra_keys])
+
+    if _revoked(refresh, values.get(revoked_key)):
+        raise TokenError('Token has been revoked')
+
+    version = values.get(version_key)
+    if version is None or ACTIVE_CLAIM not in refresh:
+        if not User.objects.filter(pk=user_id, is_active=True).exists():
+            raise TokenError('User is inactive or deleted')
+        if version is None:
+            version = get_membership_version(user_id)
+    return _set_claims(refresh.access_token, True, version), values
+
+
+class LazyUser(SimpleLazyObject):
+    """
+    Пользователь из claims токена. id, pk, is_active и membership_version доступны сразу,
+    обращение к остальным полям загружает core.User из базы один раз за запрос.
+    """
+
+    def __init__(self, token):
+        user_id = token[api_settings.USER_ID_CLAIM]
+        super().__init__(lambda: User.objects.get(pk=user_id))
+        self.__dict__['_token'] = token
+
+    @property
+    def id(self):
+        return self._token[api_settings.USER_ID_CLAIM]
+
+    pk = id
+
+    @property
+    def is_active(self):
+        return self._token[ACTIVE_CLAIM]
+
+    @property
+    def membership_version(self):
+        return self._token[MEMBERSHIP_CLAIM]
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __bool__(self):
+        # IsAuthenticated проверяет bool(request.user) до is_authenticated
+        return True
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    Аутентификация по claims access-токена: вместо загрузки пользователя из базы
+    в кэше проверяются отзыв токенов и версия членства. Токен, выданный до изменения
+    членства, отклоняется с кодом token_not_valid, клиент получает новый через refresh.
+    Токены без claims, выданные до появления UserRefreshToken, проверяются как в JWTAuthentication.
+    """
+
+    def get_user(self, validated_token):
+        if ACTIVE_CLAIM not in validated_token or MEMBERSHIP_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+
+        if not validated_token[ACTIVE_CLAIM]:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+
+        if not is_current(validated_token):
+            raise AuthenticationFailed('Token has been revoked or is outdated', code='token_not_valid')
+
+        return LazyUser(validated_token)
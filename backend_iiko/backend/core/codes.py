@@ -0,0 +1,117 @@
+"""
+Выдача уникальных шестизначных кодов входа без перебора.
+
+Номер из счетчика LoginCodeSequence переводится в код перестановкой Фейстеля
+над [0, 900000), поэтому разные номера всегда дают разные коды, а соседние
+номера — непохожие коды. Счетчик увеличивается одним UPDATE сразу на все
+запрошенные коды, так что одновременные регистрации не получают один код.
+"""
+import hashlib
+import secrets
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+CODE_MIN = 100000
+# Пространство кодов 900 * 1000, половины перестановки в разных основаниях
+_LEFT, _RIGHT = 900, 1000
+CODE_SPACE = _LEFT * _RIGHT
+ROUNDS = 6
+SEQUENCE_ID = 1
+# Ограничение числа параметров в одном IN
+_CHUNK = 1000
+
+# Коды, которых нет в базе, по ним CodeAuthenticationBackend не обращается к базе.
+# Ключ удаляется при выдаче кода и сохранении пользователя с этим кодом
+MISSING_CODE_KEY = 'auth:missing_code:{}'
+MISSING_CODE_TIMEOUT = 60
+
+
+class LoginCodesExhausted(Exception):
+    pass
+
+
+def _round(key: bytes, number: int, value: int) -> int:
+    digest = hashlib.blake2b(f'{number}:{value}'.encode(), key=key, digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+def permute(index: int, key: bytes) -> int:
+    """Биекция [0, CODE_SPACE) -> [0, CODE_SPACE), основания половин меняются каждый раунд."""
+    left, right = divmod(index, _RIGHT)
+    radix_left, radix_right = _LEFT, _RIGHT
+    for number in range(ROUNDS):
+        left, right = right, (left + _round(key, number, right)) % radix_left
+        radix_left, radix_right = radix_right, radix_left
+    return left * radix_right + right
+
+
+def _reserve(count, using):
+    # Строка счетчика блокируется до конца транзакции, номера не выдаются дважды
+    sequence_model = apps.get_model('core', 'LoginCodeSequence')
+    connection = connections[using]
+    table = connection.ops.quote_name(sequence_model._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {table} SET next_index = next_index + %s '
+            f'WHERE id = %s AND next_index + %s <= %s RETURNING next_index, key, check_taken',
+            [count, SEQUENCE_ID, count, CODE_SPACE])
+        return cursor.fetchone()
+
+
+def _create_sequence(using):
+    # Счетчик мог создать параллельный запрос, тогда get_or_create вернет его строку
+    user_model = apps.get_model('core', 'User')
+    apps.get_model('core', 'LoginCodeSequence').objects.using(using).get_or_create(
+        id=SEQUENCE_ID, defaults={
+            'key': secrets.token_hex(32),
+            'check_taken': user_model.objects.using(using).exclude(code=None).exists(),
+        })
+
+
+def forget_missing_codes(codes):
+    cache.delete_many([MISSING_CODE_KEY.format(code) for code in codes])
+
+
+def allocate_codes(count, using=DEFAULT_DB_ALIAS) -> list:
+    """
+    Выдает count уникальных кодов одним запросом к счетчику. Если свободных
+    кодов меньше count, сразу бросает LoginCodesExhausted, ничего не выдавая.
+    """
+    if count <= 0:
+        return []
+
+    row = _reserve(count, using)
+    if row is None:
+        # Счетчика еще нет или коды закончились: после создания счетчика пробуем еще раз
+        _create_sequence(using)
+        row = _reserve(count, using)
+        if row is None:
+            raise LoginCodesExhausted(f'Less than {count} login codes left')
+
+    end, key, check_taken = row
+    key = bytes.fromhex(key)
+    codes = [CODE_MIN + permute(index, key) for index in range(end - count, end)]
+    forget_missing_codes(codes)
+    if not check_taken:
+        return codes
+
+    # Пропускаем коды, которые были выданы случайным образом до счетчика
+    user_model = apps.get_model('core', 'User')
+    taken = set()
+    for start in range(0, len(codes), _CHUNK):
+        taken.update(user_model.objects.using(using)
+                     .filter(code__in=codes[start:start + _CHUNK])
+                     .values_list('code', flat=True))
+    if not taken:
+        return codes
+    return [code for code in codes if code not in taken] + allocate_codes(len(taken), using)
+
+
+def assign_codes(users, using=DEFAULT_DB_ALIAS):
+    """Заполняет code у несохраненных пользователей перед bulk_create, одним выделением."""
+    users = [user for user in users if not user.code]
+    for user, code in zip(users, allocate_codes(len(users), using)):
+        user.code = code
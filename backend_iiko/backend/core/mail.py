@@ -0,0 +1,189 @@
+"""
+Очередь исходящих писем.
+
+Письма записываются в OutgoingEmail в транзакции запроса, после коммита ставится
+задача send_queued_emails с небольшой задержкой, одна на все письма за это время.
+Задача забирает письма пачками по MAIL_BATCH_SIZE и отправляет каждую пачку через
+одно соединение get_connection(). Неотправленные письма повторяются с растущей
+задержкой, после MAIL_MAX_ATTEMPTS попыток помечаются failed и удаляются через
+MAIL_FAILED_RETENTION. Бэкенд отправки — EMAIL_BACKEND: SMTP, а для разработки
+и тестов locmem, console или локальный SMTP.
+
+Секреты (токен подтверждения email, код смены пароля) в очереди не хранятся:
+письмо ссылается на пользователя, а токен и код подставляются при отправке.
+"""
+import functools
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.template.loader import get_template
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from .models import OutgoingEmail, User
+
+
+def _verification_context(user):
+    return {
+        'uid': urlsafe_base64_encode(force_bytes(user.pk)),
+        'token': default_token_generator.make_token(user),
+    }
+
+
+def _code_context(user):
+    # Действующий код на момент отправки; без запроса на смену пароля письмо не нужно
+    confirmation = getattr(user, 'password_change_confirmation', None)
+    return {'code': confirmation.code} if confirmation is not None else None
+
+
+# Тема, шаблон и контекст с секретами, который строится по пользователю при отправке
+TEMPLATES = {
+    'email_verification': ('Подтвердите ваш аккаунт', 'core/email_verification.html', _verification_context),
+    'email_code': ('Подтвердите смену пароля', 'core/email_code.html', _code_context),
+}
+
+MAIL_BATCH_SIZE = 50
+# Письма, поставленные в очередь за это время, уходят одной пачкой
+MAIL_BATCH_DELAY = 2
+MAIL_MAX_ATTEMPTS = 5
+MAIL_RETRY_DELAY = timedelta(seconds=30)
+# Время, на которое воркер забирает пачку; если он упал, письма отправит следующий
+MAIL_LEASE = timedelta(minutes=5)
+MAIL_FAILED_RETENTION = timedelta(days=7)
+
+# Задача отправки уже поставлена. Ключ снимает сама задача перед тем, как забрать письма,
+# таймаут нужен, только если задача потерялась (тогда письма отправит beat)
+FLUSH_SCHEDULED_KEY = 'mail:flush_scheduled'
+FLUSH_SCHEDULED_TIMEOUT = 60
+
+
+@functools.cache
+def _template(name):
+    # Шаблон компилируется один раз на процесс
+    return get_template(TEMPLATES[name][1])
+
+
+def render_email(email: OutgoingEmail, user=None):
+    """
+    Собирает письмо. user — получатель с password_change_confirmation, для писем
+    без пользователя используется только сохраненный контекст. Возвращает None,
+    если письмо больше не нужно (например, запрос на смену пароля уже выполнен).
+    """
+    subject, _, build_context = TEMPLATES[email.template]
+    context = email.context
+    if email.user_id is not None:
+        secrets = build_context(user) if user is not None else None
+        if secrets is None:
+            return None
+        context = {**context, **secrets}
+    body = _template(email.template).render(context)
+    return EmailMessage(subject, body, settings.DEFAULT_FROM_EMAIL, [email.recipient])
+
+
+def _schedule_flush():
+    from .tasks import send_queued_emails
+
+    if cache.add(FLUSH_SCHEDULED_KEY, True, timeout=FLUSH_SCHEDULED_TIMEOUT):
+        send_queued_emails.apply_async(countdown=MAIL_BATCH_DELAY)
+
+
+def queue_email(template, recipient, context, user=None) -> OutgoingEmail:
+    email = OutgoingEmail.objects.create(template=template, recipient=recipient, context=context, user=user,
+                                         send_after=timezone.now())
+    transaction.on_commit(_schedule_flush)
+    return email
+
+
+def queue_verification_email(user) -> OutgoingEmail:
+    return queue_email('email_verification', user.email, {'user': {'username': user.username}}, user=user)
+
+
+def queue_code_email(user) -> OutgoingEmail:
+    # Код берется из PasswordChangeConfirmation при отправке
+    return queue_email('email_code', user.email, {'user': {'username': user.username}}, user=user)
+
+
+def _claim(batch_size) -> list:
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(OutgoingEmail.objects
+                      .select_for_update(skip_locked=True)
+                      .filter(failed=False, send_after__lte=now)
+                      .order_by('send_after')[:batch_size])
+        OutgoingEmail.objects.filter(pk__in=[email.pk for email in emails]).update(send_after=now + MAIL_LEASE)
+    return emails
+
+
+def _defer(failures):
+    # failures — пары (письмо, ошибка); задержка удваивается с каждой попыткой
+    now = timezone.now()
+    emails = []
+    for email, error in failures:
+        emails.append(email)
+        email.attempts += 1
+        email.last_error = repr(error)[:1000]
+        email.failed = email.attempts >= MAIL_MAX_ATTEMPTS
+        email.send_after = now + MAIL_RETRY_DELAY * 2 ** (email.attempts - 1)
+    OutgoingEmail.objects.bulk_update(emails, ['attempts', 'last_error', 'failed', 'send_after'])
+
+
+def send_batch(batch_size=MAIL_BATCH_SIZE) -> int:
+    """
+    Отправляет одну пачку писем, которым подошло время, через одно соединение.
+    Возвращает число забранных из очереди писем.
+    """
+    emails = _claim(batch_size)
+    if not emails:
+        return 0
+
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as error:
+        _defer([(email, error) for email in emails])
+        return len(emails)
+
+    # Получатели одним запросом: токены и коды строятся из их текущего состояния
+    users = (User.objects.select_related('password_change_confirmation')
+             .in_bulk({email.user_id for email in emails if email.user_id is not None}))
+
+    done, failures = [], []
+    try:
+        for email in emails:
+            try:
+                message = render_email(email, users.get(email.user_id))
+                if message is not None:
+                    connection.send_messages([message])
+                done.append(email.pk)
+            except Exception as error:
+                failures.append((email, error))
+    finally:
+        connection.close()
+
+    OutgoingEmail.objects.filter(pk__in=done).delete()
+    if failures:
+        _defer(failures)
+    return len(emails)
+
+
+def send_queued(batch_size=MAIL_BATCH_SIZE) -> int:
+    # Отправляет пачки, пока очередь не опустеет. Письма, поставленные после этого момента,
+    # запланируют новую задачу
+    cache.delete(FLUSH_SCHEDULED_KEY)
+    total = 0
+    while True:
+        claimed = send_batch(batch_size)
+        total += claimed
+        if claimed < batch_size:
+            return total
+
+
+def purge_failed(retention=MAIL_FAILED_RETENTION) -> int:
+    # Письма, которые так и не удалось отправить, хранятся для разбора ошибок ограниченное время
+    deleted, _ = OutgoingEmail.objects.filter(failed=True, created_at__lt=timezone.now() - retention).delete()
+    return deleted
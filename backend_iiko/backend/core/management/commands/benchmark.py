@@ -0,0 +1,84 @@
+import platform
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings, setup_databases, teardown_databases
+from rest_framework.test import APIClient
+
+from backend.benchmark.runner import format_report, load_results, run_scenario, save_results
+from backend.benchmark.scenarios import get_scenarios
+from backend.benchmark.seed import DEFAULT_SCALE, seed
+from backend.celery import app as celery_app
+from core.authentication import access_token_for
+from core.models import User
+
+
+class Command(BaseCommand):
+    help = ('Замер задержки, пропускной способности и числа запросов к базе для endpoint-ов API '
+            'на синтетических данных. Данные создаются в отдельной тестовой базе '
+            '(SQLite или Postgres из DATABASES) и удаляются после замера.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Запросов на сценарий')
+        parser.add_argument('--warmup', type=int, default=10, help='Запросов прогрева на сценарий')
+        parser.add_argument('--only', action='append', default=[],
+                            help='Запустить только сценарии, имя которых содержит подстроку')
+        parser.add_argument('--output', help='Сохранить результаты в JSON')
+        parser.add_argument('--baseline', help='Сравнить с результатами, сохраненными через --output')
+        for name, default in DEFAULT_SCALE.items():
+            parser.add_argument(f'--{name}', type=int, default=default, help=f'Масштаб данных, по умолчанию {default}')
+
+    def handle(self, *args, **options):
+        scale = {name: options[name] for name in DEFAULT_SCALE}
+
+        # Кэш в памяти процесса, без pub/sub и с задачами Celery в том же процессе,
+        # чтобы замер не зависел от Redis и не трогал общие ключи. Время записей
+        # поэтому включает перестроение снимков меню.
+        isolated = override_settings(
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                'LOCATION': 'benchmark'}},
+            REDIS_URL=None,
+        )
+        always_eager = celery_app.conf.task_always_eager
+        celery_app.conf.task_always_eager = True
+        old_config = setup_databases(verbosity=0, interactive=False)
+
+        try:
+            with isolated:
+                results = self._run(scale, options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            celery_app.conf.task_always_eager = always_eager
+
+        baseline = load_results(options['baseline']) if options['baseline'] else None
+        self.stdout.write(format_report(results, baseline))
+
+        if options['output']:
+            save_results(options['output'], results, {
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'debug': settings.DEBUG,
+                'scale': scale,
+                'requests': options['requests'],
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            })
+            self.stdout.write(self.style.SUCCESS(f'Results saved to {options["output"]}'))
+
+    def _run(self, scale, options) -> dict:
+        started = time.perf_counter()
+        ids = seed(**scale)
+        self.stderr.write(f'Seeded {connection.vendor} database in {time.perf_counter() - started:.1f}s: '
+                          + ', '.join(f'{name}={value}' for name, value in scale.items()))
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {access_token_for(User.objects.get(pk=ids["author_id"]))}')
+
+        results = {}
+        for name, method, path, body in get_scenarios(ids):
+            if options['only'] and not any(part in name for part in options['only']):
+                continue
+            self.stderr.write(f'Running {name}...')
+            results[name] = run_scenario(client, method, path, body, options['requests'], options['warmup'])
+        return results
@@ -0,0 +1,19 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+from backend.search import trigram_indexes
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_alter_user_chains_alter_user_organizations_and_more'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        trigram_indexes(
+            ('core_user', 'username'),
+            ('core_user', 'email'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.6 on 2026-10-18 07:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoginCodeSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('next_index', models.PositiveIntegerField(default=0)),
+                ('key', models.CharField(max_length=64)),
+                ('check_taken', models.BooleanField(default=False)),
+            ],
+        ),
+    ]
@@ -1,7 +1,9 @@
-import random
+import secrets
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 
+from .codes import allocate_codes
+
 
 class User(AbstractUser):
     email = models.EmailField(unique=True, blank=True)
@@ -11,15 +13,33 @@ class User(AbstractUser):
     chains = models.ManyToManyField('organization.Chain', related_name='users', blank=True)
     restaurants = models.ManyToManyField('organization.Restaurant', related_name='users', blank=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Значения, при изменении которых отзываются выданные токены
+        instance._auth_state = instance.auth_state()
+        return instance
+
+    def auth_state(self):
+        return self.__dict__.get('password'), self.__dict__.get('is_active')
+
     def save(self, *args, **kwargs):
         if not self.code:
-            while True:
-                self.code = random.randint(100000, 999999)
-                if not User.objects.filter(code=self.code).exists():
-                    break
+            self.code, = allocate_codes(1)
         super().save(*args, **kwargs)
 
 
+class LoginCodeSequence(models.Model):
+    """
+    Счетчик выданных кодов входа, единственная строка. Код — перестановка номера
+    из счетчика по ключу key, поэтому ключ нельзя менять после выдачи первых кодов.
+    """
+    next_index = models.PositiveIntegerField(default=0)
+    key = models.CharField(max_length=64)
+    # Коды, выданные до появления счетчика, нужно пропускать
+    check_taken = models.BooleanField(default=False)
+
+
 class PasswordChangeConfirmation(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="password_change_confirmation")
     code = models.CharField(max_length=6)
@@ -27,7 +47,7 @@ class PasswordChangeConfirmation(models.Model):
 
     def generate_confirmation_code(self):
         from django.utils.timezone import now
-        self.code = f'{random.randint(100000, 999999)}'
+        self.code = f'{100000 + secrets.randbelow(900000)}'
         self.created_at = now()
         self.save()
 
@@ -35,3 +55,25 @@ class PasswordChangeConfirmation(models.Model):
         from datetime import timedelta
         from django.utils.timezone import now
         return now() - self.created_at <= timedelta(minutes=10)
+
+
+class OutgoingEmail(models.Model):
+    """
+    Письмо в очереди отправки (core.mail). Контекст шаблона хранится в JSON без секретов:
+    токены и коды строятся по user при отправке. После отправки запись удаляется.
+    """
+    template = models.CharField(max_length=50)
+    recipient = models.EmailField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    context = models.JSONField(default=dict)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Не раньше этого времени: задержка повтора или аренда отправляющим воркером
+    send_after = models.DateTimeField()
+    failed = models.BooleanField(default=False)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['send_after'], condition=models.Q(failed=False), name='core_outgoingemail_queue'),
+        ]
@@ -0,0 +1,46 @@
+"""
+Кэш профиля пользователя, который возвращают login и refresh_token.
+
+Профиль хранится под ключом пользователя вместе с версией членства, на которой
+он построен (core.authentication.get_membership_version). Версия меняется при
+сохранении пользователя, изменении его членства и переименовании или удалении
+организаций, сетей и ресторанов, в которых он состоит, после этого профиль
+строится заново при следующем чтении.
+"""
+from django.core.cache import cache
+from django.db.models import prefetch_related_objects
+
+from backend.metrics import record_cache_lookup
+
+from .models import User
+
+
+PROFILE_KEY = 'auth:profile:{}'
+PROFILE_TIMEOUT = 60 * 60 * 24
+PROFILE_RELATIONS = ('organizations', 'chains', 'restaurants')
+
+
+def profile_key(user_id) -> str:
+    return PROFILE_KEY.format(user_id)
+
+
+def get_profile(user_id, version, cached=None, user=None) -> dict:
+    """
+    Профиль пользователя для версии version. cached — уже прочитанное значение
+    ключа профиля, user — уже загруженный пользователь, чтобы не читать его снова.
+    """
+    if cached is None:
+        cached = cache.get(profile_key(user_id))
+    record_cache_lookup('user_profile', cached is not None and cached['version'] == version)
+    if cached is not None and cached['version'] == version:
+        return cached['data']
+
+    from .serializers import GetUserSerializer
+
+    if user is None:
+        user = User.objects.prefetch_related(*PROFILE_RELATIONS).get(pk=user_id)
+    else:
+        prefetch_related_objects([user], *PROFILE_RELATIONS)
+    data = dict(GetUserSerializer(user).data)
+    cache.set(profile_key(user_id), {'version': version, 'data': data}, timeout=PROFILE_TIMEOUT)
+    return data
@@ -0,0 +1,6 @@
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+
+
+class StatelessJWTScheme(SimpleJWTScheme):
+    # Та же схема jwtAuth в OpenAPI, что и у JWTAuthentication
+    target_class = 'core.authentication.StatelessJWTAuthentication'
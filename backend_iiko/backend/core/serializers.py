@@ -1,32 +1,35 @@
 from rest_framework import serializers
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 from organization.models import Organization, Chain, Restaurant
+from backend.sparse import SparseFieldsMixin
 
+from .authentication import MEMBERSHIP_CLAIM, UserRefreshToken, refresh_access_token
+from .codes import LoginCodesExhausted
 from .models import User
+from .profiles import get_profile, profile_key
 
 
-class GetOrganizationUserSerializer(serializers.ModelSerializer):
+class GetOrganizationUserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Organization
         fields = ['id', 'name']
 
 
-class GetChainUserSerializer(serializers.ModelSerializer):
+class GetChainUserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Organization
         fields = ['id', 'name']
 
 
-class GetRestaurantUserSerializer(serializers.ModelSerializer):
+class GetRestaurantUserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Organization
         fields = ['id', 'name']
 
 
-class GetUserSerializer(serializers.ModelSerializer):
+class GetUserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     organizations = GetOrganizationUserSerializer(many=True, read_only=True)
     chains = GetChainUserSerializer(many=True, read_only=True)
     restaurants = GetRestaurantUserSerializer(many=True, read_only=True)
@@ -36,7 +39,21 @@ class GetUserSerializer(serializers.ModelSerializer):
         fields = ['id', 'email', 'username', 'code', 'organizations', 'chains', 'restaurants', 'is_active']
 
 
-class LoginSerializer(serializers.Serializer):
+class TokenResponseSerializer(serializers.Serializer):
+    # include_user=false — только токены, для терминалов, которые обновляют токены часто
+    include_user = serializers.BooleanField(default=True)
+
+    def token_response(self, attrs, refresh, user):
+        data = {
+            "access": str(refresh.access_token),
+            "refresh": str(refresh),
+        }
+        if attrs.get('include_user'):
+            data["user"] = get_profile(user.pk, refresh[MEMBERSHIP_CLAIM], user=user)
+        return data
+
+
+class LoginSerializer(TokenResponseSerializer):
     username = serializers.CharField()
     password = serializers.CharField()
 
@@ -52,15 +69,10 @@ class LoginSerializer(serializers.Serializer):
         if not user.is_active:
             raise serializers.ValidationError('User is not active')
 
-        refresh = RefreshToken.for_user(user)
-        return {
-            "access": str(refresh.access_token),
-            "refresh": str(refresh),
-            "user": GetUserSerializer(user).data
-        }
+        return self.token_response(attrs, UserRefreshToken.for_user(user), user)
 
 
-class LoginWithCodeSerializer(serializers.Serializer):
+class LoginWithCodeSerializer(TokenResponseSerializer):
     code = serializers.IntegerField(validators=[MinValueValidator(100000), MaxValueValidator(999999)])
 
     def validate(self, attrs):
@@ -74,27 +86,27 @@ class LoginWithCodeSerializer(serializers.Serializer):
         if not user.is_active:
             raise serializers.ValidationError('User is not active')
 
-        refresh = RefreshToken.for_user(user)
-        return {
-            "access": str(refresh.access_token),
-            "refresh": str(refresh),
-            "user": GetUserSerializer(user).data
-        }
+        return self.token_response(attrs, UserRefreshToken.for_user(user), user)
 
 
-class RefreshTokenSerializer(serializers.Serializer):
+class RefreshTokenSerializer(TokenResponseSerializer):
     token = serializers.CharField()
 
     def validate(self, attrs):
+        # Ключ отзыва, версия и профиль читаются из кэша одним запросом, пользователь из базы не загружается
         token = attrs.get('token')
         try:
-            refresh = RefreshToken(token)
-            user = User.objects.get(id=refresh['user_id'])
-            return {
-                "access": str(refresh.access_token),
+            refresh = UserRefreshToken(token)
+            user_id = refresh['user_id']
+            key = profile_key(user_id)
+            access, cached = refresh_access_token(refresh, [key] if attrs.get('include_user') else [])
+            data = {
+                "access": str(access),
                 "refresh": str(refresh),
-                "user": GetUserSerializer(user).data
             }
+            if attrs.get('include_user'):
+                data["user"] = get_profile(user_id, access[MEMBERSHIP_CLAIM], cached=cached.get(key))
+            return data
         except Exception as e:
             raise serializers.ValidationError('Invalid token')
 
@@ -107,7 +119,10 @@ class RegistrationUserRequestSerializer(serializers.ModelSerializer):
         extra_kwargs = {'password': {'write_only': True}}
 
     def create(self, validated_data):
-        user = User.objects.create_user(**validated_data)
+        try:
+            user = User.objects.create_user(**validated_data)
+        except LoginCodesExhausted:
+            raise serializers.ValidationError('No login codes left, registration is closed')
         user.is_active = False
         user.set_password(validated_data['password'])
         user.save()
@@ -0,0 +1,37 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import bump_membership_versions, revoke_tokens
+from .codes import forget_missing_codes
+from .models import User
+
+
+@receiver(post_save, sender=User)
+def revoke_on_credentials_change(sender, instance, created, **kwargs):
+    state = getattr(instance, '_auth_state', None)
+    instance._auth_state = instance.auth_state()
+    if created or state is None or state == instance._auth_state:
+        return
+
+    transaction.on_commit(lambda: revoke_tokens(instance.pk))
+
+
+@receiver(post_save, sender=User)
+def bump_on_profile_change(sender, instance, **kwargs):
+    # Версия членства — и версия кэшированного профиля (core.profiles)
+    user_id = instance.pk
+    transaction.on_commit(lambda: bump_membership_versions([user_id]))
+
+
+@receiver(post_delete, sender=User)
+def revoke_on_delete(sender, instance, **kwargs):
+    user_id = instance.pk
+    transaction.on_commit(lambda: revoke_tokens(user_id))
+
+
+@receiver(post_save, sender=User)
+def forget_missing_code(sender, instance, **kwargs):
+    # Код мог быть задан вручную, а не выдан allocate_codes
+    if instance.code:
+        forget_missing_codes([instance.code])
@@ -1,3 +1,332 @@
-from django.test import TestCase
+from smtplib import SMTPRecipientsRefused
+from unittest import mock
+
+from django.contrib.auth.tokens import default_token_generator
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends import locmem
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from django.test import TestCase, override_settings
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from backend.benchmark.seed import PASSWORD
+from backend.querybudget import Budget, QueryBudgetMixin
+from organization.models import Organization
+
+from . import urls
+from .authentication import UserRefreshToken, is_current
+from .codes import CODE_MIN, CODE_SPACE, SEQUENCE_ID, LoginCodesExhausted, _reserve, allocate_codes, permute
+from .mail import (MAIL_FAILED_RETENTION, MAIL_MAX_ATTEMPTS, purge_failed, queue_code_email, queue_email,
+                   queue_verification_email, send_queued)
+from .models import LoginCodeSequence, OutgoingEmail, PasswordChangeConfirmation, User
+
+
+def _request_password_change(test):
+    # Новый пароль сохраняется в сессии, код подтверждения — в базе
+    test.client.post('/api/users/user/change_password/', {
+        'old_password': PASSWORD, 'new_password': 'changed', 'confirm_new_password': 'changed'}, format='json')
+    return PasswordChangeConfirmation.objects.get(user=test.author).code
+
+
+class UserQueryBudgetTests(QueryBudgetMixin, APITestCase):
+    router = urls.router
+    budgets = {
+        ('user-list', 'get'): Budget(4),
+        ('user-list', 'post'): Budget(9, anonymous=True, data={
+            'email': 'new@bench.local', 'username': 'new-user', 'password': PASSWORD}),
+        ('user-change-password', 'post'): Budget(12, data={
+            'old_password': PASSWORD, 'new_password': 'changed', 'confirm_new_password': 'changed'}),
+        ('user-change-username-or-email', 'patch'): Budget(6, data={'username': 'renamed-user'}),
+        ('user-confirm-password-change', 'post'): Budget(14, prepare=_request_password_change,
+                                                          data=lambda t: {'code': t.prepared}),
+        ('user-email-confirmed', 'post'): Budget(5, anonymous=True, params=lambda t: {
+            'uidb64': urlsafe_base64_encode(force_bytes(t.author.pk)),
+            'token': default_token_generator.make_token(t.author)}),
+        ('user-login-user', 'post'): Budget(4, anonymous=True, data=lambda t: {
+            'username': t.author.username, 'password': PASSWORD}),
+        ('user-login-user-with-code', 'post'): Budget(4, anonymous=True, data=lambda t: {'code': t.author.code}),
+        ('user-refresh-token', 'post'): Budget(4, anonymous=True, data=lambda t: {
+            'token': str(UserRefreshToken.for_user(t.author))}),
+        ('user-resend-code', 'post'): Budget(7),
+        ('user-detail', 'get'): Budget(4, kwargs=lambda t: {'pk': t.ids['user_id']}),
+        ('user-detail', 'patch'): Budget(0, kwargs=lambda t: {'pk': t.ids['user_id']}, status=405),
+        ('user-detail', 'delete'): Budget(14, kwargs=lambda t: {'pk': t.ids['user_id']}),
+    }
+
+
+class LoginCodeTests(TestCase):
+
+    def test_permutation_has_no_collisions(self):
+        key = bytes(32)
+        codes = {permute(index, key) for index in range(0, CODE_SPACE, 31)}
+        self.assertEqual(len(codes), len(range(0, CODE_SPACE, 31)))
+        self.assertTrue(all(0 <= code < CODE_SPACE for code in codes))
+
+    def test_codes_are_unique(self):
+        codes = allocate_codes(500) + [User.objects.create_user(username=f'user-{i}', email=f'user-{i}@test.local').code for i in range(5)]
+        self.assertEqual(len(set(codes)), len(codes))
+        self.assertTrue(all(CODE_MIN <= code < CODE_MIN + CODE_SPACE for code in codes))
+
+    def test_skips_codes_issued_before_sequence(self):
+        key = bytes(32)
+        legacy = CODE_MIN + permute(0, key)
+        User.objects.create(username='legacy', email='legacy@test.local', code=legacy)
+        LoginCodeSequence.objects.create(id=SEQUENCE_ID, key=key.hex(), check_taken=True)
+
+        self.assertEqual(allocate_codes(1), [CODE_MIN + permute(1, key)])
+
+    def test_sequence_created_by_concurrent_request(self):
+        # Первый UPDATE не нашел счетчика, а параллельная регистрация успела его создать
+        key = bytes(32)
+        LoginCodeSequence.objects.create(id=SEQUENCE_ID, key=key.hex())
+        missed = [None]
+
+        def reserve(count, using):
+            return missed.pop() if missed else _reserve(count, using)
+
+        with mock.patch('core.codes._reserve', side_effect=reserve):
+            self.assertEqual(allocate_codes(1), [CODE_MIN + permute(0, key)])
+
+    def test_exhausted(self):
+        allocate_codes(1)
+        LoginCodeSequence.objects.update(next_index=CODE_SPACE - 1)
+
+        with self.assertRaises(LoginCodesExhausted):
+            allocate_codes(2)
+        self.assertEqual(len(allocate_codes(1)), 1)
+        with self.assertRaises(LoginCodesExhausted):
+            allocate_codes(1)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                       'LOCATION': 'throttling'}})
+class LoginThrottleTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_rejected_before_database(self):
+        # Разные коды, чтобы сработал лимит на IP, а не кэш отсутствующих кодов
+        for code in range(CODE_MIN, CODE_MIN + 20):
+            self.client.post('/api/users/user/login_user_with_code/', {'code': code}, format='json')
+
+        with self.assertNumQueries(0):
+            response = self.client.post('/api/users/user/login_user_with_code/', {'code': CODE_MIN + 20},
+                                        format='json')
+        self.assertEqual(response.status_code, 429)
+
+    def test_missing_code_is_cached(self):
+        with self.assertNumQueries(1):
+            for _ in range(3):
+                self.client.post('/api/users/user/login_user_with_code/', {'code': CODE_MIN}, format='json')
+
+        # Выданный код сразу доступен для входа
+        User.objects.create_user(username='user', email='user@test.local', code=CODE_MIN)
+        response = self.client.post('/api/users/user/login_user_with_code/', {'code': CODE_MIN}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                       'LOCATION': 'refresh'}})
+class RefreshTokenTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='user', email='user@test.local', password=PASSWORD)
+        cls.organization = Organization.objects.create(name='organization')
+
+    def setUp(self):
+        cache.clear()
+        self.token = str(UserRefreshToken.for_user(self.user))
+
+    def refresh(self, **data):
+        response = self.client.post('/api/users/user/refresh_token/', {'token': self.token, **data}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_tokens_only_without_queries(self):
+        with self.assertNumQueries(0):
+            data = self.refresh(include_user=False)
+        self.assertEqual(set(data), {'access', 'refresh'})
+
+    def test_cached_profile_without_queries(self):
+        self.refresh()
+        with self.assertNumQueries(0):
+            data = self.refresh()
+        self.assertEqual(data['user']['username'], 'user')
+
+    def test_profile_follows_membership(self):
+        self.refresh()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.organizations.add(self.organization)
+
+        data = self.refresh()
+        self.assertEqual([organization['name'] for organization in data['user']['organizations']], ['organization'])
+
+    def test_deactivated_user_cannot_refresh(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+
+        response = self.client.post('/api/users/user/refresh_token/', {'token': self.token}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_refresh_limit_is_per_user(self):
+        other = User.objects.create_user(username='other', email='other@test.local', password=PASSWORD)
+        for _ in range(30):
+            self.refresh(include_user=False)
+
+        response = self.client.post('/api/users/user/refresh_token/', {'token': self.token}, format='json')
+        self.assertEqual(response.status_code, 429)
+        # Тот же IP, другой пользователь
+        self.token = str(UserRefreshToken.for_user(other))
+        self.refresh(include_user=False)
+
+    def test_membership_change_outdates_access_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.refresh(include_user=False)["access"]}')
+        self.assertEqual(self.client.get('/api/organization/organization/').status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.organization.users.add(self.user)
+        self.assertEqual(self.client.get('/api/organization/organization/').status_code, 401)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.refresh(include_user=False)["access"]}')
+        response = self.client.get('/api/organization/organization/')
+        self.assertEqual([organization['name'] for organization in response.data['results']], ['organization'])
+
+    def test_refresh_checks_database_without_version(self):
+        # Деактивация в обход сигналов: токены не отозваны, версия вытеснена из кэша
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        cache.clear()
+
+        response = self.client.post('/api/users/user/refresh_token/', {'token': self.token}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_access_token_checks_database_without_version(self):
+        # Версия вытеснена из кэша или записана в кэш другого процесса
+        access = self.refresh(include_user=False)['access']
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.assertTrue(is_current(AccessToken(access)))
+        with self.assertNumQueries(0):
+            self.assertTrue(is_current(AccessToken(access)))
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        cache.clear()
+        self.assertEqual(self.client.get('/api/organization/organization/').status_code, 200)
+
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        cache.clear()
+        self.assertEqual(self.client.get('/api/organization/organization/').status_code, 401)
+
+class CountingBackend(locmem.EmailBackend):
+    opened = 0
+
+    def open(self):
+        CountingBackend.opened += 1
+        return super().open()
+
+    def send_messages(self, messages):
+        if any(recipient.startswith('broken') for message in messages for recipient in message.to):
+            raise SMTPRecipientsRefused({})
+        return super().send_messages(messages)
+
+
+class UnavailableBackend(locmem.EmailBackend):
+    def open(self):
+        raise ConnectionRefusedError
+
+
+@override_settings(EMAIL_BACKEND='core.tests.CountingBackend')
+class MailQueueTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='user', email='user@test.local')
+        cls.confirmation = PasswordChangeConfirmation.objects.create(user=cls.user, code='111111')
+
+    def setUp(self):
+        CountingBackend.opened = 0
+
+    def test_batch_uses_one_connection(self):
+        for _ in range(3):
+            queue_code_email(self.user)
+        queue_verification_email(self.user)
+
+        self.assertEqual(send_queued(), 4)
+        self.assertEqual(CountingBackend.opened, 1)
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertIn('111111', mail.outbox[1].body)
+        self.assertFalse(OutgoingEmail.objects.exists())
+
+    def test_secrets_are_built_when_sent(self):
+        queue_code_email(self.user)
+        queue_verification_email(self.user)
+        self.assertNotIn('111111', str(list(OutgoingEmail.objects.values_list('context', flat=True))))
+        self.assertNotIn('token', str(list(OutgoingEmail.objects.values_list('context', flat=True))))
+
+        PasswordChangeConfirmation.objects.filter(pk=self.confirmation.pk).update(code='222222')
+        send_queued()
+        self.assertIn('222222', mail.outbox[0].body)
+        uid = urlsafe_base64_encode(force_bytes(self.user.pk))
+        token = mail.outbox[1].body.split(f'/confirm-email/{uid}/')[1].split('/')[0]
+        self.assertTrue(default_token_generator.check_token(self.user, token))
+
+    def test_code_email_is_dropped_after_confirmation(self):
+        queue_code_email(self.user)
+        PasswordChangeConfirmation.objects.filter(pk=self.confirmation.pk).delete()
+
+        send_queued()
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertFalse(OutgoingEmail.objects.exists())
+
+    def test_failed_message_is_retried_with_backoff(self):
+        queue_code_email(self.user)
+        broken = queue_email('email_code', 'broken@test.local', {'code': '222222'})
+
+        send_queued()
+        broken.refresh_from_db()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(broken.attempts, 1)
+        self.assertGreater(broken.send_after, timezone.now())
+
+        for _ in range(MAIL_MAX_ATTEMPTS - 1):
+            OutgoingEmail.objects.update(send_after=timezone.now())
+            send_queued()
+        broken.refresh_from_db()
+        self.assertTrue(broken.failed)
+
+    @override_settings(EMAIL_BACKEND='core.tests.UnavailableBackend')
+    def test_unavailable_server_defers_batch(self):
+        queue_code_email(self.user)
+
+        self.assertEqual(send_queued(), 1)
+        self.assertEqual(OutgoingEmail.objects.get().attempts, 1)
+        self.assertEqual(send_queued(), 0)
+
+    def test_old_failed_messages_are_purged(self):
+        old = queue_email('email_code', 'broken@test.local', {})
+        recent = queue_email('email_code', 'broken@test.local', {})
+        OutgoingEmail.objects.update(failed=True)
+        OutgoingEmail.objects.filter(pk=old.pk).update(created_at=timezone.now() - MAIL_FAILED_RETENTION)
+
+        self.assertEqual(purge_failed(), 1)
+        self.assertEqual(list(OutgoingEmail.objects.values_list('pk', flat=True)), [recent.pk])
+
+
+class MetricsAccessTests(TestCase):
+
+    @override_settings(METRICS_TOKEN=None, METRICS_ALLOWED_IPS=['10.0.0.0/8'])
+    def test_allowed_networks(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.1.2.3').status_code, 200)
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='192.168.0.1').status_code, 403)
+
+    @override_settings(METRICS_TOKEN='secret', METRICS_ALLOWED_IPS=[])
+    def test_token(self):
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
 
-# Create your tests here.
@@ -0,0 +1,102 @@
+import hashlib
+
+from django.core.cache import cache as default_cache
+from rest_framework.throttling import SimpleRateThrottle
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    """
+    Скользящее окно по двум счетчикам в кэше (Redis): число запросов в текущем окне
+    плюс доля предыдущего окна, которая еще попадает в последние duration секунд.
+    Проверка — одно чтение двух ключей, учет запроса — атомарный INCR, запросы
+    к базе не выполняются. Ключ запроса задает get_cache_key подкласса.
+    """
+    cache = default_cache
+    cache_format = 'throttle:%(scope)s:%(ident)s'
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        now = self.timer()
+        window, elapsed = divmod(now, self.duration)
+        current_key = f'{self.key}:{int(window)}'
+        previous_key = f'{self.key}:{int(window) - 1}'
+
+        counts = self.cache.get_many([current_key, previous_key])
+        previous = counts.get(previous_key, 0) * (1 - elapsed / self.duration)
+        current = counts.get(current_key, 0)
+        if previous + current >= self.num_requests:
+            if current >= self.num_requests:
+                self.wait_seconds = self.duration - elapsed
+            else:
+                # Через столько секунд вклад предыдущего окна уменьшится достаточно
+                share = (self.num_requests - current) / counts[previous_key]
+                self.wait_seconds = max(0.0, self.duration * (1 - share) - elapsed)
+            return False
+
+        self._hit(current_key)
+        return True
+
+    def _hit(self, key):
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            # Окно должно прожить и следующий период, когда оно станет предыдущим
+            if not self.cache.add(key, 1, timeout=2 * self.duration):
+                self.cache.incr(key)
+
+    def wait(self):
+        return getattr(self, 'wait_seconds', None)
+
+
+class IPThrottle(SlidingWindowThrottle):
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class FieldThrottle(SlidingWindowThrottle):
+    # Ограничение по значению поля запроса, общее для всех IP
+    field = None
+
+    def get_cache_key(self, request, view):
+        value = request.data.get(self.field) if hasattr(request.data, 'get') else None
+        if value in (None, ''):
+            return None
+        ident = hashlib.md5(str(value).strip().lower().encode()).hexdigest()
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+
+class LoginRateThrottle(IPThrottle):
+    scope = 'login'
+
+
+class LoginUsernameRateThrottle(FieldThrottle):
+    scope = 'login_username'
+    field = 'username'
+
+
+class LoginCodeRateThrottle(FieldThrottle):
+    scope = 'login_code'
+    field = 'code'
+
+
+class RefreshTokenRateThrottle(SlidingWindowThrottle):
+    # Лимит на пользователя из refresh-токена: терминалы за одним NAT его не делят.
+    # Недействительные токены ограничиваются по IP
+    scope = 'refresh_token'
+
+    def get_cache_key(self, request, view):
+        token = request.data.get('token') if hasattr(request.data, 'get') else None
+        try:
+            ident = f'user:{RefreshToken(str(token))[api_settings.USER_ID_CLAIM]}' if token else None
+        except (TokenError, KeyError):
+            ident = None
+        return self.cache_format % {'scope': self.scope, 'ident': ident or self.get_ident(request)}
@@ -1,11 +1,21 @@
-from .models import User
+from django.core.cache import cache
 from django.contrib.auth.backends import BaseBackend
 
+from .codes import MISSING_CODE_KEY, MISSING_CODE_TIMEOUT
+from .models import User
+
+
 class CodeAuthenticationBackend(BaseBackend):
     def authenticate(self, request, code=None):
+        if code is None:
+            return None
+
+        key = MISSING_CODE_KEY.format(code)
+        if cache.get(key):
+            return None
+
         try:
-            user = User.objects.get(code=code)
-            if user is not None:
-                return user
+            return User.objects.get(code=code)
         except User.DoesNotExist:
+            cache.set(key, True, timeout=MISSING_CODE_TIMEOUT)
             return None
@@ -6,17 +6,22 @@ from rest_framework import status
 from drf_spectacular.utils import extend_schema, OpenApiParameter, extend_schema_view
 from django.contrib.auth.tokens import default_token_generator
 from django.contrib.auth import update_session_auth_hash
-from django.contrib.sites.shortcuts import get_current_site
 from django.utils.http import urlsafe_base64_decode
 from django_filters.rest_framework import DjangoFilterBackend
 
+from backend.search import TrigramSearchFilter
+from backend.sparse import SPARSE_FIELDS_PARAMETERS
+from backend.viewsets import OptimizedQuerysetMixin
+
 from .api_descriptions import user
 from .models import User, PasswordChangeConfirmation
 from .serializers import (GetUserSerializer, RegistrationUserRequestSerializer,
                           LoginSerializer, LoginWithCodeSerializer,
                           ChangeUsernameOrEmail, RefreshTokenSerializer,
                           ChangePasswordSerializer, ConfirmPasswordChangeSerializer,)
-from .tasks import send_email_active_account, send_email_code
+from .mail import queue_code_email, queue_verification_email
+from .throttling import (LoginRateThrottle, LoginCodeRateThrottle, LoginUsernameRateThrottle,
+                         RefreshTokenRateThrottle)
 from .filters import UserFilter
 
 
@@ -28,12 +33,13 @@ from .filters import UserFilter
         tags=['Users'],
         parameters=[
             OpenApiParameter(**param) for param in user["get_user_list"]["parameters"]
-        ]
+        ] + SPARSE_FIELDS_PARAMETERS
     ),
     retrieve=extend_schema(
         summary=user["get_user"]["summary"],
         description=user["get_user"]["description"],
         tags=['Users'],
+        parameters=SPARSE_FIELDS_PARAMETERS,
     ),
     create=extend_schema(
         summary=user["create_user"]["summary"],
@@ -100,19 +106,20 @@ from .filters import UserFilter
         tags=['Users']
     )
 )
-class UserViewSet(ModelViewSet):
+class UserViewSet(OptimizedQuerysetMixin, ModelViewSet):
     queryset = User.objects.all()
     serializer_class = GetUserSerializer
     http_method_names = ['get', 'post', 'patch', 'delete']
-    filter_backends = [DjangoFilterBackend]
+    filter_backends = [DjangoFilterBackend, TrigramSearchFilter]
     filterset_class = UserFilter
+    search_fields = ['username', 'email']
 
     def create(self, request, *args, **kwargs):
         serializer = RegistrationUserRequestSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.save()
 
-            send_email_active_account.delay(user.id)
+            queue_verification_email(user)
 
             response = GetUserSerializer(user)
 
@@ -123,7 +130,8 @@ class UserViewSet(ModelViewSet):
     def partial_update(self, request, *args, **kwargs):
         return Response({"detail": "PATCH не разрешен."}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
-    @action(detail=False, methods=['post'])
+    @action(detail=False, methods=['post'], authentication_classes=[],
+            throttle_classes=[LoginRateThrottle, LoginUsernameRateThrottle])
     def login_user(self, request):
         serializer = LoginSerializer(data=request.data)
         if serializer.is_valid():
@@ -132,7 +140,8 @@ class UserViewSet(ModelViewSet):
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-    @action(detail=False, methods=['post'])
+    @action(detail=False, methods=['post'], authentication_classes=[],
+            throttle_classes=[LoginRateThrottle, LoginCodeRateThrottle])
     def login_user_with_code(self, request):
         serializer = LoginWithCodeSerializer(data=request.data)
         if serializer.is_valid():
@@ -141,7 +150,8 @@ class UserViewSet(ModelViewSet):
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-    @action(detail=False, methods=['post'])
+    @action(detail=False, methods=['post'], authentication_classes=[],
+            throttle_classes=[RefreshTokenRateThrottle])
     def refresh_token(self, request):
         serializer = RefreshTokenSerializer(data=request.data)
         if serializer.is_valid():
@@ -172,7 +182,7 @@ class UserViewSet(ModelViewSet):
         user = request.user
         confirmation, _ = PasswordChangeConfirmation.objects.get_or_create(user=user)
         confirmation.generate_confirmation_code()
-        send_email_code.delay(user.id, confirmation.code)
+        queue_code_email(user)
 
         return Response({'message': 'Код подтверждения отправлен на email'}, status=status.HTTP_200_OK)
 
@@ -205,9 +215,7 @@ class UserViewSet(ModelViewSet):
                 serializer.save()
                 serializer = GetUserSerializer(user)
 
-                current_site = get_current_site(request)
-                domain = current_site.domain
-                send_email_active_account.delay(user.id, domain)
+                queue_verification_email(user)
 
                 return Response({'message': 'Username and email changed', **serializer.data}, status=status.HTTP_200_OK)
             elif serializer.validated_data.get('username'):
@@ -219,9 +227,7 @@ class UserViewSet(ModelViewSet):
                 serializer.save()
                 serializer = GetUserSerializer(user)
 
-                current_site = get_current_site(request)
-                domain = current_site.domain
-                send_email_active_account.delay(user.id, domain)
+                queue_verification_email(user)
 
                 return Response({'message': 'Email changed', **serializer.data}, status=status.HTTP_200_OK)
 
@@ -236,7 +242,7 @@ class UserViewSet(ModelViewSet):
 
             confirmation, _ = PasswordChangeConfirmation.objects.get_or_create(user=user)
             confirmation.generate_confirmation_code()
-            send_email_code.delay(user.id, confirmation.code)
+            queue_code_email(user)
 
             request.session['new_password'] = new_password
 
@@ -0,0 +1,64 @@
+"""
+Конфигурация gunicorn: gunicorn -c gunicorn.conf.py
+
+По умолчанию приложение обслуживается через WSGI (backend.wsgi) воркерами gthread:
+синхронные представления DRF и потоковые ответы (экспорт меню) отдаются без
+буферизации. SSE-поток остатков /products/menu/<id>/events/ работает только под ASGI,
+его отдает отдельный процесс с GUNICORN_WORKER_CLASS=uvicorn_worker.UvicornWorker
+(backend.asgi, сервис events в docker-compose). Под ASGI Django читает синхронный
+StreamingHttpResponse в память целиком, поэтому остальное API туда не направляется.
+
+Число процессов по умолчанию 2 * ядра + 1. Каждый процесс держит свои соединения
+с базой (см. DB_POOL_MODE), поэтому workers * DB_POOL_MAX_SIZE должно оставаться
+меньше max_connections Postgres.
+"""
+import os
+import shutil
+
+
+def _cpu_count():
+    # Учитывает ограничение ядер контейнера через cpuset
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+wsgi_app = 'backend.wsgi:application' if worker_class in ('sync', 'gthread') else 'backend.asgi:application'
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 2 * _cpu_count() + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4 if worker_class == 'gthread' else 1))
+
+# Для uvicorn-воркеров timeout — это heartbeat процесса, а не длительность запроса,
+# поэтому долгие SSE-соединения им не обрываются
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+
+# Перезапуск воркеров ограничивает рост памяти при утечках
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = max_requests // 10
+
+# Вне production код перезагружается при изменениях, как у runserver
+reload = os.environ.get('DJANGO_ENV', 'development') != 'production'
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+# С PROMETHEUS_MULTIPROC_DIR воркеры пишут метрики в файлы, и /metrics отдает сумму
+# по всем процессам. Каталог очищается при старте, чтобы не учитывать прошлые запуски.
+def on_starting(server):
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Category, Kitchen, Ingredient
+from .models import Category, Kitchen, Ingredient, StockMovement
 
 
 class CategoryAdmin(admin.ModelAdmin):
@@ -24,11 +24,23 @@ class KitchenAdmin(admin.ModelAdmin):
 
 
 class IngredientAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name', 'count', 'unit', 'chain')
-    list_filter = ('chain',)
+    list_display = ('id', 'name', 'count', 'restaurant')
+    list_filter = ('restaurant',)
     search_fields = ('name',)
 
 
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ('id', 'ingredient', 'kind', 'quantity', 'rolled_up', 'created_at')
+    list_filter = ('kind', 'rolled_up')
+    search_fields = ('ingredient__name',)
+    readonly_fields = ('rolled_up', 'created_at')
+
+    def has_change_permission(self, request, obj=None):
+        # Журнал только дополняется, существующие записи не редактируются
+        return obj is None
+
+
 admin.site.register(Category, CategoryAdmin)
 admin.site.register(Kitchen, KitchenAdmin)
 admin.site.register(Ingredient, IngredientAdmin)
+admin.site.register(StockMovement, StockMovementAdmin)
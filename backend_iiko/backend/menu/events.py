@@ -0,0 +1,77 @@
+import json
+from collections import defaultdict
+
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+from django.db import transaction
+
+from .models import Product
+
+
+CHANNEL = 'iiko:menu:stock:{}'
+KEEPALIVE_SECONDS = 15
+
+_publisher = None
+
+
+def _get_publisher():
+    global _publisher
+    if _publisher is None:
+        _publisher = redis.Redis.from_url(settings.REDIS_URL)
+    return _publisher
+
+
+def _stock_by_restaurant(product_ids) -> dict:
+    rows = (Product.restaurant.through.objects
+            .filter(product_id__in=product_ids)
+            .values_list('restaurant_id', 'product_id', 'product__count', 'product__stop'))
+
+    restaurants = defaultdict(list)
+    for restaurant_id, product_id, count, stop in rows:
+        restaurants[restaurant_id].append({'id': product_id, 'count': count, 'stop': stop})
+    return restaurants
+
+
+def _publish(product_ids):
+    publisher = _get_publisher()
+    for restaurant_id, products in _stock_by_restaurant(product_ids).items():
+        publisher.publish(CHANNEL.format(restaurant_id), json.dumps({'products': products}))
+
+
+def publish_stock(product_ids):
+    """
+    После коммита рассылает остатки и стоп-флаги продуктов подписчикам их ресторанов
+    через Redis pub/sub, одним запросом на все продукты.
+    Без REDIS_URL рассылка отключена.
+    """
+    if not settings.REDIS_URL:
+        return
+
+    product_ids = list(product_ids)
+    transaction.on_commit(lambda: _publish(product_ids), robust=True)
+
+
+async def stock_events(restaurant_id):
+    """
+    Асинхронный поток Server-Sent Events с изменениями остатков ресторана.
+    Пока изменений нет, раз в KEEPALIVE_SECONDS отправляется комментарий,
+    чтобы прокси не закрывали соединение.
+    """
+    client = aioredis.Redis.from_url(settings.REDIS_URL)
+    pubsub = client.pubsub()
+    channel = CHANNEL.format(restaurant_id)
+    await pubsub.subscribe(channel)
+
+    try:
+        yield 'retry: 3000\n\n'
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=KEEPALIVE_SECONDS)
+            if message is None:
+                yield ': keepalive\n\n'
+            else:
+                yield f'event: stock\ndata: {message["data"].decode()}\n\n'
+    finally:
+        await pubsub.unsubscribe(channel)
+        await pubsub.aclose()
+        await client.aclose()
@@ -1,6 +1,6 @@
 import django_filters
 
-from .models import Category, Kitchen
+from .models import Category, Kitchen, Product
 
 
 class CategoryFilter(django_filters.FilterSet):
@@ -19,3 +19,15 @@ class KitchenFilter(django_filters.FilterSet):
     class Meta:
         model = Kitchen
         fields = ['name', 'restaurant']
+
+
+class ProductFilter(django_filters.FilterSet):
+    name = django_filters.CharFilter(field_name='name', lookup_expr='icontains')
+    category = django_filters.NumberFilter(field_name='category_id')
+    kitchen = django_filters.NumberFilter(field_name='kitchen_id')
+    restaurant = django_filters.NumberFilter(field_name='restaurant')
+    stop = django_filters.BooleanFilter(field_name='stop')
+
+    class Meta:
+        model = Product
+        fields = ['name', 'category', 'kitchen', 'restaurant', 'stop']
@@ -0,0 +1,64 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
+from django.utils.timezone import now
+
+from .models import Ingredient, StockMovement
+
+
+ROLLUP_BATCH_SIZE = 10000
+# Свежие движения не сворачиваются, чтобы не спорить за строки с активными транзакциями
+ROLLUP_LAG = timedelta(seconds=30)
+
+
+def record_movements(kind, quantities: dict):
+    """
+    Добавляет движения {ingredient_id: quantity} одним bulk INSERT.
+    Для расхода и списаний quantity передается положительным, знак ставится здесь,
+    поступления и инвентаризация передаются как есть.
+    """
+    sign = -1 if kind in (StockMovement.Kind.CONSUMPTION, StockMovement.Kind.WRITE_OFF) else 1
+    StockMovement.objects.bulk_create([
+        StockMovement(ingredient_id=ingredient_id, kind=kind, quantity=sign * quantity)
+        for ingredient_id, quantity in quantities.items()
+    ])
+
+
+def current_stock(ingredient_ids) -> dict:
+    # Снимок плюс дельта несвернутых движений, один запрос
+    return dict(Ingredient.objects
+                .filter(pk__in=ingredient_ids)
+                .with_current_count()
+                .values_list('pk', 'current_count'))
+
+
+@transaction.atomic
+def rollup_movements(batch_size=ROLLUP_BATCH_SIZE) -> int:
+    """
+    Сворачивает пачку несвернутых движений в Ingredient.count.
+    Движения блокируются с SKIP LOCKED, поэтому параллельные запуски не пересекаются,
+    а суммирование и пометка rolled_up происходят в одной транзакции.
+    Возвращает количество свернутых движений.
+    """
+    movements = list(StockMovement.objects
+                     .select_for_update(skip_locked=True)
+                     .filter(rolled_up=False, created_at__lt=now() - ROLLUP_LAG)
+                     .order_by('id')
+                     .values_list('id', 'ingredient_id', 'quantity')[:batch_size])
+
+    if not movements:
+        return 0
+
+    deltas = defaultdict(int)
+    for _, ingredient_id, quantity in movements:
+        deltas[ingredient_id] += quantity
+
+    Ingredient.objects.filter(pk__in=deltas.keys()).update(count=F('count') + Case(
+        *[When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()],
+        output_field=models.IntegerField(),
+    ))
+    StockMovement.objects.filter(pk__in=[movement[0] for movement in movements]).update(rolled_up=True)
+
+    return len(movements)
@@ -0,0 +1,29 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from organization.models import Restaurant
+
+from menu.transfer import FORMATS, export_rows, render_rows
+
+
+class Command(BaseCommand):
+    help = 'Потоковая выгрузка меню ресторана в CSV или JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restaurant', type=int, required=True, help='Id ресторана')
+        parser.add_argument('--format', choices=FORMATS, default='jsonl')
+        parser.add_argument('--output', default='-', help='Путь к файлу, по умолчанию stdout')
+
+    def handle(self, *args, **options):
+        restaurant_id = options['restaurant']
+        if not Restaurant.objects.filter(id=restaurant_id).exists():
+            raise CommandError(f'Restaurant {restaurant_id} not found')
+
+        lines = render_rows(export_rows(restaurant_id), options['format'])
+
+        if options['output'] == '-':
+            sys.stdout.writelines(lines)
+        else:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as file:
+                file.writelines(lines)
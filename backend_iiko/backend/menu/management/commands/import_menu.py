@@ -0,0 +1,43 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from organization.models import Restaurant
+
+from menu.transfer import FORMATS, IMPORT_CHUNK_SIZE, format_of, import_menu
+
+
+class Command(BaseCommand):
+    help = 'Потоковый импорт меню ресторана из CSV или JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу, "-" для stdin')
+        parser.add_argument('--restaurant', type=int, required=True, help='Id ресторана')
+        parser.add_argument('--format', choices=FORMATS, help='По умолчанию определяется по расширению файла')
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        restaurant_id = options['restaurant']
+        if not Restaurant.objects.filter(id=restaurant_id).exists():
+            raise CommandError(f'Restaurant {restaurant_id} not found')
+
+        path = options['path']
+        fmt = options['format'] or format_of(path)
+
+        if path == '-':
+            report = import_menu(sys.stdin.buffer, fmt, restaurant_id, options['chunk_size'])
+        else:
+            with open(path, 'rb') as file:
+                report = import_menu(file, fmt, restaurant_id, options['chunk_size'])
+
+        for kind, count in report['imported'].items():
+            self.stdout.write(f'{kind}: {count}')
+
+        for error in report['errors']:
+            self.stderr.write(f'line {error["line"]}: {json.dumps(error["errors"], ensure_ascii=False)}')
+
+        if report['errors']:
+            self.stdout.write(self.style.WARNING(f'Skipped {len(report["errors"])} rows'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Menu imported'))
@@ -0,0 +1,20 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+from backend.search import trigram_indexes
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0007_remove_recipe_ingredient_recipe_ingredient'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        trigram_indexes(
+            ('menu_category', 'name'),
+            ('menu_kitchen', 'name'),
+            ('menu_product', 'name'),
+        ),
+    ]
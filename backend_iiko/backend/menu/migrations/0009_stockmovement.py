@@ -0,0 +1,28 @@
+# Generated by Django 5.1.6 on 2026-10-18 06:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0008_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('receipt', 'Поступление'), ('consumption', 'Расход по рецепту'), ('write_off', 'Списание')], max_length=20)),
+                ('quantity', models.IntegerField()),
+                ('rolled_up', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='menu.ingredient')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('rolled_up', False)), fields=['ingredient'], name='menu_movement_pending_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 07:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0009_stockmovement'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='kind',
+            field=models.CharField(choices=[('receipt', 'Поступление'), ('consumption', 'Расход по рецепту'), ('write_off', 'Списание'), ('inventory', 'Инвентаризация')], max_length=20),
+        ),
+    ]
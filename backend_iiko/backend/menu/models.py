@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Case, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
 
 
 class Category(models.Model):
@@ -17,15 +19,46 @@ class Kitchen(models.Model):
         return self.name
 
 
+class IngredientQuerySet(models.QuerySet):
+    def with_current_count(self):
+        # Текущий остаток: снимок count плюс еще не свернутые движения из журнала
+        pending = Sum('movements__quantity', filter=Q(movements__rolled_up=False))
+        return self.annotate(current_count=F('count') + Coalesce(pending, 0))
+
+
 class Ingredient(models.Model):
     name = models.CharField(max_length=255, unique=True)
     count = models.IntegerField(default=0)
     restaurant = models.ForeignKey('organization.Restaurant', on_delete=models.CASCADE, related_name='ingredients')
 
+    objects = IngredientQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
 
+class ProductQuerySet(models.QuerySet):
+    def decrement_stock(self, quantity=1):
+        """
+        Списывает quantity единиц одним условным UPDATE без загрузки строк.
+        Продукты в стоп-листе и с остатком меньше quantity не затрагиваются,
+        stop выставляется в том же запросе, если остаток заканчивается.
+        Продукты с count=None считаются неограниченными.
+        quantity может быть числом или выражением (например, Case по id).
+        Возвращает количество обновленных строк.
+        """
+        if isinstance(quantity, int) and quantity < 1:
+            raise ValueError('Quantity must be positive')
+
+        return self.filter(
+            Q(count__isnull=True) | Q(count__gte=quantity),
+            stop=False,
+        ).update(
+            count=F('count') - quantity,
+            stop=Case(When(count__lte=quantity, then=Value(True)), default=F('stop')),
+        )
+
+
 class Product(models.Model):
     name = models.CharField(max_length=255, unique=True)
     description = models.TextField()
@@ -37,13 +70,20 @@ class Product(models.Model):
     kitchen = models.ForeignKey(Kitchen, on_delete=models.CASCADE)
     restaurant = models.ManyToManyField('organization.Restaurant', related_name='products')
 
-    def buy(self):
-        if not self.count is None:
-            self.count -= 1
-            self.save()
+    objects = ProductQuerySet.as_manager()
+
+    def buy(self, quantity=1):
+        from .events import publish_stock
+        from .versions import invalidate_products
+
+        bought = Product.objects.filter(pk=self.pk).decrement_stock(quantity) == 1
+        if bought:
+            invalidate_products([self.pk])
+            publish_stock([self.pk])
+        return bought
 
     def save(self, *args, **kwargs):
-        if self.count < 1:
+        if self.count is not None and self.count < 1:
             self.stop = True
         super().save(*args, **kwargs)
 
@@ -59,3 +99,32 @@ class Recipe(models.Model):
 
     def __str__(self):
         return f'{self.product} - {self.ingredient}'
+
+
+class StockMovement(models.Model):
+    """
+    Запись журнала движения ингредиента, только добавляется и не изменяется.
+    quantity со знаком: поступления положительные, расход и списания отрицательные,
+    инвентаризация — разница между фактическим и текущим остатком.
+    Периодическая задача сворачивает записи в Ingredient.count и помечает их rolled_up.
+    """
+
+    class Kind(models.TextChoices):
+        RECEIPT = 'receipt', 'Поступление'
+        CONSUMPTION = 'consumption', 'Расход по рецепту'
+        WRITE_OFF = 'write_off', 'Списание'
+        INVENTORY = 'inventory', 'Инвентаризация'
+
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE, related_name='movements')
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    quantity = models.IntegerField()
+    rolled_up = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ingredient'], condition=Q(rolled_up=False), name='menu_movement_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient} {self.quantity:+d} ({self.kind})'
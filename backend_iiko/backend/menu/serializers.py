@@ -1,12 +1,16 @@
 from rest_framework import serializers
 
-from .models import Category, Kitchen
+from .models import Category, Kitchen, Product
+from .services import change_restaurant_links, checkout, OutOfStock
 
 from organization.serializers import GetRestaurantSerializer
 from organization.models import Restaurant
+from organization.permissions import is_author_of_restaurants, is_member_or_author_of_restaurant
 
+from backend.sparse import SparseFieldsMixin
 
-class GetCategorySerializer(serializers.ModelSerializer):
+
+class GetCategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     restaurant = GetRestaurantSerializer(many=True, read_only=True)
 
     class Meta:
@@ -28,14 +32,8 @@ class PostPatchCategorySerializer(serializers.ModelSerializer):
         if not isinstance(restaurant_data, list):
             raise serializers.ValidationError({'restaurant': 'Expected a list of restaurant IDs'})
 
-        restaurants = Restaurant.objects.filter(id__in=[restaurant.id for restaurant in restaurant_data])
-
-        if len(restaurants) != len(restaurant_data):
-            raise serializers.ValidationError('One or more restaurants not found')
-
-        for restaurant in restaurants:
-            if user not in restaurant.chain.organization.authors.all():
-                raise serializers.ValidationError('You are not an author of this restaurant')
+        if not is_author_of_restaurants(user, [restaurant.id for restaurant in restaurant_data]):
+            raise serializers.ValidationError('You are not an author of this restaurant')
 
         return attrs
 
@@ -55,15 +53,16 @@ class AddRestaurantToCategorySerializer(serializers.Serializer):
         if restaurant is None:
             raise serializers.ValidationError('Restaurant not found')
 
-        if user not in restaurant.chain.organization.authors.all():
+        if not is_author_of_restaurants(user, [restaurant.id]):
             raise serializers.ValidationError('You are not an author of this restaurant')
 
-        if restaurant in category.restaurant.all():
+        restaurant_ids = set(category.restaurant.values_list('id', flat=True))
+
+        if restaurant.id in restaurant_ids:
             raise serializers.ValidationError('Restaurant already in category')
 
-        for restaurant_ in category.restaurant.all():
-            if user not in restaurant_.chain.organization.authors.all():
-                raise serializers.ValidationError('You are not an author of this restaurant')
+        if not is_author_of_restaurants(user, restaurant_ids):
+            raise serializers.ValidationError('You are not an author of this restaurant')
 
         return attrs
 
@@ -76,7 +75,58 @@ class AddRestaurantToCategorySerializer(serializers.Serializer):
         return category
 
 
-class GetKitchenSerializer(serializers.ModelSerializer):
+MAX_BULK_LINKS = 1000
+
+
+class BulkRestaurantLinksSerializer(serializers.Serializer):
+    """
+    Пачка привязок ресторанов: либо items — список пар, либо один объект и restaurant_ids.
+    В подклассах задаются model, поле id объекта и сериализатор пары.
+    """
+    model = None
+    item_field = None
+
+    restaurant_ids = serializers.ListField(child=serializers.IntegerField(), required=False,
+                                           allow_empty=False, max_length=MAX_BULK_LINKS)
+
+    def validate(self, attrs):
+        items = attrs.get('items')
+        item_id = attrs.get(self.item_field)
+        restaurant_ids = attrs.get('restaurant_ids')
+
+        if items is not None and (item_id is not None or restaurant_ids is not None):
+            raise serializers.ValidationError(f'Pass either items or {self.item_field} with restaurant_ids')
+
+        if items is None and (item_id is None or restaurant_ids is None):
+            raise serializers.ValidationError(f'Pass items or {self.item_field} with restaurant_ids')
+
+        return attrs
+
+    def create(self, validated_data):
+        if validated_data.get('items') is not None:
+            pairs = [(item[self.item_field], item['restaurant_id']) for item in validated_data.get('items')]
+        else:
+            item_id = validated_data.get(self.item_field)
+            pairs = [(item_id, restaurant_id) for restaurant_id in validated_data.get('restaurant_ids')]
+
+        user = self.context['request'].user
+        return change_restaurant_links(self.model, user, pairs, remove=self.context.get('remove', False))
+
+
+class CategoryRestaurantPairSerializer(serializers.Serializer):
+    category_id = serializers.IntegerField()
+    restaurant_id = serializers.IntegerField()
+
+
+class BulkRestaurantsToCategorySerializer(BulkRestaurantLinksSerializer):
+    model = Category
+    item_field = 'category_id'
+
+    category_id = serializers.IntegerField(required=False)
+    items = CategoryRestaurantPairSerializer(many=True, required=False, allow_empty=False, max_length=MAX_BULK_LINKS)
+
+
+class GetKitchenSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     restaurant = GetRestaurantSerializer(many=True, read_only=True)
 
     class Meta:
@@ -98,14 +148,8 @@ class PostPatchKitchenSerializer(serializers.ModelSerializer):
         if not isinstance(restaurant_data, list):
             raise serializers.ValidationError({'restaurant': 'Expected a list of restaurant IDs'})
 
-        restaurants = Restaurant.objects.filter(id__in=[restaurant.id for restaurant in restaurant_data])
-
-        if len(restaurants) != len(restaurant_data):
-            raise serializers.ValidationError('One or more restaurants not found')
-
-        for restaurant in restaurants:
-            if user not in restaurant.chain.organization.authors.all():
-                raise serializers.ValidationError('You are not an author of this restaurant')
+        if not is_author_of_restaurants(user, [restaurant.id for restaurant in restaurant_data]):
+            raise serializers.ValidationError('You are not an author of this restaurant')
 
         return attrs
 
@@ -125,15 +169,16 @@ class AddRestaurantToKitchenSerializer(serializers.Serializer):
         if restaurant is None:
             raise serializers.ValidationError('Restaurant not found')
 
-        if user not in restaurant.chain.organization.authors.all():
+        if not is_author_of_restaurants(user, [restaurant.id]):
             raise serializers.ValidationError('You are not an author of this restaurant')
 
-        if restaurant in kitchen.restaurant.all():
+        restaurant_ids = set(kitchen.restaurant.values_list('id', flat=True))
+
+        if restaurant.id in restaurant_ids:
             raise serializers.ValidationError('Restaurant already in category')
 
-        for restaurant_ in kitchen.restaurant.all():
-            if user not in restaurant_.chain.organization.authors.all():
-                raise serializers.ValidationError('You are not an author of this restaurant')
+        if not is_author_of_restaurants(user, restaurant_ids):
+            raise serializers.ValidationError('You are not an author of this restaurant')
 
         return attrs
 
@@ -144,3 +189,128 @@ class AddRestaurantToKitchenSerializer(serializers.Serializer):
         kitchen.restaurant.add(restaurant)
 
         return kitchen
+
+
+class KitchenRestaurantPairSerializer(serializers.Serializer):
+    kitchen_id = serializers.IntegerField()
+    restaurant_id = serializers.IntegerField()
+
+
+class BulkRestaurantsToKitchenSerializer(BulkRestaurantLinksSerializer):
+    model = Kitchen
+    item_field = 'kitchen_id'
+
+    kitchen_id = serializers.IntegerField(required=False)
+    items = KitchenRestaurantPairSerializer(many=True, required=False, allow_empty=False, max_length=MAX_BULK_LINKS)
+
+
+class GetProductCategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Category
+        fields = ['id', 'name']
+
+
+class GetProductKitchenSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Kitchen
+        fields = ['id', 'name']
+
+
+class GetProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    category = GetProductCategorySerializer(read_only=True)
+    kitchen = GetProductKitchenSerializer(read_only=True)
+
+    class Meta:
+        model = Product
+        fields = ['id', 'name', 'description', 'price', 'stop', 'count', 'category', 'kitchen', 'restaurant']
+        read_only_fields = fields
+
+
+class OrderItemSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class CheckoutSerializer(serializers.Serializer):
+    restaurant_id = serializers.IntegerField()
+    items = OrderItemSerializer(many=True, allow_empty=False)
+
+    def validate(self, attrs):
+        user = self.context['request'].user
+        restaurant_id = attrs.get('restaurant_id')
+        product_ids = {item['product_id'] for item in attrs.get('items')}
+
+        if not is_member_or_author_of_restaurant(user, restaurant_id):
+            raise serializers.ValidationError('Restaurant not found or you are not a member of this restaurant')
+
+        products = Product.objects.filter(id__in=product_ids, restaurant=restaurant_id).count()
+
+        if products != len(product_ids):
+            raise serializers.ValidationError('One or more products not found in this restaurant')
+
+        return attrs
+
+    def create(self, validated_data):
+        items = [(item['product_id'], item['quantity']) for item in validated_data.get('items')]
+
+        try:
+            result = checkout(items, validated_data.get('restaurant_id'))
+        except OutOfStock as e:
+            raise serializers.ValidationError({
+                'detail': 'Not enough stock',
+                'products': e.products,
+                'ingredients': e.ingredients,
+            })
+
+        return {
+            'restaurant_id': validated_data.get('restaurant_id'),
+            'products': [{'product_id': pk, 'quantity': quantity} for pk, quantity in result['products'].items()],
+            'ingredients': [{'ingredient_id': pk, 'quantity': quantity}
+                            for pk, quantity in result['ingredients'].items()],
+        }
+
+
+# Строки импорта меню, каждая проверяется сериализатором своего типа
+class ImportNamedRowSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=255)
+
+
+class ImportIngredientRowSerializer(ImportNamedRowSerializer):
+    count = serializers.IntegerField(default=0)
+
+
+class ImportProductRowSerializer(ImportNamedRowSerializer):
+    description = serializers.CharField(allow_blank=True, default='')
+    price = serializers.IntegerField(min_value=0, default=1)
+    count = serializers.IntegerField(min_value=0, allow_null=True, default=None)
+    stop = serializers.BooleanField(default=False)
+    category = serializers.CharField(max_length=255)
+    kitchen = serializers.CharField(max_length=255)
+
+
+class ImportRecipeRowSerializer(serializers.Serializer):
+    product = serializers.CharField(max_length=255)
+    ingredients = serializers.ListField(child=serializers.CharField(max_length=255), allow_empty=False)
+    quantity = serializers.IntegerField(min_value=0, default=1)
+    measure = serializers.CharField(max_length=255)
+
+
+class ImportMenuSerializer(serializers.Serializer):
+    restaurant_id = serializers.IntegerField()
+    file = serializers.FileField()
+    file_format = serializers.ChoiceField(choices=['csv', 'jsonl'], required=False)
+
+    def validate(self, attrs):
+        user = self.context['request'].user
+
+        if not is_author_of_restaurants(user, [attrs.get('restaurant_id')]):
+            raise serializers.ValidationError('Restaurant not found or you are not an author of this restaurant')
+
+        return attrs
+
+    def create(self, validated_data):
+        from .transfer import format_of, import_menu
+
+        file = validated_data.get('file')
+        fmt = validated_data.get('file_format') or format_of(file.name)
+        return import_menu(file, fmt, validated_data.get('restaurant_id'))
@@ -0,0 +1,186 @@
+from collections import defaultdict
+
+from django.db import models, transaction
+from django.db.models import Case, Q, Value, When
+
+from organization.hierarchy import get_hierarchy
+from organization.permissions import authored_restaurants
+
+from .events import publish_stock
+from .inventory import current_stock, record_movements
+from .models import Ingredient, Product, Recipe, StockMovement
+from .versions import bump_menu_versions, invalidate_products
+
+
+class OutOfStock(Exception):
+    def __init__(self, products=(), ingredients=()):
+        self.products = sorted(products)
+        self.ingredients = sorted(ingredients)
+        super().__init__('Not enough stock')
+
+
+def _quantity_case(quantities: dict):
+    return Case(
+        *[When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()],
+        output_field=models.IntegerField(),
+    )
+
+
+def expand_order(items: dict, restaurant_id) -> dict:
+    """
+    Раскладывает заказ {product_id: quantity} ресторана на ингредиенты по рецептам.
+    Продукт может быть привязан к нескольким ресторанам, поэтому учитываются только
+    ингредиенты restaurant_id. Возвращает {ingredient_id: quantity}, делает один запрос.
+    """
+    ingredients = defaultdict(int)
+    recipes = (Recipe.objects
+               .filter(product_id__in=items.keys(), ingredient__restaurant=restaurant_id)
+               .values_list('product_id', 'ingredient', 'quantity'))
+
+    for product_id, ingredient_id, quantity in recipes:
+        ingredients[ingredient_id] += quantity * items[product_id]
+
+    return dict(ingredients)
+
+
+def checkout(items, restaurant_id) -> dict:
+    """
+    Списывает весь заказ ресторана целиком: продукты и ингредиенты их рецептов.
+    items — пары (product_id, quantity), повторяющиеся продукты суммируются.
+    Остатки продуктов меняются одним UPDATE, расход ингредиентов дописывается
+    в журнал движений одним INSERT, все внутри одной транзакции.
+    Строки ингредиентов блокируются до проверки остатка, поэтому параллельные заказы
+    с общими ингредиентами проверяют и записывают расход по очереди.
+    Если чего-то не хватает, транзакция откатывается и поднимается OutOfStock.
+    """
+    products = defaultdict(int)
+    for product_id, quantity in items:
+        products[product_id] += quantity
+    products = dict(products)
+
+    ingredients = expand_order(products, restaurant_id)
+
+    try:
+        with transaction.atomic():
+            _lock_ingredients(ingredients)
+            if _missing_ingredients(ingredients):
+                raise OutOfStock()
+
+            updated = Product.objects.filter(pk__in=products.keys()).decrement_stock(_quantity_case(products))
+            if updated != len(products):
+                raise OutOfStock()
+
+            record_movements(StockMovement.Kind.CONSUMPTION, ingredients)
+    except OutOfStock:
+        # Транзакция уже откачена, поэтому остатки читаются в исходном состоянии
+        raise OutOfStock(products=_missing_products(products), ingredients=_missing_ingredients(ingredients))
+
+    invalidate_products(products.keys())
+    publish_stock(products.keys())
+
+    return {'products': products, 'ingredients': ingredients}
+
+
+def _missing_products(products: dict) -> list:
+    missing = []
+    for pk, stop, count in Product.objects.filter(pk__in=products.keys()).values_list('pk', 'stop', 'count'):
+        if stop or (count is not None and count < products[pk]):
+            missing.append(pk)
+    return missing
+
+
+def _lock_ingredients(ingredients: dict):
+    # Порядок по id, чтобы заказы с пересекающимися ингредиентами не блокировали друг друга намертво
+    if ingredients:
+        list(Ingredient.objects.select_for_update().filter(pk__in=ingredients.keys()).order_by('pk')
+             .values_list('pk', flat=True))
+
+
+def _missing_ingredients(ingredients: dict) -> list:
+    if not ingredients:
+        return []
+
+    stock = current_stock(ingredients.keys())
+    return [pk for pk, quantity in ingredients.items() if stock.get(pk, 0) < quantity]
+
+
+def build_menu(restaurant_id) -> list:
+    """
+    Меню ресторана одним запросом: продукты с категорией и цехом внутри каждого продукта.
+    """
+    products = (Product.objects
+                .filter(restaurant=restaurant_id)
+                .order_by('id')
+                .values('id', 'name', 'description', 'price', 'stop', 'count',
+                        'category_id', 'category__name', 'kitchen_id', 'kitchen__name'))
+
+    return [{
+        'id': product['id'],
+        'name': product['name'],
+        'description': product['description'],
+        'price': product['price'],
+        'stop': product['stop'],
+        'count': product['count'],
+        'category': {'id': product['category_id'], 'name': product['category__name']},
+        'kitchen': {'id': product['kitchen_id'], 'name': product['kitchen__name']},
+    } for product in products]
+
+
+def change_restaurant_links(model, user, pairs, remove=False) -> list:
+    """
+    Привязывает (или отвязывает при remove=True) рестораны к категориям или цехам пачкой.
+    pairs — пары (id категории/цеха, restaurant_id). Как и для одиночной привязки,
+    user должен быть автором и целевого ресторана, и всех ресторанов, к которым
+    объект уже привязан. Права проверяются одним множеством по снимку иерархии,
+    связи пишутся одним INSERT или DELETE в промежуточную таблицу.
+    Возвращает статус по каждой паре в исходном порядке.
+    """
+    field = f'{model._meta.model_name}_id'
+    through = model.restaurant.through
+    pairs = list(dict.fromkeys((int(item_id), int(restaurant_id)) for item_id, restaurant_id in pairs))
+    item_ids = {item_id for item_id, _ in pairs}
+
+    existing = set(model.objects.filter(id__in=item_ids).values_list('id', flat=True))
+    linked = defaultdict(set)
+    for item_id, restaurant_id in through.objects.filter(**{f'{field}__in': existing}).values_list(field, 'restaurant_id'):
+        linked[item_id].add(restaurant_id)
+
+    targets = {restaurant_id for _, restaurant_id in pairs}
+    authored = authored_restaurants(user, targets.union(*linked.values()))
+    hierarchy = get_hierarchy()
+
+    results, changes = [], []
+    for item_id, restaurant_id in pairs:
+        if item_id not in existing:
+            result = 'not_found'
+        elif restaurant_id not in authored and hierarchy.chain_of_restaurant(restaurant_id) is None:
+            result = 'restaurant_not_found'
+        elif restaurant_id not in authored or not linked[item_id] <= authored:
+            result = 'forbidden'
+        elif remove and restaurant_id not in linked[item_id]:
+            result = 'not_linked'
+        elif not remove and restaurant_id in linked[item_id]:
+            result = 'already_linked'
+        else:
+            result = 'removed' if remove else 'added'
+            changes.append((item_id, restaurant_id))
+        results.append({field: item_id, 'restaurant_id': restaurant_id, 'result': result})
+
+    if changes:
+        with transaction.atomic():
+            if remove:
+                grouped = defaultdict(list)
+                for item_id, restaurant_id in changes:
+                    grouped[item_id].append(restaurant_id)
+                condition = Q()
+                for item_id, restaurant_ids in grouped.items():
+                    condition |= Q(**{field: item_id, 'restaurant_id__in': restaurant_ids})
+                through.objects.filter(condition).delete()
+            else:
+                through.objects.bulk_create([through(**{field: item_id, 'restaurant_id': restaurant_id})
+                                             for item_id, restaurant_id in changes], ignore_conflicts=True)
+
+            # Пачечная запись не отправляет m2m_changed, меню затронутых ресторанов инвалидируется здесь
+            bump_menu_versions({restaurant_id for _, restaurant_id in changes})
+
+    return results
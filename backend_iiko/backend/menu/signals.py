@@ -0,0 +1,46 @@
+from django.db.models.signals import post_save, pre_delete, m2m_changed
+from django.dispatch import receiver
+
+from .events import publish_stock
+from .models import Product, Category, Kitchen
+from .versions import bump_menu_versions, restaurants_of_products
+
+
+def _affected_restaurants(instance) -> set:
+    if isinstance(instance, Product):
+        return restaurants_of_products([instance.pk])
+
+    # Категория и цех влияют на меню своих ресторанов и ресторанов своих продуктов
+    restaurant_ids = set(instance.restaurant.values_list('id', flat=True))
+    products = Product.objects.filter(**{instance._meta.model_name: instance})
+    restaurant_ids |= restaurants_of_products(products.values('id'))
+    return restaurant_ids
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Kitchen)
+@receiver(pre_delete, sender=Product)
+@receiver(pre_delete, sender=Category)
+@receiver(pre_delete, sender=Kitchen)
+def invalidate_menu_on_change(sender, instance, **kwargs):
+    bump_menu_versions(_affected_restaurants(instance))
+
+
+@receiver(m2m_changed, sender=Product.restaurant.through)
+@receiver(m2m_changed, sender=Category.restaurant.through)
+@receiver(m2m_changed, sender=Kitchen.restaurant.through)
+def invalidate_menu_on_restaurants_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        restaurant_ids = {instance.pk} if reverse else _affected_restaurants(instance)
+    elif action in ('post_add', 'post_remove'):
+        restaurant_ids = {instance.pk} if reverse else set(pk_set)
+    else:
+        return
+
+    bump_menu_versions(restaurant_ids)
+
+
+@receiver(post_save, sender=Product)
+def publish_stock_on_save(sender, instance, **kwargs):
+    publish_stock([instance.pk])
@@ -0,0 +1,41 @@
+import json
+
+from django.core.cache import cache
+
+from backend.metrics import record_cache_lookup
+
+from .services import build_menu
+from .versions import get_menu_version
+
+
+SNAPSHOT_KEY = 'menu:snapshot:{}'
+SNAPSHOT_TIMEOUT = 60 * 60 * 24
+
+
+def rebuild_menu_snapshot(restaurant_id, version=None) -> bytes:
+    """
+    Строит JSON меню ресторана и сохраняет его в кэш вместе с версией.
+    Версия читается до построения: если меню изменится во время сборки,
+    снимок окажется устаревшим и будет перестроен при следующем чтении.
+    """
+    if version is None:
+        version = get_menu_version(restaurant_id)
+
+    body = json.dumps({
+        'restaurant_id': int(restaurant_id),
+        'version': version,
+        'products': build_menu(restaurant_id),
+    }, ensure_ascii=False, separators=(',', ':')).encode()
+
+    cache.set(SNAPSHOT_KEY.format(restaurant_id), {'version': version, 'body': body}, timeout=SNAPSHOT_TIMEOUT)
+    return body
+
+
+def get_menu_snapshot(restaurant_id, version) -> bytes:
+    # Готовые байты из кэша, перестраиваются только если снимка нет или он старее version
+    snapshot = cache.get(SNAPSHOT_KEY.format(restaurant_id))
+    hit = snapshot is not None and snapshot['version'] == version
+    record_cache_lookup('menu_snapshot', hit)
+    if not hit:
+        return rebuild_menu_snapshot(restaurant_id, version)
+    return snapshot['body']
@@ -0,0 +1,21 @@
+from celery import shared_task
+
+from .inventory import rollup_movements, ROLLUP_BATCH_SIZE
+from .snapshots import rebuild_menu_snapshot
+
+
+@shared_task
+def rebuild_menu_snapshots(restaurant_ids):
+    for restaurant_id in restaurant_ids:
+        rebuild_menu_snapshot(restaurant_id)
+
+
+@shared_task
+def rollup_stock_movements():
+    # Сворачивает журнал пачками, пока не останутся только свежие движения
+    total = 0
+    while True:
+        rolled = rollup_movements()
+        total += rolled
+        if rolled < ROLLUP_BATCH_SIZE:
+            return total
@@ -1,3 +1,366 @@
-from django.test import TestCase
+import io
+import json
+from datetime import timedelta
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from backend.querybudget import Budget, QueryBudgetMixin
+from backend.testing import SeededAPITestCase
+from core.models import User
+from organization.models import Organization, Restaurant
+
+from . import urls
+from .inventory import current_stock, record_movements, rollup_movements
+from .models import Category, Ingredient, Kitchen, Product, Recipe, StockMovement
+from .transfer import export_rows, import_menu, render_rows
+from .versions import ALL_RESTAURANTS, VERSION_KEY
+
+
+def _import_file(test):
+    rows = [{'type': 'category', 'name': 'import-category'},
+            {'type': 'kitchen', 'name': 'import-kitchen'},
+            {'type': 'ingredient', 'name': 'import-ingredient', 'count': 100}]
+    for i in range(3):
+        rows += [{'type': 'product', 'name': f'import-product-{i}', 'price': 100,
+                  'category': 'import-category', 'kitchen': 'import-kitchen'},
+                 {'type': 'recipe', 'product': f'import-product-{i}', 'ingredients': ['import-ingredient'],
+                  'quantity': 1, 'measure': 'g'}]
+    content = '\n'.join(json.dumps(row) for row in rows).encode()
+    return {'restaurant_id': test.ids['restaurant_id'], 'file': SimpleUploadedFile('menu.jsonl', content)}
+
+
+def _links(key, remove=False):
+    # Привязка к двум другим ресторанам автора, удаление — уже существующей связи
+    def data(test):
+        restaurant_ids = [test.ids['restaurant_id']] if remove else test.other_restaurant_ids
+        return {key: test.ids[key], 'restaurant_ids': restaurant_ids}
+    return data
+
+
+class MenuQueryBudgetTests(QueryBudgetMixin, APITestCase):
+    router = urls.router
+    budgets = {
+        ('product-list', 'get'): Budget(2),
+        ('product-export-menu', 'get'): Budget(11, params=lambda t: {'restaurant_id': t.ids['restaurant_id']}),
+        ('product-import-menu', 'post'): Budget(32, data=_import_file, format='multipart'),
+        ('product-menu', 'get'): Budget(7, kwargs=lambda t: {'restaurant_id': t.ids['restaurant_id']}),
+        ('product-detail', 'get'): Budget(2, kwargs=lambda t: {'pk': t.ids['product_ids'][0]}),
+
+        ('category-list', 'get'): Budget(6),
+        ('category-list', 'post'): Budget(22, data=lambda t: {'name': 'new-category',
+                                                              'restaurant': t.other_restaurant_ids}),
+        ('category-add-restaurant-to-category', 'post'): Budget(19, data=lambda t: {
+            'category_id': t.ids['category_id'], 'restaurant_id': t.other_restaurant_ids[0]}),
+        ('category-add-restaurants-to-category', 'post'): Budget(11, data=_links('category_id')),
+        ('category-delete-restaurant-to-category', 'delete'): Budget(12, params=lambda t: {
+            'category_id': t.ids['category_id'], 'restaurant_id': t.ids['restaurant_id']}),
+        ('category-delete-restaurants-to-category', 'post'): Budget(11, data=_links('category_id', remove=True)),
+        ('category-detail', 'get'): Budget(6, kwargs=lambda t: {'pk': t.ids['category_id']}),
+        ('category-detail', 'patch'): Budget(20, kwargs=lambda t: {'pk': t.ids['category_id']},
+                                              data=lambda t: {'name': 'renamed-category',
+                                                              'restaurant': [t.ids['restaurant_id']]}),
+        ('category-detail', 'delete'): Budget(25, kwargs=lambda t: {'pk': t.ids['category_id']}),
+
+        ('kitchen-list', 'get'): Budget(6),
+        ('kitchen-list', 'post'): Budget(22, data=lambda t: {'name': 'new-kitchen',
+                                                             'restaurant': t.other_restaurant_ids}),
+        ('kitchen-add-restaurant-to-kitchen', 'post'): Budget(19, data=lambda t: {
+            'kitchen_id': t.ids['kitchen_id'], 'restaurant_id': t.other_restaurant_ids[0]}),
+        ('kitchen-add-restaurants-to-kitchen', 'post'): Budget(11, data=_links('kitchen_id')),
+        ('kitchen-delete-restaurant-to-kitchen', 'delete'): Budget(12, params=lambda t: {
+            'kitchen_id': t.ids['kitchen_id'], 'restaurant_id': t.ids['restaurant_id']}),
+        ('kitchen-delete-restaurants-to-kitchen', 'post'): Budget(11, data=_links('kitchen_id', remove=True)),
+        ('kitchen-detail', 'get'): Budget(6, kwargs=lambda t: {'pk': t.ids['kitchen_id']}),
+        ('kitchen-detail', 'patch'): Budget(20, kwargs=lambda t: {'pk': t.ids['kitchen_id']},
+                                             data=lambda t: {'name': 'renamed-kitchen',
+                                                             'restaurant': [t.ids['restaurant_id']]}),
+        ('kitchen-detail', 'delete'): Budget(26, kwargs=lambda t: {'pk': t.ids['kitchen_id']}),
+
+        ('order-checkout', 'post'): Budget(15, data=lambda t: {
+            'restaurant_id': t.ids['restaurant_id'],
+            'items': [{'product_id': product_id, 'quantity': 1} for product_id in t.ids['product_ids'][:3]]}),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other_restaurant_ids = list(
+            Restaurant.objects.filter(chain__organization=cls.ids['organization_id'])
+            .exclude(pk=cls.ids['restaurant_id']).order_by('pk').values_list('pk', flat=True)[:2])
+
+
+class ConditionalResponseTests(SeededAPITestCase):
+    scale = {**SeededAPITestCase.scale, 'users': 2, 'ingredients': 3, 'products': 2}
+
+    def get(self, path, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(path, **headers)
+
+    def test_not_modified_until_menu_changes(self):
+        etag = self.get('/api/menu/products/')['ETag']
+        self.assertEqual(self.get('/api/menu/products/', etag).status_code, 304)
+
+        cache.set(VERSION_KEY.format(ALL_RESTAURANTS), 1, timeout=None)
+        self.assertEqual(self.get('/api/menu/products/', etag).status_code, 200)
+
+    def test_etag_depends_on_query_and_user(self):
+        etag = self.get('/api/menu/products/')['ETag']
+        self.assertEqual(self.get('/api/menu/products/?search=product', etag).status_code, 200)
+
+        self.login(User.objects.get(pk=self.ids['user_id']))
+        self.assertEqual(self.get('/api/menu/products/', etag).status_code, 200)
+
+    def test_product_not_modified_without_queries(self):
+        path = f'/api/menu/products/{self.ids["product_ids"][0]}/'
+        response = self.get(path)
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get(path, response['ETag']).status_code, 304)
+
+    def test_missing_product_is_not_found(self):
+        path = f'/api/menu/products/{self.ids["product_ids"][0]}/'
+        etag = self.get(path)['ETag']
+        self.assertEqual(self.get('/api/menu/products/999999/', etag).status_code, 404)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.get(pk=self.ids['product_ids'][0]).delete()
+        self.assertEqual(self.get(path, etag).status_code, 404)
+
+
+class CheckoutTests(SeededAPITestCase):
+    scale = {**SeededAPITestCase.scale, 'restaurants': 2, 'ingredients': 3, 'products': 2}
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.first, cls.second = cls.ids['product_ids']
+        Product.objects.filter(pk=cls.first).update(count=5)
+        Product.objects.filter(pk=cls.second).update(count=1)
+        # Каждый продукт по рецепту расходует по единице всех трех ингредиентов своего ресторана
+        cls.ingredient_ids = list(Ingredient.objects.filter(restaurant=cls.ids['restaurant_id'])
+                                  .order_by('pk').values_list('pk', flat=True))
+        Ingredient.objects.update(count=10)
+
+    def checkout(self, *items, restaurant_id=None):
+        return self.client.post('/api/menu/order/checkout/', {
+            'restaurant_id': restaurant_id or self.ids['restaurant_id'],
+            'items': [{'product_id': product_id, 'quantity': quantity} for product_id, quantity in items],
+        }, format='json')
+
+    def counts(self):
+        return dict(Product.objects.filter(pk__in=self.ids['product_ids']).values_list('pk', 'count'))
+
+    def test_checkout_consumes_products_and_ingredients(self):
+        response = self.checkout((self.first, 2), (self.second, 1), (self.first, 1))
+        self.assertEqual(response.status_code, 200, response.data)
+
+        self.assertEqual(self.counts(), {self.first: 2, self.second: 0})
+        self.assertTrue(Product.objects.get(pk=self.second).stop)
+        self.assertEqual(current_stock(self.ingredient_ids), {pk: 6 for pk in self.ingredient_ids})
+
+    def test_out_of_stock_product_rolls_back_order(self):
+        response = self.checkout((self.first, 2), (self.second, 2))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['products'], [str(self.second)])
+
+        self.assertEqual(self.counts(), {self.first: 5, self.second: 1})
+        self.assertFalse(StockMovement.objects.exists())
+
+    def test_out_of_stock_ingredient_rolls_back_order(self):
+        Ingredient.objects.filter(pk=self.ingredient_ids[0]).update(count=1)
+
+        response = self.checkout((self.first, 2))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['ingredients'], [str(self.ingredient_ids[0])])
+
+        self.assertEqual(self.counts(), {self.first: 5, self.second: 1})
+        self.assertFalse(StockMovement.objects.exists())
+
+    def test_checkout_consumes_only_restaurant_ingredients(self):
+        # Продукт привязан к двум ресторанам, в рецепте ингредиенты обоих
+        other_id = Restaurant.objects.exclude(pk=self.ids['restaurant_id']).get().pk
+        other_ingredient = Ingredient.objects.filter(restaurant=other_id).order_by('pk').first()
+        Product.objects.get(pk=self.first).restaurant.add(other_id)
+        Recipe.objects.get(product=self.first).ingredient.add(other_ingredient)
+        Ingredient.objects.filter(pk=other_ingredient.pk).update(count=0)
+
+        response = self.checkout((self.first, 1))
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(current_stock(self.ingredient_ids), {pk: 9 for pk in self.ingredient_ids})
+        self.assertEqual(current_stock([other_ingredient.pk]), {other_ingredient.pk: 0})
+
+        response = self.checkout((self.first, 1), restaurant_id=other_id)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['ingredients'], [str(other_ingredient.pk)])
+        self.assertEqual(current_stock(self.ingredient_ids), {pk: 9 for pk in self.ingredient_ids})
+
+
+class BulkRestaurantLinksTests(SeededAPITestCase):
+    scale = {**SeededAPITestCase.scale, 'organizations': 2, 'restaurants': 2, 'users': 2}
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        own, foreign = Organization.objects.order_by('pk')
+        cls.own = list(Restaurant.objects.filter(chain__organization=own).order_by('pk').values_list('pk', flat=True))
+        cls.foreign = list(Restaurant.objects.filter(chain__organization=foreign).order_by('pk')
+                           .values_list('pk', flat=True))
+        cls.category = Category.objects.get(restaurant=cls.own[0])
+        cls.foreign_category = Category.objects.get(restaurant=cls.foreign[0])
+        cls.kitchen = Kitchen.objects.get(restaurant=cls.own[0])
+
+    def post(self, path, data):
+        response = self.client.post(path, data, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return [result['result'] for result in response.data['results']]
+
+    def linked(self, obj):
+        return set(obj.restaurant.values_list('pk', flat=True))
+
+    def test_add_reports_each_pair(self):
+        results = self.post('/api/menu/category/add_restaurants_to_category/', {
+            'category_id': self.category.pk, 'restaurant_ids': [self.own[1], self.own[0], self.foreign[0], 999999]})
+
+        self.assertEqual(results, ['added', 'already_linked', 'forbidden', 'restaurant_not_found'])
+        self.assertEqual(self.linked(self.category), set(self.own))
+
+    def test_items_need_rights_to_every_linked_restaurant(self):
+        results = self.post('/api/menu/category/add_restaurants_to_category/', {'items': [
+            {'category_id': self.foreign_category.pk, 'restaurant_id': self.own[1]},
+            {'category_id': 999999, 'restaurant_id': self.own[1]},
+            {'category_id': self.category.pk, 'restaurant_id': self.own[1]},
+        ]})
+
+        self.assertEqual(results, ['forbidden', 'not_found', 'added'])
+        self.assertEqual(self.linked(self.foreign_category), {self.foreign[0]})
+
+    def test_remove(self):
+        results = self.post('/api/menu/kitchen/delete_restaurants_to_kitchen/', {
+            'kitchen_id': self.kitchen.pk, 'restaurant_ids': [self.own[0], self.own[1]]})
+
+        self.assertEqual(results, ['removed', 'not_linked'])
+        self.assertEqual(self.linked(self.kitchen), set())
+
+    def test_items_and_single_object_are_exclusive(self):
+        response = self.client.post('/api/menu/category/add_restaurants_to_category/', {
+            'category_id': self.category.pk, 'restaurant_ids': [self.own[1]],
+            'items': [{'category_id': self.category.pk, 'restaurant_id': self.own[1]}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ProductSearchTests(SeededAPITestCase):
+    scale = {**SeededAPITestCase.scale, 'ingredients': 3, 'products': 7}
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Совпадение не с начала строки ранжируется ниже
+        cls.low_rank_id = cls.ids['product_ids'][0]
+        Product.objects.filter(pk=cls.low_rank_id).update(name='menu-product')
+
+    def test_search_results_are_paginated_by_rank(self):
+        ids, url = [], '/api/menu/products/?search=product&page_size=3'
+        while url:
+            response = self.client.get(url)
+            ids += [product['id'] for product in response.data['results']]
+            url = response.data['next']
+
+        self.assertEqual(len(ids), 7)
+        self.assertEqual(set(ids), set(self.ids['product_ids']))
+        self.assertEqual(ids[-1], self.low_rank_id)
+
+        previous = self.client.get(response.data['previous'])
+        self.assertEqual([product['id'] for product in previous.data['results']], ids[3:6])
+
+
+class StockLedgerTests(SeededAPITestCase):
+    scale = {**SeededAPITestCase.scale, 'ingredients': 2}
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Ingredient.objects.update(count=100)
+        cls.first, cls.second = Ingredient.objects.order_by('pk').values_list('pk', flat=True)
+
+    def record(self, age=timedelta(minutes=1)):
+        record_movements(StockMovement.Kind.RECEIPT, {self.first: 10})
+        record_movements(StockMovement.Kind.CONSUMPTION, {self.first: 3, self.second: 5})
+        record_movements(StockMovement.Kind.WRITE_OFF, {self.second: 1})
+        StockMovement.objects.filter(rolled_up=False).update(created_at=timezone.now() - age)
+
+    def test_rollup_moves_pending_delta_into_count(self):
+        self.record()
+        expected = {self.first: 107, self.second: 94}
+        self.assertEqual(current_stock([self.first, self.second]), expected)
+
+        self.assertEqual(rollup_movements(), 4)
+        self.assertEqual(dict(Ingredient.objects.values_list('pk', 'count')), expected)
+        self.assertEqual(current_stock([self.first, self.second]), expected)
+        self.assertFalse(StockMovement.objects.filter(rolled_up=False).exists())
+        self.assertEqual(rollup_movements(), 0)
+
+    def test_rollup_in_batches_keeps_current_stock(self):
+        self.record()
+        self.assertEqual(rollup_movements(batch_size=3), 3)
+        self.assertEqual(current_stock([self.first, self.second]), {self.first: 107, self.second: 94})
+        self.assertEqual(rollup_movements(batch_size=3), 1)
+        self.assertEqual(dict(Ingredient.objects.values_list('pk', 'count')), {self.first: 107, self.second: 94})
+
+    def test_fresh_movements_are_not_rolled_up(self):
+        self.record(age=timedelta(0))
+        self.assertEqual(rollup_movements(), 0)
+        self.assertEqual(dict(Ingredient.objects.values_list('pk', 'count')), {self.first: 100, self.second: 100})
+
+
+class MenuTransferTests(SeededAPITestCase):
+    scale = {**SeededAPITestCase.scale, 'ingredients': 3, 'products': 2}
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.ingredient = Ingredient.objects.filter(restaurant=cls.ids['restaurant_id']).first()
+
+    def import_rows(self, rows):
+        content = '\n'.join(json.dumps(row) for row in rows).encode()
+        return import_menu(io.BytesIO(content), 'jsonl', self.ids['restaurant_id'])
+
+    def rollup(self):
+        StockMovement.objects.update(created_at=timezone.now() - timedelta(minutes=1))
+        rollup_movements()
+
+    def test_export_includes_pending_movements(self):
+        record_movements(StockMovement.Kind.CONSUMPTION, {self.ingredient.pk: 3})
+
+        exported = {row['name']: row['count'] for row in export_rows(self.ids['restaurant_id'])
+                    if row['type'] == 'ingredient'}
+        self.assertEqual(exported[self.ingredient.name], self.ingredient.count - 3)
+
+    def test_import_replaces_current_stock(self):
+        record_movements(StockMovement.Kind.CONSUMPTION, {self.ingredient.pk: 3})
+
+        self.import_rows([{'type': 'ingredient', 'name': self.ingredient.name, 'count': 50}])
+        self.assertEqual(current_stock([self.ingredient.pk])[self.ingredient.pk], 50)
+
+        self.rollup()
+        self.ingredient.refresh_from_db()
+        self.assertEqual(self.ingredient.count, 50)
+
+    def test_round_trip(self):
+        restaurant_id = self.ids['restaurant_id']
+        exported = list(export_rows(restaurant_id))
+
+        for fmt in ('jsonl', 'csv'):
+            with self.subTest(format=fmt):
+                content = ''.join(render_rows(iter(exported), fmt)).encode()
+                for model in (Product, Category, Kitchen, Ingredient):
+                    model.objects.filter(restaurant=restaurant_id).delete()
+
+                result = import_menu(io.BytesIO(content), fmt, restaurant_id)
+                self.assertEqual(result['errors'], [])
+                self.assertEqual(result['imported'], {'category': 1, 'kitchen': 1, 'ingredient': 3,
+                                                      'product': 2, 'recipe': 2})
+                self.assertEqual(list(export_rows(restaurant_id)), exported)
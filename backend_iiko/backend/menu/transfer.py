@@ -0,0 +1,375 @@
+import csv
+import io
+import json
+from collections import defaultdict
+from itertools import islice
+
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from .inventory import record_movements
+from .models import Category, Kitchen, Ingredient, Product, Recipe, StockMovement
+from .serializers import (ImportNamedRowSerializer, ImportIngredientRowSerializer,
+                          ImportProductRowSerializer, ImportRecipeRowSerializer)
+from .versions import bump_menu_versions, restaurants_of_products
+
+
+# Формат обмена меню — поток записей с полем type, по одной на строку JSONL или CSV.
+# Записи ссылаются друг на друга по именам, поэтому в файле сначала идут
+# категории, цеха и ингредиенты, затем продукты, затем рецепты.
+# В CSV ингредиенты рецепта перечисляются через ';', пустая ячейка означает значение по умолчанию.
+
+FORMATS = ('csv', 'jsonl')
+CONTENT_TYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+COLUMNS = ['type', 'name', 'description', 'price', 'count', 'stop',
+           'category', 'kitchen', 'product', 'ingredients', 'quantity', 'measure']
+INGREDIENTS_SEPARATOR = ';'
+
+IMPORT_CHUNK_SIZE = 1000
+EXPORT_CHUNK_SIZE = 2000
+
+# Порядок обработки типов внутри пачки, зависимые записи идут после тех, на кого ссылаются
+ROW_SERIALIZERS = {
+    'category': ImportNamedRowSerializer,
+    'kitchen': ImportNamedRowSerializer,
+    'ingredient': ImportIngredientRowSerializer,
+    'product': ImportProductRowSerializer,
+    'recipe': ImportRecipeRowSerializer,
+}
+
+
+def format_of(filename, default='jsonl'):
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    return extension if extension in FORMATS else default
+
+
+# Чтение
+
+def _csv_rows(stream):
+    for row in csv.DictReader(stream):
+        row = {key: value for key, value in row.items() if key and value not in ('', None)}
+        if 'ingredients' in row:
+            row['ingredients'] = [name.strip() for name in row['ingredients'].split(INGREDIENTS_SEPARATOR)
+                                  if name.strip()]
+        yield row
+
+
+def _jsonl_rows(stream):
+    for line in stream:
+        line = line.strip()
+        if not line:
+            yield None
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as error:
+            yield {'type': None, 'error': f'Invalid JSON: {error.msg}'}
+
+
+def read_rows(stream, fmt):
+    """
+    Лениво читает записи из бинарного или текстового потока.
+    Возвращает пары (номер строки, запись), файл целиком в память не загружается.
+    """
+    if isinstance(stream, io.TextIOBase):
+        text = stream
+    else:
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+    if fmt == 'csv':
+        # Первая строка CSV — заголовок
+        return enumerate(_csv_rows(text), start=2)
+    return ((line, row) for line, row in enumerate(_jsonl_rows(text), start=1) if row is not None)
+
+
+# Импорт
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _dedupe(rows, key='name'):
+    # Повтор имени в одной пачке ломает ON CONFLICT DO UPDATE, побеждает последняя запись
+    return list({row[key]: row for row in rows}.values())
+
+
+def _ids_by_name(model, names, restaurant_id=None) -> dict:
+    queryset = model.objects.filter(name__in=set(names))
+    if restaurant_id is not None:
+        queryset = queryset.filter(restaurant=restaurant_id)
+    return dict(queryset.values_list('name', 'id'))
+
+
+def _foreign_names(model, names, restaurant_id) -> set:
+    # Имена уникальны глобально, чужие записи с тем же именем импорт не трогает
+    return set(model.objects
+               .filter(name__in=set(names))
+               .exclude(restaurant=restaurant_id)
+               .values_list('name', flat=True))
+
+
+def _upsert(model, objs, update_fields):
+    if not objs:
+        return {}
+    if update_fields:
+        model.objects.bulk_create(objs, update_conflicts=True, unique_fields=['name'], update_fields=update_fields)
+    else:
+        model.objects.bulk_create(objs, ignore_conflicts=True)
+    return _ids_by_name(model, [obj.name for obj in objs])
+
+
+def _link(model, field, ids, restaurant_id):
+    through = model.restaurant.through
+    through.objects.bulk_create([through(**{f'{field}_id': pk, 'restaurant_id': restaurant_id}) for pk in ids],
+                                ignore_conflicts=True)
+
+
+class MenuImporter:
+    """
+    Импортирует поток записей в меню ресторана пачками по chunk_size строк.
+    Каждая строка пачки проверяется сериализатором своего типа, пачка записывается
+    в своей транзакции несколькими bulk-запросами, поэтому число запросов
+    зависит от числа пачек, а не строк. Ошибочные строки пропускаются и попадают в отчет.
+    Рецепты импортируемого продукта заменяют его прежние рецепты.
+    """
+
+    def __init__(self, restaurant_id, chunk_size=IMPORT_CHUNK_SIZE):
+        self.restaurant_id = restaurant_id
+        self.chunk_size = chunk_size
+        self.imported = defaultdict(int)
+        self.errors = []
+        self.product_ids = set()
+        self.replaced_recipes = set()
+
+    def run(self, rows) -> dict:
+        for chunk in _chunks(rows, self.chunk_size):
+            self._import_chunk(chunk)
+
+        # bulk-запросы не отправляют сигналы, меню инвалидируется один раз в конце
+        bump_menu_versions({self.restaurant_id} | restaurants_of_products(self.product_ids))
+        return {'imported': dict(self.imported), 'errors': sorted(self.errors, key=lambda error: error['line'])}
+
+    def _error(self, line, errors):
+        self.errors.append({'line': line, 'errors': errors})
+
+    def _validate(self, chunk) -> dict:
+        serializers = {kind: serializer_class() for kind, serializer_class in ROW_SERIALIZERS.items()}
+        valid = defaultdict(list)
+
+        for line, row in chunk:
+            if not isinstance(row, dict):
+                self._error(line, {'non_field_errors': ['Expected an object.']})
+            elif 'error' in row and row.get('type') is None:
+                self._error(line, {'non_field_errors': [row['error']]})
+            elif row.get('type') not in serializers:
+                self._error(line, {'type': [f'Expected one of: {", ".join(serializers)}.']})
+            else:
+                try:
+                    valid[row['type']].append((line, serializers[row['type']].run_validation(row)))
+                except ValidationError as error:
+                    self._error(line, error.detail)
+
+        return valid
+
+    def _own_rows(self, model, rows) -> list:
+        foreign = _foreign_names(model, [row['name'] for _, row in rows], self.restaurant_id)
+        own = []
+        for line, row in rows:
+            if row['name'] in foreign:
+                self._error(line, {'name': [f'"{row["name"]}" belongs to another restaurant.']})
+            else:
+                own.append(row)
+        return _dedupe(own)
+
+    @transaction.atomic
+    def _import_chunk(self, chunk):
+        valid = self._validate(chunk)
+
+        for kind, model in (('category', Category), ('kitchen', Kitchen)):
+            if kind not in valid:
+                continue
+            rows = self._own_rows(model, valid[kind])
+            ids = _upsert(model, [model(name=row['name']) for row in rows], [])
+            _link(model, kind, ids.values(), self.restaurant_id)
+            self.imported[kind] += len(rows)
+
+        if 'ingredient' in valid:
+            self._import_ingredients(self._own_rows(Ingredient, valid['ingredient']))
+
+        self._import_products(valid.get('product', []))
+        self._import_recipes(valid.get('recipe', []))
+
+    def _import_ingredients(self, rows):
+        # Остаток существующего ингредиента — его снимок плюс несвернутые движения журнала.
+        # Импортированный остаток записывается движением-инвентаризацией на разницу,
+        # иначе несвернутые движения легли бы поверх него при следующем сворачивании
+        counts = {row['name']: row['count'] for row in rows}
+        existing = {name: (pk, current_count) for name, pk, current_count in
+                    Ingredient.objects.filter(name__in=counts.keys(), restaurant=self.restaurant_id)
+                    .with_current_count().values_list('name', 'pk', 'current_count')}
+
+        _upsert(Ingredient, [Ingredient(name=name, count=count, restaurant_id=self.restaurant_id)
+                             for name, count in counts.items() if name not in existing], ['count', 'restaurant'])
+
+        adjustments = {pk: counts[name] - current_count for name, (pk, current_count) in existing.items()
+                       if counts[name] != current_count}
+        if adjustments:
+            record_movements(StockMovement.Kind.INVENTORY, adjustments)
+        self.imported['ingredient'] += len(rows)
+
+    def _import_products(self, rows):
+        if not rows:
+            return
+
+        # Категория и цех продукта должны быть уже привязаны к ресторану
+        categories = _ids_by_name(Category, [row['category'] for _, row in rows], self.restaurant_id)
+        kitchens = _ids_by_name(Kitchen, [row['kitchen'] for _, row in rows], self.restaurant_id)
+        foreign = _foreign_names(Product, [row['name'] for _, row in rows], self.restaurant_id)
+
+        products = {}
+        for line, row in rows:
+            errors = {}
+            if row['name'] in foreign:
+                errors['name'] = [f'"{row["name"]}" belongs to another restaurant.']
+            if row['category'] not in categories:
+                errors['category'] = [f'Category "{row["category"]}" does not exist in this restaurant.']
+            if row['kitchen'] not in kitchens:
+                errors['kitchen'] = [f'Kitchen "{row["kitchen"]}" does not exist in this restaurant.']
+            if errors:
+                self._error(line, errors)
+                continue
+
+            # Как и Product.save, нулевой остаток сразу ставит продукт на стоп
+            count = row['count']
+            products[row['name']] = Product(
+                name=row['name'], description=row['description'], price=row['price'], count=count,
+                stop=row['stop'] or (count is not None and count < 1),
+                category_id=categories[row['category']], kitchen_id=kitchens[row['kitchen']],
+            )
+
+        ids = _upsert(Product, list(products.values()),
+                      ['description', 'price', 'count', 'stop', 'category', 'kitchen'])
+        _link(Product, 'product', ids.values(), self.restaurant_id)
+        self.product_ids.update(ids.values())
+        self.imported['product'] += len(ids)
+
+    def _import_recipes(self, rows):
+        if not rows:
+            return
+
+        products = _ids_by_name(Product, [row['product'] for _, row in rows], self.restaurant_id)
+        ingredients = _ids_by_name(Ingredient, [name for _, row in rows for name in row['ingredients']],
+                                   self.restaurant_id)
+
+        recipes = []
+        for line, row in rows:
+            errors = {}
+            if row['product'] not in products:
+                errors['product'] = [f'Product "{row["product"]}" does not exist in this restaurant.']
+            missing = [name for name in row['ingredients'] if name not in ingredients]
+            if missing:
+                errors['ingredients'] = [f'Ingredient "{name}" does not exist in this restaurant.'
+                                         for name in missing]
+            if errors:
+                self._error(line, errors)
+                continue
+            recipes.append(row)
+
+        # Старые рецепты удаляются один раз за импорт, иначе следующая пачка стерла бы предыдущую
+        replaced = {products[row['product']] for row in recipes} - self.replaced_recipes
+        if replaced:
+            Recipe.objects.filter(product_id__in=replaced).delete()
+            self.replaced_recipes |= replaced
+
+        created = Recipe.objects.bulk_create([
+            Recipe(product_id=products[row['product']], quantity=row['quantity'], measure=row['measure'])
+            for row in recipes
+        ])
+        through = Recipe.ingredient.through
+        through.objects.bulk_create([
+            through(recipe_id=recipe.pk, ingredient_id=ingredients[name])
+            for recipe, row in zip(created, recipes) for name in dict.fromkeys(row['ingredients'])
+        ])
+        self.product_ids.update(products[row['product']] for row in recipes)
+        self.imported['recipe'] += len(created)
+
+
+def import_menu(stream, fmt, restaurant_id, chunk_size=IMPORT_CHUNK_SIZE) -> dict:
+    return MenuImporter(restaurant_id, chunk_size).run(read_rows(stream, fmt))
+
+
+# Экспорт
+
+def export_rows(restaurant_id, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Лениво выдает записи меню ресторана в порядке, пригодном для обратного импорта.
+    Каждый тип читается одним запросом через iterator(), без загрузки моделей целиком.
+    """
+    for kind, model in (('category', Category), ('kitchen', Kitchen)):
+        names = model.objects.filter(restaurant=restaurant_id).order_by('id').values_list('name', flat=True)
+        for name in names.iterator(chunk_size=chunk_size):
+            yield {'type': kind, 'name': name}
+
+    # Текущий остаток вместе с несвернутыми движениями журнала, а не снимок count
+    ingredients = (Ingredient.objects.filter(restaurant=restaurant_id).with_current_count().order_by('id')
+                   .values_list('name', 'current_count'))
+    for name, count in ingredients.iterator(chunk_size=chunk_size):
+        yield {'type': 'ingredient', 'name': name, 'count': count}
+
+    products = (Product.objects.filter(restaurant=restaurant_id).order_by('id')
+                .values_list('name', 'description', 'price', 'count', 'stop', 'category__name', 'kitchen__name'))
+    for name, description, price, count, stop, category, kitchen in products.iterator(chunk_size=chunk_size):
+        yield {'type': 'product', 'name': name, 'description': description, 'price': price,
+               'count': count, 'stop': stop, 'category': category, 'kitchen': kitchen}
+
+    # Строки связи рецепт-ингредиент идут подряд по recipe_id и склеиваются в одну запись
+    links = (Recipe.ingredient.through.objects
+             .filter(recipe__product__restaurant=restaurant_id)
+             .order_by('recipe_id', 'id')
+             .values_list('recipe_id', 'recipe__product__name', 'recipe__quantity', 'recipe__measure',
+                          'ingredient__name'))
+    recipe = None
+    for recipe_id, product, quantity, measure, ingredient in links.iterator(chunk_size=chunk_size):
+        if recipe is None or recipe['id'] != recipe_id:
+            if recipe is not None:
+                yield _recipe_row(recipe)
+            recipe = {'id': recipe_id, 'product': product, 'ingredients': [],
+                      'quantity': quantity, 'measure': measure}
+        recipe['ingredients'].append(ingredient)
+    if recipe is not None:
+        yield _recipe_row(recipe)
+
+
+def _recipe_row(recipe):
+    return {'type': 'recipe', 'product': recipe['product'], 'ingredients': recipe['ingredients'],
+            'quantity': recipe['quantity'], 'measure': recipe['measure']}
+
+
+class _Echo:
+    # csv.writer пишет в объект с write, здесь строка просто возвращается
+    def write(self, value):
+        return value
+
+
+def render_rows(rows, fmt):
+    """Превращает записи в поток строк CSV или JSONL для StreamingHttpResponse и команд."""
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(COLUMNS)
+        for row in rows:
+            if 'ingredients' in row:
+                row = {**row, 'ingredients': INGREDIENTS_SEPARATOR.join(row['ingredients'])}
+            yield writer.writerow([_csv_value(row.get(column)) for column in COLUMNS])
+    else:
+        for row in rows:
+            yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return value
@@ -5,11 +5,13 @@ from . import views
 
 
 router = DefaultRouter()
-# router.register(r'products', views.ProductViewSet)
+router.register(r'products', views.ProductViewSet)
 router.register(r'category', views.CategoryViewSet)
 router.register(r'kitchen', views.KitchenViewSet)
+router.register(r'order', views.OrderViewSet, basename='order')
 
 
 urlpatterns = [
+    path('products/menu/<int:restaurant_id>/events/', views.stock_events_view, name='stock-events'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -0,0 +1,56 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from backend.metrics import record_cache_lookup
+
+from .models import Product
+
+
+VERSION_KEY = 'menu:version:{}'
+ALL_RESTAURANTS = 'all'
+
+
+def get_menu_version(restaurant_id=ALL_RESTAURANTS) -> int:
+    """
+    Версия меню ресторана — время последнего изменения в наносекундах.
+    Хранится только в кэше, поэтому чтение не обращается к базе.
+    Без restaurant_id возвращает общую версию всех меню.
+    """
+    key = VERSION_KEY.format(restaurant_id)
+    version = cache.get(key)
+    record_cache_lookup('menu_version', version is not None)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _bump(restaurant_ids):
+    from .tasks import rebuild_menu_snapshots
+
+    version = time.time_ns()
+    keys = [VERSION_KEY.format(restaurant_id) for restaurant_id in restaurant_ids]
+    keys.append(VERSION_KEY.format(ALL_RESTAURANTS))
+    cache.set_many({key: version for key in keys}, timeout=None)
+
+    # Снимки меню перестраиваются в фоне только для затронутых ресторанов
+    if restaurant_ids:
+        rebuild_menu_snapshots.delay(sorted(restaurant_ids))
+
+
+def bump_menu_versions(restaurant_ids):
+    # Версии меняются после коммита, чтобы клиент не закэшировал незакоммиченное меню
+    restaurant_ids = set(restaurant_ids)
+    transaction.on_commit(lambda: _bump(restaurant_ids), robust=True)
+
+
+def restaurants_of_products(product_ids) -> set:
+    return set(Product.restaurant.through.objects
+               .filter(product_id__in=product_ids)
+               .values_list('restaurant_id', flat=True))
+
+
+def invalidate_products(product_ids):
+    bump_menu_versions(restaurants_of_products(product_ids))
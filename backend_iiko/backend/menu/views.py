@@ -1,18 +1,131 @@
+from functools import partial
+
 from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from rest_framework.viewsets import ModelViewSet
+from rest_framework.viewsets import ModelViewSet, GenericViewSet, ReadOnlyModelViewSet
 from rest_framework import status
 from drf_spectacular.utils import extend_schema, OpenApiParameter, extend_schema_view
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken
 from django_filters.rest_framework import DjangoFilterBackend
 
+from backend.conditional import conditional_response
+from backend.prefetch import refetch
+from backend.search import TrigramSearchFilter
+from backend.sparse import SPARSE_FIELDS_PARAMETERS
+from backend.viewsets import OptimizedQuerysetMixin
+from core.authentication import ACTIVE_CLAIM, is_current
+from organization.hierarchy import get_hierarchy
 from organization.models import Restaurant
+from organization.permissions import is_author_of_restaurants, is_member_or_author_of_restaurant
 
 from .models import Product, Category, Kitchen
 from .serializers import (GetCategorySerializer, PostPatchCategorySerializer,
                           AddRestaurantToCategorySerializer, GetKitchenSerializer,
-                          PostPatchKitchenSerializer, AddRestaurantToKitchenSerializer)
-from .filters import CategoryFilter, KitchenFilter
+                          PostPatchKitchenSerializer, AddRestaurantToKitchenSerializer,
+                          CheckoutSerializer, GetProductSerializer, ImportMenuSerializer,
+                          BulkRestaurantsToCategorySerializer, BulkRestaurantsToKitchenSerializer)
+from .filters import CategoryFilter, KitchenFilter, ProductFilter
+from .events import stock_events
+from .snapshots import get_menu_snapshot
+from .versions import get_menu_version
+from .transfer import CONTENT_TYPES, FORMATS, export_rows, render_rows
+
+
+@extend_schema_view(
+    list=extend_schema(
+        summary='Get list of products',
+        parameters=SPARSE_FIELDS_PARAMETERS,
+        description='Поддерживает ETag/If-None-Match, '
+                    'при неизменном меню отвечает 304 без обращения к таблицам продуктов',
+        tags=['Products']),
+    retrieve=extend_schema(
+        summary='Get product by id',
+        parameters=SPARSE_FIELDS_PARAMETERS,
+        description='Поддерживает ETag/If-None-Match, '
+                    'при неизменном меню отвечает 304 без обращения к таблицам продуктов',
+        tags=['Products']),
+    menu=extend_schema(
+        summary='Get restaurant menu',
+        description='Меню ресторана одним документом: продукты вместе с категорией, цехом и стоп-листом. '
+                    'Поддерживает ETag/If-None-Match',
+        tags=['Products']),
+    import_menu=extend_schema(
+        summary='Import restaurant menu',
+        description='Потоковый импорт категорий, цехов, ингредиентов, продуктов и рецептов из CSV или JSON Lines. '
+                    'Строки проверяются и записываются пачками, ошибочные строки возвращаются в errors',
+        tags=['Products'],
+        request={'multipart/form-data': ImportMenuSerializer}),
+    export_menu=extend_schema(
+        summary='Export restaurant menu',
+        description='Потоковая выгрузка меню ресторана в формате, пригодном для обратного импорта',
+        tags=['Products'],
+        parameters=[
+            OpenApiParameter(name='restaurant_id', type=int, location=OpenApiParameter.QUERY, description='Restaurant id'),
+            OpenApiParameter(name='file_format', type=str, location=OpenApiParameter.QUERY, enum=FORMATS,
+                             description='csv or jsonl, jsonl by default')]),
+)
+class ProductViewSet(OptimizedQuerysetMixin, ReadOnlyModelViewSet):
+    queryset = Product.objects.all()
+    serializer_class = GetProductSerializer
+    permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, TrigramSearchFilter]
+    filterset_class = ProductFilter
+    search_fields = ['name']
+
+    def list(self, request, *args, **kwargs):
+        build = partial(super().list, request, *args, **kwargs)
+        return conditional_response(request, get_menu_version(), build)
+
+    def retrieve(self, request, *args, **kwargs):
+        # id продукта входит в ETag через путь, а удаление продукта меняет версию меню,
+        # поэтому продукт загружается (и 404 проверяется) только при построении ответа 200
+        build = partial(super().retrieve, request, *args, **kwargs)
+        return conditional_response(request, get_menu_version(), build)
+
+    @action(detail=False, methods=['get'], url_path=r'menu/(?P<restaurant_id>\d+)')
+    def menu(self, request, restaurant_id):
+        if get_hierarchy().chain_of_restaurant(restaurant_id) is None:
+            return Response({'Restaurant not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        version = get_menu_version(restaurant_id)
+
+        # Готовый JSON из кэша отдается как есть, без ORM и сериализаторов
+        return conditional_response(request, version, lambda: HttpResponse(
+            get_menu_snapshot(restaurant_id, version), content_type='application/json'))
+
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def import_menu(self, request):
+        serializer = ImportMenuSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        return Response(serializer.save(), status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path='export')
+    def export_menu(self, request):
+        restaurant_id = request.query_params.get('restaurant_id', '')
+        # ?format= занят DRF под выбор рендерера
+        fmt = request.query_params.get('file_format', 'jsonl')
+
+        if fmt not in FORMATS:
+            return Response({'Unknown format'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not restaurant_id.isdigit() or get_hierarchy().chain_of_restaurant(restaurant_id) is None:
+            return Response({'Restaurant not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        restaurant_id = int(restaurant_id)
+        if not is_member_or_author_of_restaurant(request.user, restaurant_id):
+            return Response({'You are not a member of this restaurant'}, status=status.HTTP_403_FORBIDDEN)
+
+        # Строки формируются по мере чтения из базы, меню целиком в памяти не собирается
+        response = StreamingHttpResponse(render_rows(export_rows(restaurant_id), fmt),
+                                         content_type=CONTENT_TYPES[fmt])
+        response['Content-Disposition'] = f'attachment; filename="menu-{restaurant_id}.{fmt}"'
+        return response
 
 
 @extend_schema_view(
@@ -20,10 +133,12 @@ from .filters import CategoryFilter, KitchenFilter
         summary='Get list of categories',
         parameters=[
             OpenApiParameter(name='name', type=str, location=OpenApiParameter.QUERY, description='Filter by restaurant name'),
-            OpenApiParameter(name='restaurant', type=str, location=OpenApiParameter.QUERY, description='Filter by restaurant name')],
+            OpenApiParameter(name='restaurant', type=str, location=OpenApiParameter.QUERY, description='Filter by restaurant name'),
+            *SPARSE_FIELDS_PARAMETERS],
         tags=['Categories']),
     retrieve=extend_schema(
         summary='Get category by id',
+        parameters=SPARSE_FIELDS_PARAMETERS,
         tags=['Categories']),
     create=extend_schema(
         summary='Create new category',
@@ -41,6 +156,18 @@ from .filters import CategoryFilter, KitchenFilter
         summary='Add restaurant to category',
         tags=['Categories'],
         request=AddRestaurantToCategorySerializer),
+    add_restaurants_to_category=extend_schema(
+        summary='Add restaurants to categories in bulk',
+        description='Принимает items — список пар category_id/restaurant_id, либо category_id и список restaurant_ids. '
+                    'Возвращает результат по каждой паре: added, already_linked, not_found, restaurant_not_found, forbidden',
+        tags=['Categories'],
+        request=BulkRestaurantsToCategorySerializer),
+    delete_restaurants_to_category=extend_schema(
+        summary='Delete restaurants from categories in bulk',
+        description='Принимает то же, что и add_restaurants_to_category. '
+                    'Возвращает результат по каждой паре: removed, not_linked, not_found, restaurant_not_found, forbidden',
+        tags=['Categories'],
+        request=BulkRestaurantsToCategorySerializer),
     delete_restaurant_to_category=extend_schema(
         summary='Delete restaurant from category',
         tags=['Categories'],
@@ -49,13 +176,14 @@ from .filters import CategoryFilter, KitchenFilter
             OpenApiParameter(name='restaurant_id', type=int, location=OpenApiParameter.QUERY, description='Restaurant id')]
     )
 )
-class CategoryViewSet(ModelViewSet):
+class CategoryViewSet(OptimizedQuerysetMixin, ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = GetCategorySerializer
     permission_classes = [IsAuthenticated]
     http_method_names = ['get', 'post', 'patch', 'delete']
-    filter_backends = [DjangoFilterBackend]
+    filter_backends = [DjangoFilterBackend, TrigramSearchFilter]
     filterset_class = CategoryFilter
+    search_fields = ['name']
 
     def get_serializer_class(self):
         if self.action == 'create' or self.action == 'partial_update':
@@ -67,7 +195,7 @@ class CategoryViewSet(ModelViewSet):
         serializer.is_valid(raise_exception=True)
         self.perform_create(serializer)
         headers = self.get_success_headers(serializer.data)
-        return Response(GetCategorySerializer(serializer.instance).data, status=status.HTTP_201_CREATED, headers=headers)
+        return Response(GetCategorySerializer(refetch(serializer.instance, GetCategorySerializer)).data, status=status.HTTP_201_CREATED, headers=headers)
 
     def update(self, request, *args, **kwargs):
         partial = kwargs.pop('partial', False)
@@ -81,15 +209,14 @@ class CategoryViewSet(ModelViewSet):
             # forcibly invalidate the prefetch cache on the instance.
             instance._prefetched_objects_cache = {}
 
-        return Response(GetCategorySerializer(serializer.instance).data)
+        return Response(GetCategorySerializer(refetch(serializer.instance, GetCategorySerializer)).data)
 
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
         user = request.user
 
-        for restaurant in instance.restaurant.all():
-            if user not in restaurant.chain.organization.authors.all():
-                return Response({'You are not an author of this restaurant'}, status=status.HTTP_403_FORBIDDEN)
+        if not is_author_of_restaurants(user, instance.restaurant.values_list('id', flat=True)):
+            return Response({'You are not an author of this restaurant'}, status=status.HTTP_403_FORBIDDEN)
         self.perform_destroy(instance)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -99,7 +226,7 @@ class CategoryViewSet(ModelViewSet):
         serializer = AddRestaurantToCategorySerializer(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
         category = serializer.save()
-        return Response(GetCategorySerializer(category).data, status=status.HTTP_201_CREATED)
+        return Response(GetCategorySerializer(refetch(category, GetCategorySerializer)).data, status=status.HTTP_201_CREATED)
 
     @action(detail=False, methods=['delete'], permission_classes=[IsAuthenticated])
     def delete_restaurant_to_category(self, request):
@@ -116,19 +243,32 @@ class CategoryViewSet(ModelViewSet):
         if restaurant is None:
             return Response({'Restaurant not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        if user not in restaurant.chain.organization.authors.all():
+        if not is_author_of_restaurants(user, [restaurant.id]):
             return Response({'You are not an author of this restaurant'}, status=status.HTTP_403_FORBIDDEN)
 
-        if restaurant not in category.restaurant.all():
+        restaurant_ids = set(category.restaurant.values_list('id', flat=True))
+
+        if restaurant.id not in restaurant_ids:
             return Response({'Restaurant not in category'}, status=status.HTTP_404_NOT_FOUND)
 
-        for restaurant_ in category.restaurant.all():
-            if user not in restaurant_.chain.organization.authors.all():
-                return Response({'You are not an author of this restaurant'}, status=status.HTTP_403_FORBIDDEN)
+        if not is_author_of_restaurants(user, restaurant_ids):
+            return Response({'You are not an author of this restaurant'}, status=status.HTTP_403_FORBIDDEN)
 
         category.restaurant.remove(restaurant)
 
-        return Response(GetCategorySerializer(category).data, status=status.HTTP_200_OK)
+        return Response(GetCategorySerializer(refetch(category, GetCategorySerializer)).data, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def add_restaurants_to_category(self, request):
+        serializer = BulkRestaurantsToCategorySerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        return Response({'results': serializer.save()}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def delete_restaurants_to_category(self, request):
+        serializer = BulkRestaurantsToCategorySerializer(data=request.data, context={'request': request, 'remove': True})
+        serializer.is_valid(raise_exception=True)
+        return Response({'results': serializer.save()}, status=status.HTTP_200_OK)
 
 
 @extend_schema_view(
@@ -136,10 +276,12 @@ class CategoryViewSet(ModelViewSet):
         summary='Get list of categories',
         parameters=[
             OpenApiParameter(name='name', type=str, location=OpenApiParameter.QUERY, description='Filter by restaurant name'),
-            OpenApiParameter(name='restaurant', type=str, location=OpenApiParameter.QUERY, description='Filter by restaurant name')],
+            OpenApiParameter(name='restaurant', type=str, location=OpenApiParameter.QUERY, description='Filter by restaurant name'),
+            *SPARSE_FIELDS_PARAMETERS],
         tags=['Kitchen']),
     retrieve=extend_schema(
         summary='Get category by id',
+        parameters=SPARSE_FIELDS_PARAMETERS,
         tags=['Kitchen']),
     create=extend_schema(
         summary='Create new category',
@@ -157,6 +299,18 @@ class CategoryViewSet(ModelViewSet):
         summary='Add restaurant to category',
         tags=['Kitchen'],
         request=AddRestaurantToKitchenSerializer),
+    add_restaurants_to_kitchen=extend_schema(
+        summary='Add restaurants to kitchens in bulk',
+        description='Принимает items — список пар kitchen_id/restaurant_id, либо kitchen_id и список restaurant_ids. '
+                    'Возвращает результат по каждой паре: added, already_linked, not_found, restaurant_not_found, forbidden',
+        tags=['Kitchen'],
+        request=BulkRestaurantsToKitchenSerializer),
+    delete_restaurants_to_kitchen=extend_schema(
+        summary='Delete restaurants from kitchens in bulk',
+        description='Принимает то же, что и add_restaurants_to_kitchen. '
+                    'Возвращает результат по каждой паре: removed, not_linked, not_found, restaurant_not_found, forbidden',
+        tags=['Kitchen'],
+        request=BulkRestaurantsToKitchenSerializer),
     delete_restaurant_to_kitchen=extend_schema(
         summary='Delete restaurant from category',
         tags=['Kitchen'],
@@ -165,13 +319,14 @@ class CategoryViewSet(ModelViewSet):
             OpenApiParameter(name='restaurant_id', type=int, location=OpenApiParameter.QUERY, description='Restaurant id')]
     )
 )
-class KitchenViewSet(ModelViewSet):
+class KitchenViewSet(OptimizedQuerysetMixin, ModelViewSet):
     queryset = Kitchen.objects.all()
     serializer_class = GetKitchenSerializer
     permission_classes = [IsAuthenticated]
     http_method_names = ['get', 'post', 'patch', 'delete']
-    filter_backends = [DjangoFilterBackend]
+    filter_backends = [DjangoFilterBackend, TrigramSearchFilter]
     filterset_class = KitchenFilter
+    search_fields = ['name']
 
     def get_serializer_class(self):
         if self.action == 'create' or self.action == 'partial_update':
@@ -183,7 +338,7 @@ class KitchenViewSet(ModelViewSet):
         serializer.is_valid(raise_exception=True)
         self.perform_create(serializer)
         headers = self.get_success_headers(serializer.data)
-        return Response(GetKitchenSerializer(serializer.instance).data, status=status.HTTP_201_CREATED, headers=headers)
+        return Response(GetKitchenSerializer(refetch(serializer.instance, GetKitchenSerializer)).data, status=status.HTTP_201_CREATED, headers=headers)
 
     def update(self, request, *args, **kwargs):
         partial = kwargs.pop('partial', False)
@@ -197,15 +352,14 @@ class KitchenViewSet(ModelViewSet):
             # forcibly invalidate the prefetch cache on the instance.
             instance._prefetched_objects_cache = {}
 
-        return Response(GetKitchenSerializer(serializer.instance).data)
+        return Response(GetKitchenSerializer(refetch(serializer.instance, GetKitchenSerializer)).data)
 
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
         user = request.user
 
-        for restaurant in instance.restaurant.all():
-            if user not in restaurant.chain.organization.authors.all():
-                return Response({'You are not an author of this restaurant'}, status=status.HTTP_403_FORBIDDEN)
+        if not is_author_of_restaurants(user, instance.restaurant.values_list('id', flat=True)):
+            return Response({'You are not an author of this restaurant'}, status=status.HTTP_403_FORBIDDEN)
         self.perform_destroy(instance)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -214,7 +368,7 @@ class KitchenViewSet(ModelViewSet):
         serializer = AddRestaurantToKitchenSerializer(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
         kitchen = serializer.save()
-        return Response(GetKitchenSerializer(kitchen).data, status=status.HTTP_201_CREATED)
+        return Response(GetKitchenSerializer(refetch(kitchen, GetKitchenSerializer)).data, status=status.HTTP_201_CREATED)
 
     @action(detail=False, methods=['delete'], permission_classes=[IsAuthenticated])
     def delete_restaurant_to_kitchen(self, request):
@@ -231,16 +385,84 @@ class KitchenViewSet(ModelViewSet):
         if restaurant is None:
             return Response({'Restaurant not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        if user not in restaurant.chain.organization.authors.all():
+        if not is_author_of_restaurants(user, [restaurant.id]):
             return Response({'You are not an author of this restaurant'}, status=status.HTTP_403_FORBIDDEN)
 
-        if restaurant not in kitchen.restaurant.all():
+        restaurant_ids = set(kitchen.restaurant.values_list('id', flat=True))
+
+        if restaurant.id not in restaurant_ids:
             return Response({'Restaurant not in category'}, status=status.HTTP_404_NOT_FOUND)
 
-        for restaurant_ in kitchen.restaurant.all():
-            if user not in restaurant_.chain.organization.authors.all():
-                return Response({'You are not an author of this restaurant'}, status=status.HTTP_403_FORBIDDEN)
+        if not is_author_of_restaurants(user, restaurant_ids):
+            return Response({'You are not an author of this restaurant'}, status=status.HTTP_403_FORBIDDEN)
 
         kitchen.restaurant.remove(restaurant)
 
-        return Response(GetKitchenSerializer(kitchen).data, status=status.HTTP_200_OK)
+        return Response(GetKitchenSerializer(refetch(kitchen, GetKitchenSerializer)).data, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def add_restaurants_to_kitchen(self, request):
+        serializer = BulkRestaurantsToKitchenSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        return Response({'results': serializer.save()}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def delete_restaurants_to_kitchen(self, request):
+        serializer = BulkRestaurantsToKitchenSerializer(data=request.data, context={'request': request, 'remove': True})
+        serializer.is_valid(raise_exception=True)
+        return Response({'results': serializer.save()}, status=status.HTTP_200_OK)
+
+
+@extend_schema_view(
+    checkout=extend_schema(
+        summary='Checkout order',
+        description='Списывает все продукты заказа и ингредиенты их рецептов в одной транзакции',
+        tags=['Orders'],
+        request=CheckoutSerializer)
+)
+class OrderViewSet(GenericViewSet):
+    serializer_class = CheckoutSerializer
+    permission_classes = [IsAuthenticated]
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def checkout(self, request):
+        serializer = CheckoutSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        result = serializer.save()
+        return Response(result, status=status.HTTP_200_OK)
+
+
+def _can_read_stock(user_id, restaurant_id):
+    hierarchy = get_hierarchy()
+    return (hierarchy.is_restaurant_member(user_id, restaurant_id)
+            or hierarchy.is_restaurant_author(user_id, restaurant_id))
+
+
+async def stock_events_view(request, restaurant_id):
+    """
+    Server-Sent Events с изменениями остатков и стоп-листа ресторана.
+    Работает только под ASGI. Токен передается в Authorization: Bearer или в ?token=,
+    так как EventSource в браузере не умеет отправлять заголовки.
+    """
+    if not settings.REDIS_URL:
+        return JsonResponse({'error': 'Push channel is not configured'}, status=503)
+
+    header = request.headers.get('Authorization', '')
+    token = header[len('Bearer '):] if header.startswith('Bearer ') else request.GET.get('token')
+
+    try:
+        access = AccessToken(token)
+        user_id = access['user_id']
+    except (TokenError, KeyError):
+        return JsonResponse({'error': 'Invalid token'}, status=401)
+
+    if access.get(ACTIVE_CLAIM) is False or not await sync_to_async(is_current)(access):
+        return JsonResponse({'error': 'Invalid token'}, status=401)
+
+    if not await sync_to_async(_can_read_stock)(user_id, restaurant_id):
+        return JsonResponse({'error': 'You are not a member of this restaurant'}, status=403)
+
+    response = StreamingHttpResponse(stock_events(restaurant_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
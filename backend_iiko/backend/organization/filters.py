@@ -16,7 +16,7 @@ class OrganizationFilter(django_filters.FilterSet):
         user = self.request.user
 
         if value:
-            return queryset.filter(authors=user)
+            return queryset.filter(authors=user.id)
 
         return queryset
 
@@ -24,7 +24,7 @@ class OrganizationFilter(django_filters.FilterSet):
         user = self.request.user
 
         if value:
-            return user.organizations.all()
+            return queryset.filter(users=user.id)
 
         return queryset
 
@@ -42,7 +42,7 @@ class ChainFilter(django_filters.FilterSet):
         user = self.request.user
 
         if value:
-            return queryset.filter(organization__authors=user)
+            return queryset.filter(organization__authors=user.id)
 
         return queryset
 
@@ -50,7 +50,7 @@ class ChainFilter(django_filters.FilterSet):
         user = self.request.user
 
         if value:
-            return user.chains.all()
+            return queryset.filter(users=user.id)
 
         return queryset
 
@@ -68,7 +68,7 @@ class RestaurantFilter(django_filters.FilterSet):
         user = self.request.user
 
         if value:
-            return queryset.filter(chain__organization__authors=user)
+            return queryset.filter(chain__organization__authors=user.id)
 
         return queryset
 
@@ -76,6 +76,6 @@ class RestaurantFilter(django_filters.FilterSet):
         user = self.request.user
 
         if value:
-            return user.restaurants.all()
+            return queryset.filter(users=user.id)
 
         return queryset
@@ -0,0 +1,148 @@
+import time
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+
+from backend.metrics import record_cache_lookup
+from core.models import User
+
+from .models import Organization, Chain, Restaurant
+
+
+VERSION_KEY = 'org_tree:version'
+SNAPSHOT_KEY = 'org_tree:snapshot:{}'
+SNAPSHOT_TIMEOUT = 60 * 60 * 24
+
+# Снимок последней прочитанной версии внутри процесса
+_local = {'version': None, 'tree': None}
+
+
+class Hierarchy:
+    """
+    Снимок дерева Organization -> Chain -> Restaurant с авторами и участниками.
+    Все проверки выполняются по словарям в памяти, без запросов к базе.
+    """
+
+    def __init__(self, chains, restaurants, authors, organization_users, chain_users, restaurant_users):
+        self.chains = chains
+        self.restaurants = restaurants
+        self.authors = authors
+        self.organization_users = organization_users
+        self.chain_users = chain_users
+        self.restaurant_users = restaurant_users
+
+    def organization_of_chain(self, chain_id):
+        return self.chains.get(int(chain_id))
+
+    def organization_of_restaurant(self, restaurant_id):
+        chain_id = self.restaurants.get(int(restaurant_id))
+        return self.chains.get(chain_id)
+
+    def chain_of_restaurant(self, restaurant_id):
+        return self.restaurants.get(int(restaurant_id))
+
+    def organization_authors(self, organization_id):
+        return self.authors.get(int(organization_id), frozenset())
+
+    def is_organization_author(self, user_id, organization_id):
+        return user_id in self.organization_authors(organization_id)
+
+    def is_chain_author(self, user_id, chain_id):
+        organization_id = self.organization_of_chain(chain_id)
+        return organization_id is not None and self.is_organization_author(user_id, organization_id)
+
+    def is_restaurant_author(self, user_id, restaurant_id):
+        organization_id = self.organization_of_restaurant(restaurant_id)
+        return organization_id is not None and self.is_organization_author(user_id, organization_id)
+
+    def is_restaurant_member(self, user_id, restaurant_id):
+        return user_id in self.restaurant_users.get(int(restaurant_id), frozenset())
+
+    def restaurant_members(self, restaurant_id) -> set:
+        return set(self.restaurant_users.get(int(restaurant_id), frozenset()))
+
+    def chain_members(self, chain_id) -> set:
+        # Участники сети и всех ее ресторанов
+        chain_id = int(chain_id)
+        members = set(self.chain_users.get(chain_id, frozenset()))
+        for restaurant_id, parent_id in self.restaurants.items():
+            if parent_id == chain_id:
+                members |= self.restaurant_members(restaurant_id)
+        return members
+
+    def organization_members(self, organization_id) -> set:
+        # Авторы и участники организации, ее сетей и ресторанов
+        organization_id = int(organization_id)
+        members = set(self.organization_authors(organization_id))
+        members |= self.organization_users.get(organization_id, frozenset())
+        for chain_id, parent_id in self.chains.items():
+            if parent_id == organization_id:
+                members |= self.chain_members(chain_id)
+        return members
+
+
+def _group(pairs):
+    groups = defaultdict(set)
+    for key, value in pairs:
+        groups[key].add(value)
+    return {key: frozenset(values) for key, values in groups.items()}
+
+
+def build_hierarchy() -> Hierarchy:
+    return Hierarchy(
+        chains=dict(Chain.objects.values_list('id', 'organization_id')),
+        restaurants=dict(Restaurant.objects.values_list('id', 'chain_id')),
+        authors=_group(Organization.authors.through.objects.values_list('organization_id', 'user_id')),
+        organization_users=_group(User.organizations.through.objects.values_list('organization_id', 'user_id')),
+        chain_users=_group(User.chains.through.objects.values_list('chain_id', 'user_id')),
+        restaurant_users=_group(User.restaurants.through.objects.values_list('restaurant_id', 'user_id')),
+    )
+
+
+def _init_version():
+    # Начальная версия уникальна, чтобы после вытеснения ключа не прочитать старый снимок
+    cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+    return cache.get(VERSION_KEY)
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = _init_version()
+    return version
+
+
+def get_hierarchy() -> Hierarchy:
+    """
+    Возвращает актуальный снимок дерева: из памяти процесса, если версия в кэше
+    не менялась, иначе из кэша, и только при промахе строит его из базы.
+    """
+    version = get_version()
+
+    if _local['version'] == version:
+        record_cache_lookup('hierarchy', True)
+        return _local['tree']
+
+    key = SNAPSHOT_KEY.format(version)
+    tree = cache.get(key)
+    record_cache_lookup('hierarchy', tree is not None)
+    if tree is None:
+        tree = build_hierarchy()
+        cache.set(key, tree, timeout=SNAPSHOT_TIMEOUT)
+
+    _local['version'], _local['tree'] = version, tree
+    return tree
+
+
+def _bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        _init_version()
+
+
+def invalidate_hierarchy():
+    # Версия меняется только после коммита, иначе параллельный запрос
+    # может закэшировать старые данные под новой версией
+    transaction.on_commit(_bump_version)
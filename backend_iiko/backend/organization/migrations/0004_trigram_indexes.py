@@ -0,0 +1,20 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+from backend.search import trigram_indexes
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organization', '0003_alter_chain_name_alter_restaurant_name'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        trigram_indexes(
+            ('organization_organization', 'name'),
+            ('organization_chain', 'name'),
+            ('organization_restaurant', 'name'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from rest_framework.permissions import BasePermission, SAFE_METHODS
 
+from .hierarchy import get_hierarchy
 from .models import Chain, Organization, Restaurant
 
 
@@ -8,7 +9,7 @@ class IsAuthorOrReadOnly(BasePermission):
         if request.method in SAFE_METHODS:
             return True
 
-        return bool(obj.authors.filter(id=request.user.id).exists())
+        return get_hierarchy().is_organization_author(request.user.id, obj.id)
 
 
 class IsAuthorInChainOrReadOnly(BasePermission):
@@ -16,7 +17,7 @@ class IsAuthorInChainOrReadOnly(BasePermission):
         if request.method in SAFE_METHODS:
             return True
 
-        return bool(obj.organization.authors.filter(id=request.user.id).exists())
+        return get_hierarchy().is_chain_author(request.user.id, obj.id)
 
 
 class IsAuthorInRestaurantOrReadOnly(BasePermission):
@@ -24,4 +25,53 @@ class IsAuthorInRestaurantOrReadOnly(BasePermission):
         if request.method in SAFE_METHODS:
             return True
 
-        return bool(obj.chain.organization.authors.filter(id=request.user.id).exists())
+        return get_hierarchy().is_restaurant_author(request.user.id, obj.id)
+
+
+def authored_restaurants(user, restaurant_ids) -> set:
+    """
+    Возвращает те из restaurant_ids, автором организаций которых является user.
+    Отвечает по снимку иерархии, а если какого-то ресторана в нем еще нет
+    (например, он создан в текущей транзакции) — одним запросом.
+    """
+    restaurant_ids = {int(pk) for pk in restaurant_ids}
+    if not restaurant_ids:
+        return set()
+
+    hierarchy = get_hierarchy()
+    if all(hierarchy.chain_of_restaurant(pk) is not None for pk in restaurant_ids):
+        return {pk for pk in restaurant_ids if hierarchy.is_restaurant_author(user.id, pk)}
+
+    return set(Restaurant.objects
+               .filter(id__in=restaurant_ids, chain__organization__authors=user.id)
+               .values_list('id', flat=True)
+               .distinct())
+
+
+def is_author_of_restaurants(user, restaurant_ids) -> bool:
+    # Проверяет, что user является автором организаций всех ресторанов restaurant_ids
+    restaurant_ids = {int(pk) for pk in restaurant_ids}
+    return authored_restaurants(user, restaurant_ids) == restaurant_ids
+
+
+def is_author_of_chain(user, chain_id) -> bool:
+    hierarchy = get_hierarchy()
+    if hierarchy.organization_of_chain(chain_id) is not None:
+        return hierarchy.is_chain_author(user.id, chain_id)
+
+    return Chain.objects.filter(id=chain_id, organization__authors=user.id).exists()
+
+
+def is_author_of_organization(user, organization_id) -> bool:
+    hierarchy = get_hierarchy()
+    if int(organization_id) in hierarchy.authors:
+        return hierarchy.is_organization_author(user.id, organization_id)
+
+    return Organization.objects.filter(id=organization_id, authors=user.id).exists()
+
+
+def is_member_or_author_of_restaurant(user, restaurant_id) -> bool:
+    if get_hierarchy().is_restaurant_member(user.id, restaurant_id):
+        return True
+
+    return is_author_of_restaurants(user, [restaurant_id])
@@ -1,4 +1,6 @@
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
+
+from backend.sparse import SPARSE_FIELDS_PARAMETERS
 from .serializers import (AddUserToChainSerializer, PostAddAuthorOrUserSerializer,
                           PostPatchRestaurantSerializer, AddUserToRestaurantSerializer)
 
@@ -11,11 +13,13 @@ get_organization_schemas=extend_schema_view(
         summary=organization["get_list_organizations"]["summary"],
         description=organization["get_list_organizations"]["description"],
         tags=['Organization'],
+        parameters=SPARSE_FIELDS_PARAMETERS,
     ),
     retrieve=extend_schema(
         summary=organization["get_organization"]["summary"],
         description=organization["get_organization"]["description"],
         tags=['Organization'],
+        parameters=SPARSE_FIELDS_PARAMETERS,
     ),
     create=extend_schema(
         summary=organization["create_organization"]["summary"],
@@ -65,11 +69,13 @@ get_chain_schema = extend_schema_view(
         summary=chain_des["get_list_chains"]["summary"],
         description=chain_des["get_list_chains"]["description"],
         tags=['Chain'],
+        parameters=SPARSE_FIELDS_PARAMETERS,
     ),
     retrieve=extend_schema(
         summary=chain_des["get_chain"]["summary"],
         description=chain_des["get_chain"]["description"],
         tags=['Chain'],
+        parameters=SPARSE_FIELDS_PARAMETERS,
     ),
     create=extend_schema(
         summary=chain_des["create_chain"]["summary"],
@@ -108,11 +114,13 @@ get_restaurant_schemas = extend_schema_view(
         summary=restaurant["get_list_restaurants"]["summary"],
         description=restaurant["get_list_restaurants"]["description"],
         tags=['Restaurant'],
+        parameters=SPARSE_FIELDS_PARAMETERS,
     ),
     retrieve=extend_schema(
         summary=restaurant["get_restaurant"]["summary"],
         description=restaurant["get_restaurant"]["description"],
         tags=['Restaurant'],
+        parameters=SPARSE_FIELDS_PARAMETERS,
     ),
     create=extend_schema(
         summary=restaurant["create_restaurant"]["summary"],
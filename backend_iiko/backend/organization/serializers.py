@@ -1,12 +1,15 @@
 from rest_framework import serializers
 
 from .models import Organization, Chain, Restaurant
+from .permissions import is_author_of_organization, is_author_of_chain, is_author_of_restaurants
 
 from core.serializers import GetUserSerializer
 from core.models import User
 
+from backend.sparse import SparseFieldsMixin
 
-class GetOrganizationSerializer(serializers.ModelSerializer):
+
+class GetOrganizationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     authors = GetUserSerializer(many=True, read_only=True)
 
     class Meta:
@@ -19,8 +22,8 @@ class GetOrganizationSerializer(serializers.ModelSerializer):
         user = request.user if request else None
         if user and user.is_authenticated:
             organization = Organization.objects.create(**validated_data)
-            organization.authors.add(user)
-            user.organizations.add(organization)
+            organization.authors.add(user.id)
+            organization.users.add(user.id)
             return organization
 
         raise serializers.ValidationError('User not found')
@@ -48,7 +51,7 @@ class PostAddAuthorOrUserSerializer(serializers.Serializer):
         if organization is None:
             raise serializers.ValidationError('Organization not found')
 
-        if author not in organization.authors.all():
+        if not is_author_of_organization(author, organization.id):
             raise serializers.ValidationError('You are not an author of this organization')
 
 
@@ -72,7 +75,7 @@ class PostAddAuthorOrUserSerializer(serializers.Serializer):
         }
 
 
-class GetChainSerializer(serializers.ModelSerializer):
+class GetChainSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     organization = GetOrganizationSerializer()
 
     class Meta:
@@ -90,11 +93,11 @@ class PostPatchChainSerializer(serializers.ModelSerializer):
         user = self.context['request'].user
         organization = validated_data.get('organization')
 
-        if user not in organization.authors.all():
+        if not is_author_of_organization(user, organization.id):
             raise serializers.ValidationError('You are not an author of this organization')
 
         chain = Chain.objects.create(**validated_data)
-        user.chains.add(chain)
+        chain.users.add(user.id)
         return chain
 
 
@@ -116,10 +119,10 @@ class AddUserToChainSerializer(serializers.Serializer):
         if chain is None:
             raise serializers.ValidationError('Chain not found')
 
-        if self_user not in chain.organization.authors.all():
+        if not is_author_of_chain(self_user, chain.id):
             raise serializers.ValidationError('You are not an author of this organization')
 
-        if chain in self_user.chains.all():
+        if chain.users.filter(id=self_user.id).exists():
             raise serializers.ValidationError('User already in this chain')
 
         return value
@@ -134,7 +137,7 @@ class AddUserToChainSerializer(serializers.Serializer):
         return user
 
 
-class GetRestaurantSerializer(serializers.ModelSerializer):
+class GetRestaurantSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     chain = GetChainSerializer()
 
     class Meta:
@@ -152,11 +155,11 @@ class PostPatchRestaurantSerializer(serializers.ModelSerializer):
         user = self.context['request'].user
         chain = validated_data.get('chain')
 
-        if user not in chain.organization.authors.all():
+        if not is_author_of_chain(user, chain.id):
             raise serializers.ValidationError('You are not an author of this organization')
 
         restaurant = Restaurant.objects.create(**validated_data)
-        user.restaurants.add(restaurant)
+        restaurant.users.add(user.id)
         return restaurant
 
 
@@ -178,7 +181,7 @@ class AddUserToRestaurantSerializer(serializers.Serializer):
         if restaurant is None:
             raise serializers.ValidationError('Restaurant not found')
 
-        if self_user not in restaurant.chain.organization.authors.all():
+        if not is_author_of_restaurants(self_user, [restaurant.id]):
             raise serializers.ValidationError('You are not an author of this organization')
 
         return value
@@ -0,0 +1,77 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+
+from core.authentication import bump_membership_versions
+from core.models import User
+
+from .hierarchy import get_hierarchy, invalidate_hierarchy
+from .models import Organization, Chain, Restaurant
+
+
+def _bump_on_commit(user_ids):
+    user_ids = set(user_ids)
+    if user_ids:
+        transaction.on_commit(lambda: bump_membership_versions(user_ids))
+
+
+@receiver(post_save, sender=Organization)
+@receiver(post_save, sender=Chain)
+@receiver(post_save, sender=Restaurant)
+@receiver(post_delete, sender=Organization)
+@receiver(post_delete, sender=Chain)
+@receiver(post_delete, sender=Restaurant)
+@receiver(post_delete, sender=User)
+def invalidate_on_tree_change(sender, **kwargs):
+    invalidate_hierarchy()
+
+
+@receiver(m2m_changed, sender=Organization.authors.through)
+@receiver(m2m_changed, sender=User.organizations.through)
+@receiver(m2m_changed, sender=User.chains.through)
+@receiver(m2m_changed, sender=User.restaurants.through)
+def invalidate_on_members_change(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_hierarchy()
+
+
+@receiver(m2m_changed, sender=Organization.authors.through)
+@receiver(m2m_changed, sender=User.organizations.through)
+@receiver(m2m_changed, sender=User.chains.through)
+@receiver(m2m_changed, sender=User.restaurants.through)
+def bump_on_members_change(sender, instance, action, model, pk_set, **kwargs):
+    # Версия членства меняется у пользователей, которых затронуло изменение связи
+    if action in ('post_add', 'post_remove'):
+        _bump_on_commit(pk_set if model is User else [instance.pk])
+    elif action == 'pre_clear':
+        if isinstance(instance, User):
+            _bump_on_commit([instance.pk])
+        else:
+            field = f'{instance._meta.model_name}_id'
+            _bump_on_commit(sender.objects.filter(**{field: instance.pk}).values_list('user_id', flat=True))
+
+
+def _members(sender, instance):
+    hierarchy = get_hierarchy()
+    if sender is Organization:
+        return hierarchy.organization_members(instance.pk)
+    if sender is Chain:
+        return hierarchy.chain_members(instance.pk)
+    return hierarchy.restaurant_members(instance.pk)
+
+
+@receiver(pre_delete, sender=Organization)
+@receiver(pre_delete, sender=Chain)
+@receiver(pre_delete, sender=Restaurant)
+def bump_on_tree_delete(sender, instance, **kwargs):
+    # Каскадное удаление не отправляет m2m_changed, участников берем из снимка иерархии
+    _bump_on_commit(_members(sender, instance))
+
+
+@receiver(post_save, sender=Organization)
+@receiver(post_save, sender=Chain)
+@receiver(post_save, sender=Restaurant)
+def bump_on_rename(sender, instance, created, **kwargs):
+    # Названия входят в профиль участников; у новых объектов участников еще нет
+    if not created:
+        _bump_on_commit(_members(sender, instance))
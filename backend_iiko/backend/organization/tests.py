@@ -1,3 +1,100 @@
-from django.test import TestCase
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
 
-# Create your tests here.
+from backend.querybudget import Budget, QueryBudgetMixin
+from backend.testing import SeededAPITestCase
+from core.models import User
+
+from . import urls
+from .models import Chain
+
+
+def _pk(key):
+    return lambda t: {'pk': t.ids[key]}
+
+
+class OrganizationQueryBudgetTests(QueryBudgetMixin, APITestCase):
+    router = urls.router
+    budgets = {
+        ('organization-list', 'get'): Budget(5),
+        ('organization-list', 'post'): Budget(14, data={'name': 'new-organization'}),
+        ('organization-add-author', 'patch'): Budget(25, data=lambda t: {
+            'user_id': t.outsider.pk, 'organization_id': t.ids['organization_id']}),
+        ('organization-add-user-in-organization', 'patch'): Budget(20, data=lambda t: {
+            'user_id': t.outsider.pk, 'organization_id': t.ids['organization_id']}),
+        ('organization-delete-user-in-organization', 'delete'): Budget(13, params=lambda t: {
+            'user_id': t.member.pk, 'organization_id': t.ids['organization_id']}),
+        ('organization-detail', 'get'): Budget(5, kwargs=_pk('organization_id')),
+        ('organization-detail', 'patch'): Budget(17, kwargs=_pk('organization_id'),
+                                                  data={'name': 'renamed-organization'}),
+        ('organization-detail', 'delete'): Budget(27, kwargs=_pk('organization_id')),
+        ('organization-delete-author', 'delete'): Budget(11, kwargs=_pk('organization_id')),
+
+        ('chain-list', 'get'): Budget(5),
+        ('chain-list', 'post'): Budget(15, data=lambda t: {'name': 'new-chain',
+                                                           'organization': t.ids['organization_id']}),
+        ('chain-add-user-in-chain', 'patch'): Budget(16, data=lambda t: {
+            'user_id': t.outsider.pk, 'chain_id': t.other_chain_id}),
+        ('chain-delete-user-in-chain', 'delete'): Budget(13, params=lambda t: {
+            'user_id': t.member.pk, 'chain_id': t.ids['chain_id']}),
+        ('chain-detail', 'get'): Budget(5, kwargs=_pk('chain_id')),
+        ('chain-detail', 'patch'): Budget(14, kwargs=_pk('chain_id'), data={'name': 'renamed-chain'}),
+        ('chain-detail', 'delete'): Budget(23, kwargs=_pk('chain_id')),
+
+        ('restaurant-list', 'get'): Budget(5),
+        ('restaurant-list', 'post'): Budget(11, data=lambda t: {'name': 'new-restaurant',
+                                                                'chain': t.ids['chain_id']}),
+        ('restaurant-add-user-in-restaurant', 'patch'): Budget(15, data=lambda t: {
+            'user_id': t.outsider.pk, 'restaurant_id': t.ids['restaurant_id']}),
+        ('restaurant-delete-user-in-restaurant', 'delete'): Budget(13, params=lambda t: {
+            'user_id': t.member.pk, 'restaurant_id': t.ids['restaurant_id']}),
+        ('restaurant-detail', 'get'): Budget(5, kwargs=_pk('restaurant_id')),
+        ('restaurant-detail', 'patch'): Budget(9, kwargs=_pk('restaurant_id'), data={'name': 'renamed-restaurant'}),
+        ('restaurant-detail', 'delete'): Budget(20, kwargs=_pk('restaurant_id')),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Участник первого ресторана автора и пользователь чужой организации
+        cls.member = User.objects.filter(restaurants=cls.ids['restaurant_id']).exclude(pk=cls.author.pk).first()
+        cls.outsider = User.objects.exclude(organizations=cls.ids['organization_id']).first()
+        cls.other_chain_id = (Chain.objects.filter(organization=cls.ids['organization_id'])
+                               .exclude(pk=cls.ids['chain_id']).values_list('pk', flat=True).first())
+
+
+class SparseFieldsTests(SeededAPITestCase):
+    scale = {**SeededAPITestCase.scale, 'restaurants': 2}
+
+    def get(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/organization/restaurant/{self.ids["restaurant_id"]}/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data, len(queries)
+
+    def test_fields_select_nested_fields(self):
+        data, _ = self.get(fields='id,chain.name')
+        self.assertEqual(data, {'id': self.ids['restaurant_id'], 'chain': {'name': data['chain']['name']}})
+
+    def test_expand_collapses_other_objects_to_ids(self):
+        data, _ = self.get(expand='')
+        self.assertEqual(data['chain'], self.ids['chain_id'])
+
+        data, _ = self.get(expand='chain')
+        self.assertEqual(data['chain']['organization'], self.ids['organization_id'])
+
+    def test_cut_relations_are_not_loaded(self):
+        full, full_queries = self.get()
+        self.assertIn('authors', full['chain']['organization'])
+
+        _, sparse_queries = self.get(fields='id,name')
+        self.assertLess(sparse_queries, full_queries)
+
+    def test_list_keeps_cursor_pagination(self):
+        response = self.client.get('/api/organization/restaurant/', {'fields': 'id', 'page_size': 1})
+        self.assertEqual(response.data['results'], [{'id': self.ids['restaurant_id']}])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
@@ -8,12 +8,14 @@ from rest_framework import status
 from core.serializers import GetUserSerializer
 from core.models import User
 
-from backend.viewsets import MyModelViewSet
+from backend.search import TrigramSearchFilter
+from backend.viewsets import MyModelViewSet, OptimizedQuerysetMixin
 
 from .schemas import get_chain_schema, get_organization_schemas, get_restaurant_schemas
 from .filters import ChainFilter, OrganizationFilter, RestaurantFilter
 from .models import Organization, Chain, Restaurant
-from .permissions import IsAuthorOrReadOnly, IsAuthorInChainOrReadOnly, IsAuthorInRestaurantOrReadOnly
+from .permissions import (IsAuthorOrReadOnly, IsAuthorInChainOrReadOnly, IsAuthorInRestaurantOrReadOnly,
+                          is_author_of_organization, is_author_of_chain, is_author_of_restaurants)
 from .serializers import (GetOrganizationSerializer, GetChainSerializer,
                           PostAddAuthorOrUserSerializer, PostPatchChainSerializer,
                           AddUserToChainSerializer, GetRestaurantSerializer,
@@ -26,8 +28,9 @@ class OrganizationViewSet(MyModelViewSet):
     serializer_class = GetOrganizationSerializer
     permission_classes = [IsAuthenticated, IsAuthorOrReadOnly]
     http_method_names = ['get', 'post', 'patch', 'delete']
-    filter_backends = [DjangoFilterBackend]
+    filter_backends = [DjangoFilterBackend, TrigramSearchFilter]
     filterset_class = OrganizationFilter
+    search_fields = ['name']
 
     @action(detail=False, methods=['patch'], permission_classes=[IsAuthenticated, IsAuthorOrReadOnly])
     def add_author(self, request):
@@ -47,7 +50,7 @@ class OrganizationViewSet(MyModelViewSet):
         if not organization:
             return Response({'error': 'Organization not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        if user not in organization.authors.all():
+        if not is_author_of_organization(user, organization.id):
             return Response({'error': 'You are not an author of this organization'}, status=status.HTTP_403_FORBIDDEN)
 
         organization.authors.remove(user)
@@ -72,7 +75,7 @@ class OrganizationViewSet(MyModelViewSet):
         user = User.objects.get(id=user_id)
         organization = Organization.objects.get(id=organization_id)
 
-        if request.user not in organization.authors.all():
+        if not is_author_of_organization(request.user, organization.id):
             return Response({'error': 'You are not the author of this organization'}, status=status.HTTP_403_FORBIDDEN)
 
         if organization not in user.organizations.all():
@@ -89,8 +92,9 @@ class ChainViewSet(MyModelViewSet):
     serializer_class = GetChainSerializer
     permission_classes = [IsAuthenticated, IsAuthorInChainOrReadOnly]
     http_method_names = ['get', 'post', 'patch', 'delete']
-    filter_backends = [DjangoFilterBackend]
+    filter_backends = [DjangoFilterBackend, TrigramSearchFilter]
     filterset_class = ChainFilter
+    search_fields = ['name']
 
     def get_serializer_class(self):
         if self.action == 'create' or self.action == 'partial_update':
@@ -112,7 +116,7 @@ class ChainViewSet(MyModelViewSet):
         user = User.objects.get(id=user_id)
         chain = Chain.objects.get(id=chain_id)
 
-        if request.user not in chain.organization.authors.all():
+        if not is_author_of_chain(request.user, chain.id):
             return Response({'error': 'You are not the author of this organization'}, status=status.HTTP_403_FORBIDDEN)
 
         if chain not in user.chains.all():
@@ -124,13 +128,14 @@ class ChainViewSet(MyModelViewSet):
 
 
 @get_restaurant_schemas
-class RestaurantViewSet(ModelViewSet):
+class RestaurantViewSet(OptimizedQuerysetMixin, ModelViewSet):
     queryset = Restaurant.objects.all()
     serializer_class = GetRestaurantSerializer
     permission_classes = [IsAuthenticated, IsAuthorInRestaurantOrReadOnly]
     http_method_names = ['get', 'post', 'patch', 'delete']
-    filter_backends = [DjangoFilterBackend]
+    filter_backends = [DjangoFilterBackend, TrigramSearchFilter]
     filterset_class = RestaurantFilter
+    search_fields = ['name']
 
     def get_serializer_class(self):
         if self.action == 'create' or self.action == 'partial_update':
@@ -152,7 +157,7 @@ class RestaurantViewSet(ModelViewSet):
         user = User.objects.get(id=user_id)
         restaurant = Restaurant.objects.get(id=restaurant_id)
 
-        if request.user not in restaurant.chain.organization.authors.all():
+        if not is_author_of_restaurants(request.user, [restaurant.id]):
             return Response({'error': 'You are not the author of this organization'}, status=status.HTTP_403_FORBIDDEN)
 
         if restaurant not in user.restaurants.all():